@@ -0,0 +1,269 @@
+# analytics.py
+import sqlite3
+from typing import List, Dict
+
+import db_functions
+import snapshot
+from metrics import timed
+
+
+# Rollup tables kept up to date as orders commit.
+# Statements are run one by one so they can share the order transaction.
+ROLLUP_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS sales_daily (
+        day TEXT NOT NULL,
+        isbn TEXT NOT NULL,
+        orders INTEGER NOT NULL DEFAULT 0,
+        qty INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, isbn)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS sales_totals_daily (
+        day TEXT PRIMARY KEY,
+        orders INTEGER NOT NULL DEFAULT 0,
+        qty INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS customer_sales (
+        customer_id INTEGER PRIMARY KEY,
+        orders INTEGER NOT NULL DEFAULT 0,
+        items INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        first_order_at TEXT,
+        last_order_at TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_customer_sales_revenue ON customer_sales(revenue)",
+    """CREATE TABLE IF NOT EXISTS rollup_state (
+        name TEXT PRIMARY KEY,
+        last_order_id INTEGER NOT NULL
+    )""",
+]
+
+_ready_paths = set()
+
+
+def ensure_rollup_tables(cursor):
+    """Create the rollup tables once per database"""
+    if db_functions.path in _ready_paths:
+        return
+    for statement in ROLLUP_SCHEMA:
+        cursor.execute(statement)
+    _ready_paths.add(db_functions.path)
+
+
+def refresh_rollups(cursor) -> int:
+    """Fold every order newer than the last processed one into the rollups.
+
+    Runs on the caller's cursor, so create_order can call it inside its own
+    transaction and the rollups commit together with the order.
+    Returns the number of orders folded in.
+    """
+    ensure_rollup_tables(cursor)
+
+    cursor.execute("SELECT last_order_id FROM rollup_state WHERE name = 'sales'")
+    row = cursor.fetchone()
+    last_id = row[0] if row else 0
+
+    cursor.execute("SELECT COALESCE(MAX(id), 0), COUNT(*) FROM orders WHERE id > ?", (last_id,))
+    upto_id, new_orders = cursor.fetchone()
+    if not new_orders:
+        return 0
+
+    cursor.execute("""
+        INSERT INTO sales_daily (day, isbn, orders, qty, revenue)
+        SELECT date(o.created_at), oi.isbn, COUNT(DISTINCT o.id),
+               SUM(oi.qty), SUM(oi.line_total)
+        FROM orders o
+        JOIN order_items oi ON oi.order_id = o.id
+        WHERE o.id > ? AND o.id <= ?
+        GROUP BY date(o.created_at), oi.isbn
+        ON CONFLICT(day, isbn) DO UPDATE SET
+            orders = orders + excluded.orders,
+            qty = qty + excluded.qty,
+            revenue = revenue + excluded.revenue
+    """, (last_id, upto_id))
+
+    cursor.execute("""
+        INSERT INTO sales_totals_daily (day, orders, qty, revenue)
+        SELECT date(o.created_at), COUNT(*),
+               SUM((SELECT COALESCE(SUM(qty), 0) FROM order_items WHERE order_id = o.id)),
+               SUM(COALESCE(o.total_amount, 0))
+        FROM orders o
+        WHERE o.id > ? AND o.id <= ?
+        GROUP BY date(o.created_at)
+        ON CONFLICT(day) DO UPDATE SET
+            orders = orders + excluded.orders,
+            qty = qty + excluded.qty,
+            revenue = revenue + excluded.revenue
+    """, (last_id, upto_id))
+
+    cursor.execute("""
+        INSERT INTO customer_sales (customer_id, orders, items, revenue, first_order_at, last_order_at)
+        SELECT o.customer_id, COUNT(*),
+               SUM((SELECT COALESCE(SUM(qty), 0) FROM order_items WHERE order_id = o.id)),
+               SUM(COALESCE(o.total_amount, 0)),
+               MIN(o.created_at), MAX(o.created_at)
+        FROM orders o
+        WHERE o.id > ? AND o.id <= ?
+        GROUP BY o.customer_id
+        ON CONFLICT(customer_id) DO UPDATE SET
+            orders = orders + excluded.orders,
+            items = items + excluded.items,
+            revenue = revenue + excluded.revenue,
+            first_order_at = MIN(COALESCE(first_order_at, excluded.first_order_at), excluded.first_order_at),
+            last_order_at = MAX(COALESCE(last_order_at, excluded.last_order_at), excluded.last_order_at)
+    """, (last_id, upto_id))
+
+    cursor.execute(
+        "INSERT INTO rollup_state (name, last_order_id) VALUES ('sales', ?) "
+        "ON CONFLICT(name) DO UPDATE SET last_order_id = excluded.last_order_id",
+        (upto_id,)
+    )
+    return new_orders
+
+
+def _pending_orders(cursor) -> bool:
+    """True if some orders have not been folded into the rollups yet"""
+    try:
+        cursor.execute("""
+            SELECT COALESCE(MAX(id), 0) > COALESCE(
+                (SELECT last_order_id FROM rollup_state WHERE name = 'sales'), 0)
+            FROM orders
+        """)
+    except sqlite3.OperationalError:
+        # Rollup tables not created yet
+        return True
+    return bool(cursor.fetchone()[0])
+
+
+def _refresh_tx(conn) -> int:
+    return refresh_rollups(conn.cursor())
+
+
+def catch_up(conn) -> int:
+    """Fold in orders that reached the database without create_order.
+
+    The check runs on the caller's (read) connection and costs two index
+    lookups. The fold itself goes through db_functions.run_write(), so
+    readers never write.
+    """
+    if snapshot.current() is not None:
+        # Snapshots are caught up when taken and are read-only
+        return 0
+    if not _pending_orders(conn.cursor()):
+        return 0
+    return db_functions.run_write(_refresh_tx)
+
+
+def _rebuild_tx(conn) -> int:
+    cursor = conn.cursor()
+    ensure_rollup_tables(cursor)
+    cursor.execute("DELETE FROM sales_daily")
+    cursor.execute("DELETE FROM sales_totals_daily")
+    cursor.execute("DELETE FROM customer_sales")
+    cursor.execute("DELETE FROM rollup_state WHERE name = 'sales'")
+    return refresh_rollups(cursor)
+
+
+def rebuild_rollups() -> Dict:
+    """Drop all rollup data and rebuild it from the full order history"""
+    try:
+        processed = db_functions.run_write(_rebuild_tx)
+        return {"orders_processed": processed, "message": f"Rebuilt sales rollups from {processed} orders"}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _read(query: str, params: tuple) -> List[Dict]:
+    """Run a rollup query, catching up on any orders not folded in yet"""
+    conn = db_functions.get_connection()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    try:
+        catch_up(conn)
+        cursor.execute(query, params)
+        return [dict(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def _since(days: int) -> str:
+    return f"-{max(int(days), 1) - 1} days"
+
+
+@timed("db")
+def top_titles(days: int = 30, limit: int = 10) -> Dict:
+    """Best-selling titles over the last N days"""
+    try:
+        rows = _read("""
+            SELECT s.isbn, b.title, b.author,
+                   SUM(s.qty) AS qty, SUM(s.revenue) AS revenue, SUM(s.orders) AS orders
+            FROM sales_daily s
+            JOIN books b ON b.isbn = s.isbn
+            WHERE s.day >= date('now', ?)
+            GROUP BY s.isbn
+            ORDER BY qty DESC, revenue DESC
+            LIMIT ?
+        """, (_since(days), limit))
+        return {"days": days, "titles": rows}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@timed("db")
+def revenue_by_day(days: int = 7) -> Dict:
+    """Orders, copies sold and revenue per day over the last N days"""
+    try:
+        rows = _read("""
+            SELECT day, orders, qty, revenue
+            FROM sales_totals_daily
+            WHERE day >= date('now', ?)
+            ORDER BY day ASC
+        """, (_since(days),))
+        return {
+            "days": days,
+            "by_day": rows,
+            "total_revenue": round(sum(r["revenue"] for r in rows), 2),
+            "total_orders": sum(r["orders"] for r in rows)
+        }
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@timed("db")
+def customer_lifetime_value(customer_id: int) -> Dict:
+    """Lifetime orders, copies and revenue for one customer"""
+    try:
+        rows = _read("""
+            SELECT c.id AS customer_id, c.name, c.email,
+                   COALESCE(s.orders, 0) AS orders, COALESCE(s.items, 0) AS items,
+                   COALESCE(s.revenue, 0) AS revenue,
+                   s.first_order_at, s.last_order_at
+            FROM customers c
+            LEFT JOIN customer_sales s ON s.customer_id = c.id
+            WHERE c.id = ?
+        """, (customer_id,))
+        if not rows:
+            return {"error": f"Customer with ID {customer_id} not found"}
+        result = rows[0]
+        result["average_order_value"] = result["revenue"] / result["orders"] if result["orders"] else 0.0
+        return result
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@timed("db")
+def top_customers(limit: int = 10) -> Dict:
+    """Customers ranked by lifetime revenue"""
+    try:
+        rows = _read("""
+            SELECT s.customer_id, c.name, s.orders, s.items, s.revenue
+            FROM customer_sales s
+            JOIN customers c ON c.id = s.customer_id
+            ORDER BY s.revenue DESC
+            LIMIT ?
+        """, (limit,))
+        return {"customers": rows}
+    except Exception as e:
+        return {"error": str(e)}
@@ -0,0 +1,349 @@
+# benchmark.py
+"""Benchmark db_functions and the agent tools against synthetic data.
+
+Examples:
+    python benchmark.py --rows 1000
+    python benchmark.py --rows 100000 --output bench_results.json
+    python benchmark.py --rows 100000 --compare bench_results.json
+    python benchmark.py --rows 100000 --snapshot memory
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import db_functions
+
+
+WORDS = [
+    "Python", "Java", "Clean", "Code", "Data", "Systems", "Design", "Patterns",
+    "Algorithms", "Learning", "Deep", "Practical", "Modern", "Effective", "Rust",
+    "Distributed", "Cloud", "Security", "Networks", "Databases", "Compilers",
+    "Architecture", "Testing", "Refactoring", "Functional", "Web", "Mobile",
+    "Machine", "Statistics", "Graphs", "Concurrency", "Performance", "Linux",
+    "Kernel", "Embedded", "Analytics", "Visualization", "Agile", "DevOps", "Go"
+]
+
+
+def generate_dataset(db_path: str, rows: int) -> Dict:
+    """Create a database with `rows` books and proportional customers, orders and messages.
+
+    Rows are generated inside SQLite with recursive CTEs, so even 10^7 books
+    never pass through Python.
+    """
+    import schema
+    import title_index
+    import topic_index
+    from analytics import rebuild_rollups
+    from recommendations import rebuild_recommendations
+
+    books = rows
+    customers = max(10, rows // 10)
+    orders = max(10, rows // 2)
+    lines = max(10, rows)
+    messages = max(10, rows // 10)
+
+    schema.DB_PATH = db_path
+    schema.init_db()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("CREATE TEMP TABLE words (id INTEGER PRIMARY KEY, w TEXT)")
+    conn.executemany("INSERT INTO temp.words VALUES (?, ?)", list(enumerate(WORDS)))
+    n_words = len(WORDS)
+
+    started = time.perf_counter()
+    conn.execute(f"""
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {books})
+        INSERT INTO books (isbn, title, author, price, stock)
+        SELECT printf('978%010d', i),
+               (SELECT w FROM temp.words WHERE id = i % {n_words}) || ' ' ||
+               (SELECT w FROM temp.words WHERE id = (i / {n_words}) % {n_words}) || ' Vol. ' || i,
+               'Author ' || (i % {max(1, books // 20)}),
+               round(10 + (i % 90) + (i % 100) / 100.0, 2),
+               1000 + i % 50
+        FROM n
+    """)
+    conn.execute(f"""
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {customers})
+        INSERT INTO customers (name, email)
+        SELECT 'Customer ' || i, 'customer' || i || '@example.com' FROM n
+    """)
+    conn.execute(f"""
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {orders})
+        INSERT INTO orders (customer_id, status, created_at, total_amount)
+        SELECT 1 + abs(random()) % {customers}, 'created',
+               datetime('now', '-' || (abs(random()) % 90) || ' days'), 0
+        FROM n
+    """)
+    conn.execute(f"""
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {lines})
+        INSERT INTO order_items (order_id, isbn, qty)
+        SELECT 1 + (i % {orders}), printf('978%010d', 1 + abs(random()) % {books}), 1 + abs(random()) % 3
+        FROM n
+    """)
+    conn.execute("""
+        UPDATE order_items
+        SET unit_price = (SELECT price FROM books WHERE books.isbn = order_items.isbn)
+    """)
+    conn.execute("UPDATE order_items SET line_total = unit_price * qty")
+    conn.execute("""
+        UPDATE orders
+        SET total_amount = (SELECT COALESCE(SUM(line_total), 0) FROM order_items WHERE order_id = orders.id)
+    """)
+    conn.execute(f"""
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {messages})
+        INSERT INTO messages (session_id, role, content)
+        SELECT 'session-' || (i % {max(1, messages // 20)}),
+               CASE i % 2 WHEN 0 THEN 'user' ELSE 'assistant' END,
+               'Synthetic message ' || i
+        FROM n
+    """)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+    db_functions.path = db_path
+    rebuild_rollups()
+    rebuild_recommendations()
+    title_index.sync()
+    topic_index.sync()
+
+    return {
+        "books": books,
+        "customers": customers,
+        "orders": orders,
+        "order_items": lines,
+        "messages": messages,
+        "generate_seconds": round(time.perf_counter() - started, 2)
+    }
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def measure(fn: Callable[[], object], iterations: int, warmup: int = 2) -> Dict:
+    """Call fn repeatedly and return latency percentiles (ms) and throughput"""
+    for _ in range(warmup):
+        fn()
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "ops_per_sec": round(iterations / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p90_ms": round(percentile(latencies, 90), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "max_ms": round(latencies[-1], 3)
+    }
+
+
+def _db_cases(rnd: random.Random, info: Dict) -> Dict[str, Callable[[], object]]:
+    books, orders, customers = info["books"], info["orders"], info["customers"]
+    sessions = max(1, info["messages"] // 20)
+
+    def isbn():
+        return f"978{rnd.randint(1, books):010d}"
+
+    return {
+        "find_books_page": lambda: db_functions.find_books_page(rnd.choice(WORDS), page_size=10),
+        "create_order": lambda: db_functions.create_order(
+            rnd.randint(1, customers), [{"isbn": isbn(), "qty": 1}]),
+        "order_status": lambda: db_functions.order_status(rnd.randint(1, orders)),
+        "inventory_summary": lambda: db_functions.inventory_summary(5),
+        "get_chat_history": lambda: db_functions.get_chat_history(f"session-{rnd.randrange(sessions)}", 10),
+        "restock_book": lambda: db_functions.restock_book(isbn(), 1),
+        "update_price": lambda: db_functions.update_price(isbn(), round(rnd.uniform(10, 99), 2)),
+    }
+
+
+def _tool_args(rnd: random.Random, info: Dict) -> Dict[str, Callable[[], Dict]]:
+    books, orders, customers = info["books"], info["orders"], info["customers"]
+
+    def isbn():
+        return f"978{rnd.randint(1, books):010d}"
+
+    return {
+        "find_books_tool": lambda: {"q": rnd.choice(WORDS)},
+        "books_about_tool": lambda: {"topic": rnd.choice(WORDS)},
+        "create_order_tool": lambda: {
+            "book_title": f"Vol. {rnd.randint(1, books)}",
+            "customer_input": str(rnd.randint(1, customers)),
+            "quantity": 1
+        },
+        "restock_book_tool": lambda: {"isbn": isbn(), "quantity": 1},
+        "update_price_tool": lambda: {"isbn": isbn(), "new_price": round(rnd.uniform(10, 99), 2)},
+        "order_status_tool": lambda: {"order_id": rnd.randint(1, orders)},
+        "inventory_summary_tool": lambda: {"threshold": 5},
+        "similar_books_tool": lambda: {"isbn": isbn()},
+        "top_titles_tool": lambda: {"days": 30},
+        "revenue_by_day_tool": lambda: {"days": 7},
+        "customer_value_tool": lambda: {"customer_input": str(rnd.randint(1, customers))},
+    }
+
+
+def run_benchmarks(info: Dict, iterations: int, seed: int = 42, only: List[str] = None) -> Dict:
+    """Time every db_functions hot path and every agent tool"""
+    from tools import TOOLS
+
+    rnd = random.Random(seed)
+    results = {}
+
+    for name, fn in _db_cases(rnd, info).items():
+        if only and name not in only:
+            continue
+        results[f"db.{name}"] = measure(fn, iterations)
+        print(f"  db.{name}: p50 {results[f'db.{name}']['p50_ms']} ms")
+
+    args_for = _tool_args(rnd, info)
+    for t in TOOLS:
+        if only and t.name not in only:
+            continue
+        make_args = args_for.get(t.name)
+        if make_args is None:
+            print(f"  tool.{t.name}: skipped (no benchmark arguments)")
+            continue
+        # Rendered compact, as the agent hands tool output to the LLM
+        results[f"tool.{t.name}"] = measure(lambda: t.invoke(make_args()).render("compact"), iterations)
+        print(f"  tool.{t.name}: p50 {results[f'tool.{t.name}']['p50_ms']} ms")
+
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def compare(old: Dict, new: Dict, tolerance: float = 0.10) -> List[str]:
+    """Describe p50/p99 changes between two result files; flag slowdowns beyond tolerance"""
+    lines = []
+    for name, stats in new["results"].items():
+        before = old.get("results", {}).get(name)
+        if not before:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            if not before[key]:
+                continue
+            change = (stats[key] - before[key]) / before[key]
+            flag = "  ⚠️ REGRESSION" if change > tolerance else ""
+            lines.append(f"{name} {key}: {before[key]:.3f} -> {stats[key]:.3f} ({change:+.1%}){flag}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark library desk hot paths")
+    parser.add_argument("--rows", type=int, default=1000,
+                        help="Number of books; customers, orders and messages scale from it (1e3-1e7)")
+    parser.add_argument("--iterations", type=int, default=100, help="Timed calls per operation")
+    parser.add_argument("--db", help="Database path (default: temporary file)")
+    parser.add_argument("--reuse", action="store_true", help="Reuse --db if it already exists")
+    parser.add_argument("--only", nargs="*", help="Only run these operations (e.g. find_books_page order_status_tool)")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write JSON results")
+    parser.add_argument("--compare", help="Previous JSON results to compare against")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile SQL statements and report slow queries and full scans")
+    parser.add_argument("--slow-ms", type=float, default=10.0, help="Slow statement threshold for --profile")
+    parser.add_argument("--snapshot", choices=["memory", "file"],
+                        help="Run reads against a backup-API snapshot; writes still hit the database")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the benchmark argument generator")
+    args = parser.parse_args()
+
+    # Read the baseline first: --output may be the same file and is overwritten below
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="library-bench-"), "bench.db")
+    info_path = db_path + ".json"
+
+    if args.reuse and os.path.exists(db_path) and os.path.exists(info_path):
+        with open(info_path) as f:
+            info = json.load(f)
+        db_functions.path = db_path
+        print(f"Reusing {db_path}")
+    else:
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        print(f"Generating {args.rows} books in {db_path}...")
+        info = generate_dataset(db_path, args.rows)
+        with open(info_path, "w") as f:
+            json.dump(info, f)
+        print(f"  done in {info['generate_seconds']}s")
+
+    if args.profile:
+        import profiler
+        profiler.enable(slow_ms=args.slow_ms, log_path=os.path.splitext(args.output)[0] + "_slow.jsonl")
+
+    snap = None
+    if args.snapshot:
+        import snapshot
+        snap = snapshot.take(memory=args.snapshot == "memory")
+        print(snap.describe())
+
+    print(f"Running {args.iterations} iterations per operation...")
+    if snap is not None:
+        with snap, snapshot.using(snap):
+            results = run_benchmarks(info, args.iterations, args.seed, args.only)
+    else:
+        results = run_benchmarks(info, args.iterations, args.seed, args.only)
+
+    if args.profile:
+        print("\nSQL profile (by total time):")
+        profiler.print_report()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "snapshot": args.snapshot,
+            "dataset": info
+        },
+        "results": results
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if previous is not None:
+        print(f"\nCompared with {args.compare} ({previous.get('meta', {}).get('commit', '?')}):")
+        for line in compare(previous, report):
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
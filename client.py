@@ -0,0 +1,76 @@
+# client.py
+"""Thin client for the headless desk service (server.py).
+
+RemoteAgent has the same interface frontend.py uses on CompatibleAgent
+(run, chat_history, get_chat_history, reset_chat). A desk terminal can
+therefore talk to a shared service instead of running its own agent and
+database writer. It keeps one HTTP/1.1 keep-alive connection and uses only
+the standard library, so it adds almost nothing to the GUI's startup time.
+"""
+import http.client
+import json
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+DEFAULT_TIMEOUT = 120.0
+
+
+class RemoteAgentError(RuntimeError):
+    pass
+
+
+class RemoteAgent:
+    def __init__(self, session_id: str, base_url: str, timeout: float = DEFAULT_TIMEOUT):
+        url = urlsplit(base_url if "://" in base_url else "http://" + base_url)
+        self.session_id = session_id
+        self.host = url.hostname or "127.0.0.1"
+        self.port = url.port or 80
+        self.timeout = timeout
+        self._conn: Optional[http.client.HTTPConnection] = None
+        self._lock = threading.Lock()
+        self._history: List[Dict] = []
+
+    def _request(self, method: str, path: str, payload: Optional[Dict] = None) -> Dict:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        with self._lock:
+            # One retry covers a keep-alive connection the server has since closed
+            for attempt in (1, 2):
+                if self._conn is None:
+                    self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                try:
+                    self._conn.request(method, path, body=body, headers=headers)
+                    response = self._conn.getresponse()
+                    data = json.loads(response.read() or b"{}")
+                    break
+                except (http.client.HTTPException, ConnectionError, OSError):
+                    self._conn.close()
+                    self._conn = None
+                    if attempt == 2:
+                        raise
+        if response.status >= 400:
+            raise RemoteAgentError(data.get("error", f"HTTP {response.status}"))
+        return data
+
+    def run(self, message: str) -> str:
+        data = self._request("POST", f"/sessions/{self.session_id}/messages", {"message": message})
+        self._history.append({"role": "user", "content": message})
+        self._history.append({"role": "assistant", "content": data["response"]})
+        return data["response"]
+
+    @property
+    def chat_history(self) -> List[Dict]:
+        return self._history
+
+    @chat_history.setter
+    def chat_history(self, messages: List[Dict]):
+        self._history = list(messages)
+        self._request("PUT", f"/sessions/{self.session_id}/history", {"messages": self._history})
+
+    def get_chat_history(self) -> List[Dict]:
+        return list(self._history)
+
+    def reset_chat(self):
+        self._history = []
+        self._request("DELETE", f"/sessions/{self.session_id}/history")
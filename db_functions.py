@@ -1,234 +1,495 @@
 # db_functions.py
 import sqlite3
 import json
-from typing import List, Dict, Optional
+import base64
+import contextvars
+import time
+from typing import List, Dict, Optional, Iterator
 from datetime import datetime
 import os
 
+import profiler
+import pool
+import snapshot
+import order_intake
+import uow
+import writer
+from metrics import timed, observe_connection_wait
 
 
 path = r"db/library.db"
+
+# Search pagination settings
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 50
+COUNT_ESTIMATE_CAP = 1000
+
+# Tool-call logs are stored without whitespace (see retention.py)
+JSON_SEPARATORS = (",", ":")
+
+# Session of the turn being processed; set per thread/task by the caller
+_current_session = contextvars.ContextVar("current_session", default="default_session")
+
 def set_current_session(session_id: str):
-    global CURRENT_SESSION_ID
-    CURRENT_SESSION_ID = session_id
+    _current_session.set(session_id)
 
+def get_current_session() -> str:
+    return _current_session.get()
 
-def get_connection():
-    """Get a new database connection"""
-    return sqlite3.connect(path)
 
-def find_books(q: str, by: str = "title") -> List[Dict]:
-    """Find books by title or author"""
-    by = by.lower()
-    if by not in ["title", "author"]:
-        by = "title"
+_migrated_paths = set()
+
+def get_connection(write: bool = False):
+    """Get a database connection.
     
+    Functions that modify the database go through run_write(), which
+    passes write=True here when the writer actor is not running. With a
+    pool active (see pool.py) that returns the process's single writer
+    connection; otherwise every call opens a new connection.
+    """
+    start = time.perf_counter()
+    snap = snapshot.current()
+    if snap is not None and not write:
+        # Reads inside snapshot.using() go to the read-only copy
+        conn = snap.connect()
+        observe_connection_wait((time.perf_counter() - start) * 1000.0)
+        return conn
+    shared = pool.active()
+    if shared is not None and shared.path == path:
+        conn = shared.acquire_writer() if write else shared.acquire()
+    elif profiler.ENABLED:
+        conn = profiler.connect(path)
+    else:
+        conn = sqlite3.connect(path)
+    if path not in _migrated_paths:
+        # Bring older databases up to date once per process
+        from schema import migrate_db
+        migrate_db(conn)
+        _migrated_paths.add(path)
+    observe_connection_wait((time.perf_counter() - start) * 1000.0)
+    return conn
+
+@timed("db")
+def get_book(isbn: str) -> Optional[Dict]:
+    """Get one book by ISBN"""
     conn = get_connection()
-    conn.row_factory = sqlite3.Row  # Enable row factory
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        f"""SELECT isbn, title, author, price, stock FROM books WHERE {by} LIKE ?""", 
-        (f"%{q}%",)
-    )
-    
-    rows = cursor.fetchall()
-    results = []
-    for row in rows:
-        results.append(dict(row))
+    conn.row_factory = sqlite3.Row
     
-    conn.close()
-    return results
+    try:
+        row = conn.execute(
+            "SELECT isbn, title, author, price, stock FROM books WHERE isbn = ?", (isbn,)
+        ).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+def encode_cursor(state: Dict) -> str:
+    """Encode a search position as an opaque cursor token"""
+    raw = json.dumps(state, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str) -> Dict:
+    """Decode a cursor token produced by encode_cursor, checking every field it carries"""
+    padded = token + "=" * (-len(token) % 4)
+    try:
+        state = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid or expired cursor")
+    if not isinstance(state, dict) or not _valid_cursor(state):
+        raise ValueError("Invalid or expired cursor")
+    return state
+
+def _valid_cursor(state: Dict) -> bool:
+    def whole(value):
+        return isinstance(value, int) and not isinstance(value, bool)
+
+    after = state.get("after")
+    return (isinstance(state.get("q", ""), str)
+            and isinstance(state.get("by", "title"), str)
+            and whole(state.get("n", DEFAULT_PAGE_SIZE)) and state.get("n", DEFAULT_PAGE_SIZE) > 0
+            and whole(state.get("offset", 0)) and state.get("offset", 0) >= 0
+            and isinstance(after, list) and len(after) == 2 and all(isinstance(v, str) for v in after))
+
+@timed("db")
+def find_books_page(q: str = "", by: str = "title", page_size: int = DEFAULT_PAGE_SIZE,
+                    cursor: Optional[str] = None, with_total: bool = False) -> Dict:
+    """Find one page of books using keyset pagination.
+
+    Results are ordered by the searched column and ISBN, so the next page
+    resumes right after the last row instead of re-scanning earlier matches.
+    Passing a cursor continues the search it was created from.
+    """
+    try:
+        if cursor:
+            state = decode_cursor(cursor)
+            q, by = state.get("q", ""), state.get("by", "title")
+            page_size = state.get("n", page_size)
+            after = state["after"]
+            offset = state.get("offset", 0)
+        else:
+            after = None
+            offset = 0
+        page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    except (TypeError, ValueError) as e:
+        return {"error": str(e)}
+
+    by = by.lower()
+    if by not in ["title", "author"]:
+        by = "title"
 
-def create_order(customer_id: int, items: List[Dict]) -> Dict:
-    """Create a new order and reduce stock"""
     conn = get_connection()
-    cursor = conn.cursor()
-    
+    conn.row_factory = sqlite3.Row
+    cur = conn.cursor()
+
     try:
-        # Start transaction
-        conn.execute("BEGIN TRANSACTION")
-        
-        # Get book details first to track stock changes
-        stock_changes = {}
-        
-        # Validate all items first
-        for item in items:
-            isbn = item["isbn"]
-            qty = item["qty"]
-            
-            # Check if book exists and has enough stock
-            cursor.execute(
-                "SELECT title, stock FROM books WHERE isbn = ?", 
-                (isbn,)
-            )
-            book = cursor.fetchone()
-            
-            if not book:
-                raise ValueError(f"Book with ISBN {isbn} not found")
-            
-            title, stock = book
-            
-            if stock < qty:
-                raise ValueError(
-                    f"Insufficient stock for '{title}'. Available: {stock}, Requested: {qty}"
-                )
-            
-            # Store stock changes
-            stock_changes[isbn] = {
-                "title": title,
-                "old_stock": stock,
-                "new_stock": stock - qty
-            }
-        
-        # Create order
-        cursor.execute(
-            "INSERT INTO orders (customer_id, status) VALUES (?, ?)", 
-            (customer_id, 'created')
-        )
-        order_id = cursor.lastrowid
-        
-        # Process each item and reduce stock
-        for item in items:
-            isbn = item["isbn"]
-            qty = item["qty"]
-            
-            # Insert order item
-            cursor.execute(
-                "INSERT INTO order_items (order_id, isbn, qty) VALUES (?, ?, ?)",
-                (order_id, isbn, qty)
-            )
-            
-            # Reduce stock
-            cursor.execute(
-                "UPDATE books SET stock = stock - ? WHERE isbn = ?", 
-                (qty, isbn)
-            )
-        
-        conn.commit()
-        
-        # Calculate total amount
-        total_amount = 0.0
-        for item in items:
-            cursor.execute("SELECT price FROM books WHERE isbn = ?", (item["isbn"],))
-            price = cursor.fetchone()[0]
-            total_amount += price * item["qty"]
-        
-        # Get final stock levels
-        final_stock_info = []
-        for isbn, change in stock_changes.items():
-            cursor.execute("SELECT stock FROM books WHERE isbn = ?", (isbn,))
-            final_stock = cursor.fetchone()[0]
-            final_stock_info.append({
-                "title": change["title"],
-                "isbn": isbn,
-                "old_stock": change["old_stock"],
-                "new_stock": final_stock
+        sql = f"SELECT isbn, title, author, price, stock FROM books WHERE {by} LIKE ?"
+        params = [f"%{q}%"]
+        if after:
+            sql += f" AND ({by}, isbn) > (?, ?)"
+            params.extend(after)
+        sql += f" ORDER BY {by}, isbn LIMIT ?"
+        # Fetch one extra row to know whether another page exists
+        params.append(page_size + 1)
+
+        cur.execute(sql, params)
+        rows = [dict(row) for row in cur.fetchall()]
+
+        has_more = len(rows) > page_size
+        books = rows[:page_size]
+
+        next_cursor = None
+        if has_more:
+            last = books[-1]
+            next_cursor = encode_cursor({
+                "q": q,
+                "by": by,
+                "n": page_size,
+                "after": [last[by], last["isbn"]],
+                "offset": offset + len(books)
             })
-        
-        # Log tool call
-        save_tool_call("default_session", "create_order", 
-                      {"customer_id": customer_id, "items": items},
-                      {"order_id": order_id, "total_amount": total_amount, "stock_changes": final_stock_info})
-        
-        return {
-            "order_id": order_id,
-            "customer_id": customer_id,
-            "total_amount": total_amount,
-            "status": "created",
-            "items": items,
-            "stock_changes": final_stock_info, 
-            "message": f"Order #{order_id} created successfully"
+
+        result = {
+            "query": q,
+            "by": by,
+            "books": books,
+            "offset": offset,
+            "page_size": page_size,
+            "next_cursor": next_cursor
         }
-        
+
+        if with_total:
+            # Counting stops at COUNT_ESTIMATE_CAP so huge result sets stay cheap
+            cur.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM books WHERE {by} LIKE ? LIMIT ?)",
+                (f"%{q}%", COUNT_ESTIMATE_CAP)
+            )
+            total = cur.fetchone()[0]
+            result["total"] = total
+            result["total_is_estimate"] = total >= COUNT_ESTIMATE_CAP
+
+        return result
+
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
     finally:
         conn.close()
-def restock_book(isbn: str, qty: int) -> Dict:
-    """Restock a book by ISBN"""
+
+def iter_books(q: str = "", by: str = "title", batch_size: int = 500) -> Iterator[Dict]:
+    """Stream matching books without loading the whole result set"""
+    by = by.lower()
+    if by not in ["title", "author"]:
+        by = "title"
+
     conn = get_connection()
+    conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
-    
+
     try:
-        # Check if book exists
-        cursor.execute("SELECT title, stock FROM books WHERE isbn = ?", (isbn,))
-        book = cursor.fetchone()
-        
-        if not book:
-            return {"error": f"Book with ISBN {isbn} not found"}
-        
-        title, old_stock = book
-        
-        # Update stock
         cursor.execute(
-            "UPDATE books SET stock = stock + ? WHERE isbn = ?", 
-            (qty, isbn)
+            f"SELECT isbn, title, author, price, stock FROM books WHERE {by} LIKE ? ORDER BY {by}, isbn",
+            (f"%{q}%",)
         )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    finally:
+        conn.close()
+
+# When the last write was submitted; maintenance.py waits for quiet periods
+last_write_at = 0.0
+
+# Bumped after every committed change to book stock or prices, so caches
+# built from the books table (see inventory_analytics.py) know to reload
+books_version = 0
+
+def _books_changed():
+    global books_version
+    books_version += 1
+
+def run_write(fn, *args):
+    """Run fn(conn, *args) as one write transaction and return its result.
+    
+    fn issues its statements but never commits. With the writer actor
+    running (see writer.py) the command is queued and committed together
+    with whatever else is waiting; otherwise it runs here on a write
+    connection. Exceptions raised by fn roll its changes back and propagate.
+    """
+    global last_write_at
+    last_write_at = time.monotonic()
+    active = writer.active()
+    if active is not None and active.path == path:
+        return active.submit(fn, *args).result()
+    conn = get_connection(write=True)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        result = fn(conn, *args)
         conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def _create_orders_tx(conn, orders: List[tuple]) -> List[Dict]:
+    """Validate and apply a batch of (customer_id, items, log_session) orders in one transaction.
+    
+    The books of the whole batch are read with one query and their stock is
+    tracked in memory, so each order sees what the orders before it left.
+    An order that fails validation gets an {"error"} result and changes
+    nothing; the rest of the batch still goes through. Orders with a
+    log_session have their tool call logged in the same transaction.
+    """
+    cursor = conn.cursor()
+    
+    # Get book details for every order up front
+    books = {}
+    isbns = sorted({item["isbn"] for _, items, _ in orders for item in items
+                    if isinstance(item, dict) and isinstance(item.get("isbn"), str)})
+    for start in range(0, len(isbns), 500):
+        chunk = isbns[start:start + 500]
+        cursor.execute(
+            f"SELECT isbn, title, stock, price FROM books WHERE isbn IN ({','.join('?' * len(chunk))})",
+            chunk
+        )
+        for isbn, title, stock, price in cursor.fetchall():
+            books[isbn] = {"title": title, "stock": stock, "price": price}
+    
+    results = []
+    order_items = []
+    stock_used = {}
+    tool_calls = []
+    for customer_id, items, log_session in orders:
+        try:
+            result = _apply_order(cursor, books, customer_id, items, order_items, stock_used)
+        except ValueError as e:
+            result = {"error": str(e)}
+        else:
+            if log_session is not None:
+                tool_calls.append((log_session, "create_order",
+                                   json.dumps({"customer_id": customer_id, "items": items}, separators=JSON_SEPARATORS),
+                                   json.dumps(_order_log(result), separators=JSON_SEPARATORS)))
+        results.append(result)
+    
+    if order_items:
+        cursor.executemany(
+            "INSERT INTO order_items (order_id, isbn, qty, unit_price, line_total) VALUES (?, ?, ?, ?, ?)",
+            order_items
+        )
+        cursor.executemany(
+            "UPDATE books SET stock = stock - ? WHERE isbn = ?",
+            [(qty, isbn) for isbn, qty in stock_used.items()]
+        )
         
-        cursor.execute("SELECT stock FROM books WHERE isbn = ?", (isbn,))
-        new_stock = cursor.fetchone()[0]
-        save_tool_call("default_session", "restock_book",
-                      {"isbn": isbn, "qty": qty},
-                      {"title": title, "new_stock": new_stock})
-        
-        return {
+        # Fold the orders into the sales rollups and co-purchase tables in the same transaction
+        from analytics import refresh_rollups
+        from recommendations import refresh_recommendations
+        refresh_rollups(cursor)
+        refresh_recommendations(cursor)
+    
+    if tool_calls:
+        _insert_tool_calls(conn, tool_calls)
+    return results
+
+def _order_log(result: Dict) -> Dict:
+    return {"order_id": result["order_id"], "total_amount": result["total_amount"],
+            "stock_changes": result["stock_changes"]}
+
+def _apply_order(cursor, books: Dict, customer_id: int, items: List[Dict],
+                 order_items: List[tuple], stock_used: Dict) -> Dict:
+    # Validate all items first; a bad item rejects this order, not its batch
+    requested = {}
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get("isbn"), str):
+            raise ValueError(f"Order item {item!r} has no ISBN")
+        qty = item.get("qty")
+        if not isinstance(qty, int) or isinstance(qty, bool) or qty <= 0:
+            raise ValueError(f"Quantity for ISBN {item['isbn']} must be a positive whole number, got {qty!r}")
+        isbn = item["isbn"]
+        book = books.get(isbn)
+        if book is None:
+            raise ValueError(f"Book with ISBN {isbn} not found")
+        requested[isbn] = requested.get(isbn, 0) + item["qty"]
+        if book["stock"] < requested[isbn]:
+            raise ValueError(
+                f"Insufficient stock for '{book['title']}'. Available: {book['stock']}, Requested: {requested[isbn]}"
+            )
+    
+    # Snapshot the price so later price changes don't alter this order
+    total_amount = 0.0
+    for item in items:
+        total_amount += books[item["isbn"]]["price"] * item["qty"]
+    
+    cursor.execute(
+        "INSERT INTO orders (customer_id, status, total_amount) VALUES (?, ?, ?)", 
+        (customer_id, 'created', total_amount)
+    )
+    order_id = cursor.lastrowid
+    
+    for item in items:
+        unit_price = books[item["isbn"]]["price"]
+        order_items.append((order_id, item["isbn"], item["qty"], unit_price, unit_price * item["qty"]))
+    
+    # Reduce stock
+    stock_changes = []
+    for isbn, qty in requested.items():
+        book = books[isbn]
+        stock_changes.append({
+            "title": book["title"],
             "isbn": isbn,
-            "title": title,
-            "old_stock": old_stock,
-            "new_stock": new_stock,
-            "added": qty,
-            "message": f"Restocked {title} by {qty} copies. New stock: {new_stock}"
-        }
-        
+            "old_stock": book["stock"],
+            "new_stock": book["stock"] - qty
+        })
+        book["stock"] -= qty
+        stock_used[isbn] = stock_used.get(isbn, 0) + qty
+    
+    return {
+        "order_id": order_id,
+        "customer_id": customer_id,
+        "total_amount": total_amount,
+        "status": "created",
+        "items": items,
+        "stock_changes": stock_changes, 
+        "message": f"Order #{order_id} created successfully"
+    }
+
+@timed("db")
+def create_order(customer_id: int, items: List[Dict], log: bool = True) -> Dict:
+    """Create a new order and reduce stock.
+
+    The order is logged to tool_calls unless log is False, which tools
+    pass because they log the action themselves.
+    """
+    # Outside an agent turn the tool call is logged in the order's own transaction
+    work = uow.active()
+    log_session = get_current_session() if log and work is None else None
+    intake = order_intake.active()
+    try:
+        if intake is not None and intake.path == path:
+            # Order-intake mode: validated and committed with concurrent orders
+            result = intake.submit(customer_id, items, log_session).result()
+        else:
+            result = run_write(_create_orders_tx, [(customer_id, items, log_session)])[0]
     except Exception as e:
         return {"error": str(e)}
-    finally:
-        conn.close()
+    
+    if "error" not in result:
+        _books_changed()
+    if log and work is not None and "error" not in result:
+        work.defer_tool_call(get_current_session(), "create_order",
+                             {"customer_id": customer_id, "items": items}, _order_log(result))
+    return result
 
-def update_price(isbn: str, price: float) -> Dict:
-    """Update book price"""
-    conn = get_connection()
+def _restock_tx(conn, isbn: str, qty: int) -> Dict:
     cursor = conn.cursor()
     
+    # Check if book exists
+    cursor.execute("SELECT title, price, stock FROM books WHERE isbn = ?", (isbn,))
+    book = cursor.fetchone()
+    
+    if not book:
+        return {"error": f"Book with ISBN {isbn} not found"}
+    
+    title, price, old_stock = book
+    
+    # Update stock
+    cursor.execute(
+        "UPDATE books SET stock = stock + ? WHERE isbn = ?", 
+        (qty, isbn)
+    )
+    cursor.execute("SELECT stock FROM books WHERE isbn = ?", (isbn,))
+    new_stock = cursor.fetchone()[0]
+    
+    return {
+        "isbn": isbn,
+        "title": title,
+        "price": price,
+        "old_stock": old_stock,
+        "new_stock": new_stock,
+        "added": qty,
+        "message": f"Restocked {title} by {qty} copies. New stock: {new_stock}"
+    }
+
+@timed("db")
+def restock_book(isbn: str, qty: int, log: bool = True) -> Dict:
+    """Restock a book by ISBN; log=False leaves logging to the calling tool"""
     try:
-        # Check if book exists
-        cursor.execute("SELECT title FROM books WHERE isbn = ?", (isbn,))
-        book = cursor.fetchone()
-        
-        if not book:
-            return {"error": f"Book with ISBN {isbn} not found"}
-        
-        title = book[0]
-        
-        # Get old price
-        cursor.execute("SELECT price FROM books WHERE isbn = ?", (isbn,))
-        old_price = cursor.fetchone()[0]
-        
-        # Update price
-        cursor.execute("UPDATE books SET price = ? WHERE isbn = ?", (price, isbn))
-        conn.commit()
-        
-        # Log tool call
-        save_tool_call("default_session", "update_price",
-                      {"isbn": isbn, "price": price},
-                      {"title": title, "old_price": old_price, "new_price": price})
-        
-        return {
-            "isbn": isbn,
-            "title": title,
-            "old_price": old_price,
-            "new_price": price,
-            "message": f"Updated price of {title} from ${old_price:.2f} to ${price:.2f}"
-        }
-        
+        result = run_write(_restock_tx, isbn, qty)
     except Exception as e:
         return {"error": str(e)}
-    finally:
-        conn.close()
+    
+    if "error" not in result:
+        _books_changed()
+    if log and "error" not in result:
+        save_tool_call(get_current_session(), "restock_book",
+                      {"isbn": isbn, "qty": qty},
+                      {"title": result["title"], "new_stock": result["new_stock"]})
+    return result
+
+def _update_price_tx(conn, isbn: str, price: float) -> Dict:
+    cursor = conn.cursor()
+    
+    # Check if book exists and get its old price
+    cursor.execute("SELECT title, price FROM books WHERE isbn = ?", (isbn,))
+    book = cursor.fetchone()
+    
+    if not book:
+        return {"error": f"Book with ISBN {isbn} not found"}
+    
+    title, old_price = book
+    
+    # Update price
+    cursor.execute("UPDATE books SET price = ? WHERE isbn = ?", (price, isbn))
+    
+    return {
+        "isbn": isbn,
+        "title": title,
+        "old_price": old_price,
+        "new_price": price,
+        "message": f"Updated price of {title} from ${old_price:.2f} to ${price:.2f}"
+    }
+
+@timed("db")
+def update_price(isbn: str, price: float, log: bool = True) -> Dict:
+    """Update book price; log=False leaves logging to the calling tool"""
+    try:
+        result = run_write(_update_price_tx, isbn, price)
+    except Exception as e:
+        return {"error": str(e)}
+    
+    if "error" not in result:
+        _books_changed()
+    # Log tool call
+    if log and "error" not in result:
+        save_tool_call(get_current_session(), "update_price",
+                      {"isbn": isbn, "price": price},
+                      {"title": result["title"], "old_price": result["old_price"], "new_price": price})
+    return result
 
+@timed("db")
 def order_status(order_id: int) -> Dict:
     """Check order status"""
     conn = get_connection()
@@ -238,7 +499,7 @@ def order_status(order_id: int) -> Dict:
     try:
         # Get order details
         cursor.execute("""
-            SELECT o.id, o.customer_id, o.status, o.created_at,
+            SELECT o.id, o.customer_id, o.status, o.created_at, o.total_amount,
                    c.name, c.email
             FROM orders o
             JOIN customers c ON o.customer_id = c.id
@@ -252,23 +513,16 @@ def order_status(order_id: int) -> Dict:
         
         order_data = dict(order)
         
-        # Get order items and calculate total
+        # Get order items with the prices captured when the order was placed
         cursor.execute("""
-            SELECT b.isbn, b.title, b.author, b.price, oi.qty
+            SELECT b.isbn, b.title, b.author, oi.unit_price AS price, oi.qty,
+                   oi.line_total AS subtotal, b.stock
             FROM order_items oi
             JOIN books b ON oi.isbn = b.isbn
             WHERE oi.order_id = ?
         """, (order_id,))
         
-        items = []
-        total_amount = 0.0
-        
-        for row in cursor.fetchall():
-            item = dict(row)
-            subtotal = item["price"] * item["qty"]
-            total_amount += subtotal
-            item["subtotal"] = subtotal
-            items.append(item)
+        items = [dict(row) for row in cursor.fetchall()]
         
         # Return with proper field names
         return {
@@ -278,7 +532,7 @@ def order_status(order_id: int) -> Dict:
             "created_at": order_data["created_at"],
             "customer_name": order_data["name"],  
             "customer_email": order_data["email"],
-            "total_amount": total_amount,
+            "total_amount": order_data["total_amount"],
             "items": items,
             "item_count": len(items),
             "total_items": sum(item["qty"] for item in items)
@@ -289,6 +543,7 @@ def order_status(order_id: int) -> Dict:
     finally:
         conn.close()
 
+@timed("db")
 def inventory_summary(threshold: int = 5) -> Dict:
     """Get inventory summary"""
     conn = get_connection()
@@ -305,17 +560,11 @@ def inventory_summary(threshold: int = 5) -> Dict:
         
         low_stock = [dict(row) for row in cursor.fetchall()]
         
-        # Get total inventory value
-        cursor.execute("SELECT SUM(price * stock) FROM books")
-        total_value = cursor.fetchone()[0] or 0.0
-        
-        # Get total books count
-        cursor.execute("SELECT COUNT(*) FROM books")
-        total_books = cursor.fetchone()[0]
-        
-        # Get out of stock books
-        cursor.execute("SELECT COUNT(*) FROM books WHERE stock = 0")
-        out_of_stock = cursor.fetchone()[0]
+        # Totals in one pass over books
+        cursor.execute("SELECT COUNT(*), SUM(price * stock), SUM(stock = 0) FROM books")
+        total_books, total_value, out_of_stock = cursor.fetchone()
+        total_value = total_value or 0.0
+        out_of_stock = out_of_stock or 0
         
         return {
             "total_books": total_books,
@@ -332,38 +581,44 @@ def inventory_summary(threshold: int = 5) -> Dict:
     finally:
         conn.close()
 
+def _insert_messages(conn, rows: List[tuple]):
+    conn.executemany("INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)", rows)
+
+def _insert_tool_calls(conn, rows: List[tuple]):
+    conn.executemany(
+        "INSERT INTO tool_calls (session_id, name, args_json, result_json) VALUES (?, ?, ?, ?)",
+        rows
+    )
+
+@timed("db")
 def save_message(session_id: str, role: str, content: str):
     """Save a chat message to the database"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    # Inside an agent turn the row is written with the rest of the turn's log
+    work = uow.active()
+    if work is not None:
+        work.defer_message(session_id, role, content)
+        return
     
     try:
-        cursor.execute(
-            "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
-            (session_id, role, content)
-        )
-        conn.commit()
+        run_write(_insert_messages, [(session_id, role, content)])
     except Exception as e:
         print(f"Note: Could not save message - {e}")
-    finally:
-        conn.close()
 
+@timed("db")
 def save_tool_call(session_id: str, name: str, args: dict, result: dict):
     """Save a tool call to the database"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    work = uow.active()
+    if work is not None:
+        work.defer_tool_call(session_id, name, args, result)
+        return
     
     try:
-        cursor.execute(
-            "INSERT INTO tool_calls (session_id, name, args_json, result_json) VALUES (?, ?, ?, ?)",
-            (session_id, name, json.dumps(args), json.dumps(result))
-        )
-        conn.commit()
+        run_write(_insert_tool_calls, [(session_id, name, json.dumps(args, separators=JSON_SEPARATORS),
+                                       json.dumps(result, separators=JSON_SEPARATORS))])
     except Exception as e:
         print(f"Note: Could not save tool call - {e}")
-    finally:
-        conn.close()
 
+@timed("db")
 def get_chat_history(session_id: str, limit: int = 10) -> List[Dict]:
     """Get chat history for a session"""
     conn = get_connection()
@@ -385,6 +640,7 @@ def get_chat_history(session_id: str, limit: int = 10) -> List[Dict]:
     finally:
         conn.close()
 
+@timed("db")
 def get_customer_id(customer_input: str) -> Optional[int]:
     """Convert customer input to customer ID"""
     conn = get_connection()
@@ -423,6 +679,7 @@ def get_customer_id(customer_input: str) -> Optional[int]:
     finally:
         conn.close()
 
+@timed("db")
 def get_isbn_by_title(title: str) -> Optional[str]:
     """Get ISBN by book title"""
     conn = get_connection()
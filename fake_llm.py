@@ -0,0 +1,170 @@
+# fake_llm.py
+"""Deterministic stand-in for the LLM, for load tests without a model.
+
+FakeLLM implements the agent's backend interface, complete(messages,
+tools). It reads the user's message, picks the first scenario whose
+pattern matches and replays that scenario's tool calls one step at a
+time, the way a tool-calling model would. A later step can use an earlier
+step's tool output, e.g. restock the first ISBN that inventory_summary_tool
+listed. When the scenario runs out (or a lookup finds nothing) it answers
+in plain text.
+
+Every call sleeps for a latency drawn from a distribution:
+
+    none                     no delay
+    fixed:MS                 always MS milliseconds
+    uniform:LO,HI            uniform between LO and HI ms
+    lognormal:MEDIAN,SIGMA   long-tailed, like real model latency (default lognormal:600,0.5)
+
+Draws are seeded from the seed, the user's message and the step number,
+so a run gives the same calls and delays however its threads interleave.
+Scenarios are plain (pattern, planner) pairs in SCENARIOS; loadgen.py
+writes messages that match them.
+"""
+import hashlib
+import math
+import random
+import re
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_LATENCY = "lognormal:600,0.5"
+
+_ISBN = re.compile(r"\b97[89]\d{10}\b")
+_QUOTED = r'"([^"]+)"'
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """A function that draws one delay in milliseconds from `spec`"""
+    kind, _, params = (spec or "none").partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()]
+    if kind == "none":
+        return lambda rnd: 0.0
+    if kind == "fixed" and len(values) == 1:
+        return lambda rnd: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rnd: rnd.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda rnd: rnd.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown latency spec '{spec}' (use none, fixed:MS, uniform:LO,HI or lognormal:MEDIAN,SIGMA)")
+
+
+def _first_isbn(text: str) -> Optional[str]:
+    match = _ISBN.search(text or "")
+    return match.group(0) if match else None
+
+
+# Planners get the scenario's regex match and the tool outputs so far, and
+# return the next call as (tool name, arguments), or None when done.
+
+def _lookup_then_order(m, outputs: List[str]):
+    title, qty, customer = m.group(1), int(m.group(2)), m.group(3)
+    if not outputs:
+        return "find_books_tool", {"q": title}
+    if len(outputs) == 1 and _first_isbn(outputs[0]):
+        return "create_order_tool", {"book_title": title, "customer_input": customer, "quantity": qty}
+    return None
+
+
+def _reprice(m, outputs: List[str]):
+    title, price = m.group(1), float(m.group(2))
+    if not outputs:
+        return "find_books_tool", {"q": title}
+    isbn = _first_isbn(outputs[0])
+    if len(outputs) == 1 and isbn:
+        return "update_price_tool", {"isbn": isbn, "new_price": price}
+    return None
+
+
+def _restock_low(m, outputs: List[str]):
+    if not outputs:
+        return "inventory_summary_tool", {"mode": "restock", "limit": 5}
+    isbn = _first_isbn(outputs[0])
+    if len(outputs) == 1 and isbn:
+        return "restock_book_tool", {"isbn": isbn, "quantity": int(m.group(1))}
+    return None
+
+
+def _delivery(m, outputs: List[str]):
+    qty, title = int(m.group(1)), m.group(2)
+    if not outputs:
+        return "find_books_tool", {"q": title}
+    isbn = _first_isbn(outputs[0])
+    if len(outputs) == 1 and isbn:
+        return "restock_book_tool", {"isbn": isbn, "quantity": qty}
+    return None
+
+
+def _order_upsell(m, outputs: List[str]):
+    if not outputs:
+        return "order_status_tool", {"order_id": int(m.group(1))}
+    isbn = _first_isbn(outputs[0])
+    if len(outputs) == 1 and isbn:
+        return "similar_books_tool", {"isbn": isbn, "limit": 3}
+    return None
+
+
+def _sales_report(m, outputs: List[str]):
+    days = int(m.group(1))
+    steps = [("revenue_by_day_tool", {"days": days}), ("top_titles_tool", {"days": days, "limit": 5})]
+    return steps[len(outputs)] if len(outputs) < len(steps) else None
+
+
+def _topic(m, outputs: List[str]):
+    return None if outputs else ("books_about_tool", {"topic": m.group(1)})
+
+
+def _customer(m, outputs: List[str]):
+    return None if outputs else ("customer_value_tool", {"customer_input": m.group(1)})
+
+
+SCENARIOS: List[Tuple[re.Pattern, Callable]] = [
+    (re.compile(rf"do we have {_QUOTED} in stock\? if so,? order (\d+) for customer (\d+)", re.I), _lookup_then_order),
+    (re.compile(rf"change the price of {_QUOTED} to \$?(\d+(?:\.\d+)?)", re.I), _reprice),
+    (re.compile(r"which books are running low\? restock the most urgent one with (\d+)", re.I), _restock_low),
+    (re.compile(rf"we just got (\d+) copies of {_QUOTED}", re.I), _delivery),
+    (re.compile(r"what's in order (\d+) and what else could they buy", re.I), _order_upsell),
+    (re.compile(r"how were sales over the last (\d+) days", re.I), _sales_report),
+    (re.compile(rf"anything good to read on {_QUOTED}", re.I), _topic),
+    (re.compile(r"how much has customer (\d+) spent with us", re.I), _customer),
+]
+
+
+class FakeLLM:
+    def __init__(self, latency: str = DEFAULT_LATENCY, seed: int = 0, scenarios=SCENARIOS):
+        self.draw = parse_latency(latency)
+        self.seed = seed
+        self.scenarios = scenarios
+
+    def complete(self, messages: List[Dict], tools: List[Dict]) -> Dict:
+        """Sleep for one latency draw and return the scenario's next step"""
+        start = max(i for i, msg in enumerate(messages) if msg["role"] == "user")
+        message = messages[start]["content"]
+        outputs = [msg["content"] for msg in messages[start + 1:] if msg["role"] == "tool"]
+
+        key = f"{self.seed}:{message}:{len(outputs)}".encode("utf-8")
+        rnd = random.Random(int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big"))
+        delay = self.draw(rnd)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+        known = {schema["name"] for schema in tools}
+        for pattern, planner in self.scenarios:
+            m = pattern.search(message)
+            if m is None:
+                continue
+            step = planner(m, outputs)
+            if step is not None and step[0] in known:
+                name, arguments = step
+                return {"content": "", "tool_calls": [
+                    {"id": f"call_{len(outputs) + 1}", "name": name, "arguments": arguments}]}
+            break
+        return {"content": self._answer(outputs), "tool_calls": []}
+
+    @staticmethod
+    def _answer(outputs: List[str]) -> str:
+        if not outputs:
+            return "I'm a test model and can only follow the load-test scripts."
+        last = outputs[-1].strip().splitlines()
+        return "Done. " + (last[0] if last else "")
@@ -1,10 +1,18 @@
+import time
+_PROCESS_START = time.perf_counter()
+
 import customtkinter as ctk
 import uuid
 from datetime import datetime
 import threading
 import json
 import os
-from agent import CompatibleAgent
+import tracing
+
+# The agent and the tool stack are imported on a background thread after
+# the window is shown (see LibraryDeskGUI.warm_up). With LIBRARY_DESK_SERVER
+# set, the GUI is a thin client of a shared desk service instead (server.py).
+DESK_SERVER = os.environ.get("LIBRARY_DESK_SERVER")
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("dark-blue")
 class SessionManager:
@@ -65,15 +73,66 @@ class LibraryDeskGUI:
         # Initialize session manager
         self.session_manager = SessionManager()
         
-        # Initialize agent
+        # The agent is created once its imports finish loading
         self.current_session_id = str(uuid.uuid4())
-        self.agent = CompatibleAgent(session_id=self.current_session_id)
+        self.agent = None
+        self.agent_class = None
+        self.pending_history = None
         self.current_session_name = "New Session"
+        self.first_paint_ms = None
         
         # Setup GUI
         self.setup_gui()
         
         # Show agent status
+        self.set_warming_up()
+        master.after_idle(self.on_first_paint)
+        threading.Thread(target=self.warm_up, daemon=True).start()
+    
+    def set_warming_up(self):
+        """Keep input disabled until the agent is loaded"""
+        self.send_btn.configure(state="disabled")
+        self.status_label.configure(text="⏳ Warming up...")
+    
+    def on_first_paint(self):
+        """Record time from process start to the window being drawn"""
+        self.first_paint_ms = (time.perf_counter() - _PROCESS_START) * 1000.0
+        if os.environ.get("LIBRARY_STARTUP_REPORT"):
+            print(f"First paint after {self.first_paint_ms:.0f} ms")
+    
+    def warm_up(self):
+        """Import the agent stack in the background"""
+        started = time.perf_counter()
+        try:
+            with tracing.span("frontend.warm_up"):
+                from functools import partial
+                if DESK_SERVER:
+                    from client import RemoteAgent
+                    agent_class = partial(RemoteAgent, base_url=DESK_SERVER)
+                else:
+                    from agent import CompatibleAgent
+                    from llm_client import from_env
+                    agent_class = partial(CompatibleAgent, llm=from_env())
+            self.master.after(0, self.on_agent_loaded, agent_class, time.perf_counter() - started)
+        except Exception as e:
+            self.master.after(0, self.on_agent_failed, str(e))
+    
+    def on_agent_loaded(self, agent_class, seconds):
+        """Create the agent on the Tk thread once its imports are done"""
+        self.agent_class = agent_class
+        self.agent = agent_class(session_id=self.current_session_id)
+        if self.pending_history is not None:
+            self.agent.chat_history = self.pending_history
+            self.pending_history = None
+        self.send_btn.configure(state="normal")
+        self.status_label.configure(text="✅ Agent Ready")
+        if os.environ.get("LIBRARY_STARTUP_REPORT"):
+            print(f"Agent ready after {(time.perf_counter() - _PROCESS_START) * 1000.0:.0f} ms "
+                  f"(background load {seconds * 1000.0:.0f} ms)")
+    
+    def on_agent_failed(self, error):
+        self.status_label.configure(text="❌ Agent unavailable")
+        self.show_warning(f"Could not load the agent: {error}")
     
     def setup_gui(self):
         """Setup the GUI layout"""
@@ -290,7 +349,7 @@ Try asking:
     def send_message(self, event=None):
         """Send user message"""
         user_msg = self.user_input.get().strip()
-        if not user_msg:
+        if not user_msg or self.agent is None:
             return
         
         # Clear input
@@ -304,23 +363,32 @@ Try asking:
         self.send_btn.configure(state="disabled")
         self.status_label.configure(text="🔄 Processing...")
         
+        # The turn span covers everything until the reply is on screen
+        turn_span = tracing.begin_turn(self.current_session_id)
+        
         # Process in background
-        thread = threading.Thread(target=self.process_message, args=(user_msg,))
+        thread = threading.Thread(target=self.process_message, args=(user_msg, turn_span))
         thread.daemon = True
         thread.start()
     
-    def process_message(self, user_msg):
+    def process_message(self, user_msg, turn_span=None):
         """Process message in background thread"""
-        try:
-            response = self.agent.run(user_msg)
-            self.master.after(0, self.display_response, response)
-        except Exception as e:
-            error_msg = f"Error processing message: {str(e)}"
-            self.master.after(0, self.display_response, error_msg)
+        # The agent logs its tool calls against its own session
+        with tracing.use_span(turn_span):
+            try:
+                with tracing.span("agent.run", **{"message.chars": len(user_msg)}):
+                    response = self.agent.run(user_msg)
+                self.master.after(0, self.display_response, response, turn_span)
+            except Exception as e:
+                error_msg = f"Error processing message: {str(e)}"
+                if turn_span is not None:
+                    turn_span.set_error(str(e))
+                self.master.after(0, self.display_response, error_msg, turn_span)
     
-    def display_response(self, response):
+    def display_response(self, response, turn_span=None):
         """Display agent response"""
-        self.add_message("assistant", response)
+        with tracing.use_span(turn_span), tracing.span("frontend.display_response"):
+            self.add_message("assistant", response)
         
         # Re-enable input
         self.user_input.configure(state="normal")
@@ -329,6 +397,9 @@ Try asking:
         
         # Scroll to bottom
         self.chat_display._parent_canvas.yview_moveto(1.0)
+        
+        if turn_span is not None:
+            turn_span.end()
     
     def new_session(self):
         """Create new session"""
@@ -336,8 +407,9 @@ Try asking:
         self.current_session_name = f"Session {datetime.now().strftime('%H:%M')}"
         self.session_title.configure(text=self.current_session_name)
         
-        # Create new agent
-        self.agent = CompatibleAgent(session_id=self.current_session_id)
+        # Create new agent (or let warm-up create it for this session)
+        if self.agent_class is not None:
+            self.agent = self.agent_class(session_id=self.current_session_id)
         
         # Clear chat display
         for widget in self.chat_display.winfo_children():
@@ -348,7 +420,7 @@ Try asking:
     
     def save_current_session(self):
         """Save current session"""
-        chat_history = self.agent.get_chat_history()
+        chat_history = self.agent.get_chat_history() if self.agent is not None else []
         
         # Ask for session name
         dialog = ctk.CTkInputDialog(
@@ -432,7 +504,10 @@ Try asking:
                 self.add_message("assistant", msg['content'])
         
         # Update agent chat history
-        self.agent.chat_history = messages.copy()
+        if self.agent is not None:
+            self.agent.chat_history = messages.copy()
+        else:
+            self.pending_history = messages.copy()
         self.status_label.configure(text=f"📂 Loaded: {self.current_session_name}")
     
     def clear_chat(self):
@@ -440,12 +515,15 @@ Try asking:
         for widget in self.chat_display.winfo_children():
             widget.destroy()
         
-        self.agent.reset_chat()
+        if self.agent is not None:
+            self.agent.reset_chat()
         self.display_welcome()
         self.status_label.configure(text="🗑️ Chat Cleared")
 
 # Run the application
 if __name__ == "__main__":
+    import metrics
+    metrics.start_from_env()
     root = ctk.CTk()
     app = LibraryDeskGUI(root)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,247 @@
+# inventory_analytics.py
+import json
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+import db_functions
+# Aliased: `snapshot` is the usual name for an InventorySnapshot here
+import snapshot as db_snapshot
+
+
+# Reorder planning defaults
+DEFAULT_SALES_DAYS = 30
+DEFAULT_LEAD_TIME_DAYS = 7
+DEFAULT_SAFETY_DAYS = 3
+DEFAULT_COVER_DAYS = 30
+SNAPSHOT_TTL_SECONDS = 60.0
+
+# Cumulative revenue share boundaries for ABC classes
+ABC_A_SHARE = 0.80
+ABC_B_SHARE = 0.95
+
+_snapshots = {}
+
+
+ABC_LABELS = np.array(["A", "B", "C"])
+
+
+class InventorySnapshot:
+    """Columnar copy of the titles that sold in the window.
+
+    Titles without sales can never need restocking and always fall in
+    class C, so only their count is kept.
+    """
+
+    def __init__(self, isbns, price, stock, sold, days, total_titles):
+        self.isbns = isbns
+        self.price = price
+        self.stock = stock
+        self.sold = sold
+        self.days = days
+        self.total_titles = total_titles
+        self.loaded_at = time.monotonic()
+        self.books_version = None
+
+    def __len__(self):
+        return len(self.isbns)
+
+
+def load_snapshot(days: int = DEFAULT_SALES_DAYS, conn=None) -> InventorySnapshot:
+    """Read per-title sales over the last N days with price and stock in one bulk query.
+
+    Sales come from the daily rollup (see analytics.py), so the read is a
+    range scan over recent days joined to books by primary key. Inside
+    snapshot.reporting() that read runs on the report snapshot, and stock
+    and prices are then re-read from the live database.
+    """
+    from analytics import catch_up
+
+    own_conn = conn is None
+    if own_conn:
+        conn = db_functions.get_connection()
+    cursor = conn.cursor()
+
+    try:
+        catch_up(conn)
+        cursor.execute("""
+            SELECT s.isbn, b.price, b.stock, s.qty
+            FROM (
+                SELECT isbn, SUM(qty) AS qty
+                FROM sales_daily
+                WHERE day >= date('now', ?)
+                GROUP BY isbn
+            ) s
+            JOIN books b ON b.isbn = s.isbn
+        """, (f"-{max(int(days), 1) - 1} days",))
+        rows = cursor.fetchall()
+        cursor.execute("SELECT COUNT(*) FROM books")
+        total_titles = cursor.fetchone()[0]
+    finally:
+        if own_conn:
+            conn.close()
+
+    if rows and db_snapshot.current() is not None:
+        rows = _with_live_books(rows)
+
+    if rows:
+        isbns, price, stock, sold = zip(*rows)
+    else:
+        isbns, price, stock, sold = (), (), (), ()
+
+    return InventorySnapshot(
+        isbns=isbns,
+        price=np.fromiter(price, dtype=np.float64, count=len(rows)),
+        stock=np.fromiter(stock, dtype=np.int64, count=len(rows)),
+        sold=np.fromiter(sold, dtype=np.int64, count=len(rows)),
+        days=max(int(days), 1),
+        total_titles=total_titles
+    )
+
+
+def _with_live_books(rows):
+    """Replace price and stock in snapshot rows with the live values"""
+    with db_snapshot.live():
+        conn = db_functions.get_connection()
+        try:
+            live = {isbn: (price, stock) for isbn, price, stock in conn.execute(
+                "SELECT isbn, price, stock FROM books WHERE isbn IN (SELECT value FROM json_each(?))",
+                (json.dumps([row[0] for row in rows]),)
+            )}
+        finally:
+            conn.close()
+    # Titles deleted since the snapshot was taken drop out
+    return [(isbn,) + live[isbn] + (sold,) for isbn, _, _, sold in rows if isbn in live]
+
+
+def get_snapshot(days: int = DEFAULT_SALES_DAYS, max_age: float = SNAPSHOT_TTL_SECONDS) -> InventorySnapshot:
+    """Return a cached snapshot for the current database.
+
+    It is reloaded when older than max_age, or when stock or prices were
+    changed through db_functions since it was taken.
+    """
+    key = (db_functions.path, days)
+    snapshot = _snapshots.get(key)
+    if (snapshot is None or snapshot.books_version != db_functions.books_version
+            or time.monotonic() - snapshot.loaded_at > max_age):
+        # Read the version first: a write that lands during the load forces another reload
+        version = db_functions.books_version
+        snapshot = load_snapshot(days)
+        snapshot.books_version = version
+        _snapshots[key] = snapshot
+    return snapshot
+
+
+def invalidate_snapshots():
+    """Drop cached snapshots, e.g. after writing to books outside db_functions"""
+    _snapshots.clear()
+
+
+def abc_classes(revenue: np.ndarray) -> np.ndarray:
+    """Classify titles by their share of cumulative revenue.
+
+    Returns class codes 0, 1, 2 for A, B, C (see ABC_LABELS).
+    """
+    classes = np.full(revenue.shape, 2, dtype=np.int8)
+    total = revenue.sum()
+    if total <= 0:
+        return classes
+
+    order = np.argsort(-revenue, kind="stable")
+    sorted_revenue = revenue[order]
+    # A title belongs to the class its revenue starts in
+    start_share = (np.cumsum(sorted_revenue) - sorted_revenue) / total
+    ranked = np.searchsorted([ABC_A_SHARE, ABC_B_SHARE], start_share, side="right").astype(np.int8)
+    ranked[sorted_revenue <= 0] = 2
+    classes[order] = ranked
+    return classes
+
+
+def reorder_plan(snapshot: InventorySnapshot,
+                 lead_time_days: int = DEFAULT_LEAD_TIME_DAYS,
+                 safety_days: int = DEFAULT_SAFETY_DAYS,
+                 cover_days: int = DEFAULT_COVER_DAYS) -> Dict[str, np.ndarray]:
+    """Compute velocity, days of cover, reorder points and order quantities for every title"""
+    velocity = snapshot.sold / snapshot.days
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days_of_cover = np.where(velocity > 0, snapshot.stock / velocity, np.inf)
+
+    reorder_point = velocity * (lead_time_days + safety_days)
+    target_stock = velocity * (lead_time_days + cover_days)
+    suggested_qty = np.ceil(np.maximum(target_stock - snapshot.stock, 0)).astype(np.int64)
+    needs_restock = (velocity > 0) & (snapshot.stock <= reorder_point) & (suggested_qty > 0)
+
+    return {
+        "velocity": velocity,
+        "days_of_cover": days_of_cover,
+        "reorder_point": reorder_point,
+        "suggested_qty": suggested_qty,
+        "needs_restock": needs_restock,
+        "abc_class": abc_classes(snapshot.sold * snapshot.price)
+    }
+
+
+def restock_suggestions(limit: int = 10, days: int = DEFAULT_SALES_DAYS,
+                        lead_time_days: int = DEFAULT_LEAD_TIME_DAYS,
+                        snapshot: Optional[InventorySnapshot] = None) -> Dict:
+    """Rank titles that will run out before new stock can arrive"""
+    try:
+        limit = max(1, int(limit))
+        if snapshot is None:
+            snapshot = get_snapshot(days)
+        plan = reorder_plan(snapshot, lead_time_days=lead_time_days)
+
+        candidates = np.flatnonzero(plan["needs_restock"])
+        cover = plan["days_of_cover"][candidates]
+        revenue = (snapshot.sold * snapshot.price)[candidates]
+
+        # Only the top `limit` are sorted: partition first, then order that slice
+        if len(candidates) > limit:
+            top = np.argpartition(cover, limit - 1)[:limit]
+            candidates, cover, revenue = candidates[top], cover[top], revenue[top]
+        ranked = candidates[np.lexsort((-revenue, cover))]
+
+        counts = np.bincount(plan["abc_class"], minlength=3)
+        # Titles outside the snapshot had no sales, so they are all class C
+        counts[2] += snapshot.total_titles - len(snapshot)
+        suggestions = [{
+            "isbn": snapshot.isbns[i],
+            "stock": int(snapshot.stock[i]),
+            "sold": int(snapshot.sold[i]),
+            "velocity": round(float(plan["velocity"][i]), 3),
+            "days_of_cover": round(float(plan["days_of_cover"][i]), 1),
+            "reorder_point": round(float(plan["reorder_point"][i]), 1),
+            "suggested_qty": int(plan["suggested_qty"][i]),
+            "abc_class": str(ABC_LABELS[plan["abc_class"][i]])
+        } for i in ranked]
+        _attach_titles(suggestions)
+
+        return {
+            "days": snapshot.days,
+            "lead_time_days": lead_time_days,
+            "total_titles": snapshot.total_titles,
+            "restock_count": int(plan["needs_restock"].sum()),
+            "class_counts": {str(label): int(n) for label, n in zip(ABC_LABELS, counts)},
+            "suggestions": suggestions
+        }
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _attach_titles(suggestions):
+    """Look up titles and authors for the handful of ranked rows"""
+    if not suggestions:
+        return
+    conn = db_functions.get_connection()
+    try:
+        placeholders = ",".join("?" * len(suggestions))
+        rows = conn.execute(
+            f"SELECT isbn, title, author FROM books WHERE isbn IN ({placeholders})",
+            [s["isbn"] for s in suggestions]
+        ).fetchall()
+    finally:
+        conn.close()
+    names = {isbn: (title, author) for isbn, title, author in rows}
+    for s in suggestions:
+        s["title"], s["author"] = names.get(s["isbn"], ("Unknown", "Unknown"))
@@ -0,0 +1,416 @@
+# llm_client.py
+"""HTTP LLM backend for the desk agent.
+
+LLMClient talks to an OpenAI-compatible /chat/completions endpoint and
+implements the backend interface agent.py expects, complete(messages,
+tools). Clients are shared per base URL (see get_client), so every desk
+session in the service goes through the same:
+
+- keep-alive pool: one requests.Session with an HTTPAdapter holding up to
+  `max_concurrency` open connections. A turn reuses a warm connection
+  instead of paying TCP (and TLS) setup on every call.
+- concurrency cap: at most `max_concurrency` requests are in flight to the
+  backend. Extra calls queue here in arrival order (llm_queue_ms) rather
+  than piling onto a model server that is already saturated.
+- single-flight: identical requests (same model, messages and tools) that
+  are in flight at the same time are sent once. The other callers wait
+  for that reply and get their own copy of it.
+- retries: connection errors, timeouts, 429 and 5xx are retried up to
+  `retries` times with exponential backoff and full jitter. A Retry-After
+  header is honoured up to BACKOFF_MAX.
+
+The desk service and the GUI use it when LIBRARY_LLM_URL is set:
+
+    LIBRARY_LLM_URL=http://127.0.0.1:8000/v1 LIBRARY_LLM_MODEL=gpt-4o-mini python server.py
+
+A local stub server is included for testing without a model:
+
+    python llm_client.py --stub --port 8900                  # serve until Ctrl-C
+    python llm_client.py --bench 200 --concurrency 16        # stub + client, prints stats
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 60.0
+CONNECT_TIMEOUT = 5.0
+RETRIES = 3
+BACKOFF_BASE = 0.25
+BACKOFF_MAX = 8.0
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+_clients: Dict[str, "LLMClient"] = {}
+_clients_lock = threading.Lock()
+
+
+class LLMError(RuntimeError):
+    pass
+
+
+class _Retryable(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _FairSlots:
+    """Counting semaphore that hands free slots out in arrival order.
+
+    threading.Semaphore lets a thread that just released a slot take it
+    straight back, so under load some callers wait far longer than others.
+    Here a released slot goes to the longest waiter, which keeps the
+    queueing share of tail latency close to the median.
+    """
+
+    def __init__(self, size: int):
+        self._free = size
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._free and not self._waiters:
+                self._free -= 1
+                return
+            ready = threading.Event()
+            self._waiters.append(ready)
+        ready.wait()
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().set()
+            else:
+                self._free += 1
+
+
+def _wire_messages(messages: List[Dict]) -> List[Dict]:
+    """Agent messages in the chat completions format"""
+    wire = []
+    for message in messages:
+        if message.get("role") == "assistant" and message.get("tool_calls"):
+            wire.append({"role": "assistant", "content": message.get("content") or None, "tool_calls": [{
+                "id": call.get("id"),
+                "type": "function",
+                "function": {"name": call["name"],
+                             "arguments": json.dumps(call.get("arguments") or {}, separators=(",", ":"))}
+            } for call in message["tool_calls"]]})
+        elif message.get("role") == "tool":
+            wire.append({"role": "tool", "tool_call_id": message.get("tool_call_id"),
+                         "content": message.get("content") or ""})
+        else:
+            wire.append({"role": message["role"], "content": message.get("content") or ""})
+    return wire
+
+
+def _parse_reply(data: Dict) -> Dict:
+    """A chat completions response in the agent's {"content", "tool_calls"} shape"""
+    try:
+        message = data["choices"][0]["message"]
+    except (KeyError, IndexError, TypeError):
+        raise LLMError("Malformed LLM response: no choices[0].message")
+    calls = []
+    for call in message.get("tool_calls") or []:
+        function = call.get("function") or {}
+        arguments = function.get("arguments") or {}
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments) if arguments.strip() else {}
+            except ValueError:
+                arguments = {}
+        calls.append({"id": call.get("id"), "name": function.get("name"), "arguments": arguments})
+    return {"content": message.get("content") or "", "tool_calls": calls}
+
+
+class LLMClient:
+    def __init__(self, base_url: str, model: str = DEFAULT_MODEL, api_key: Optional[str] = None,
+                 max_concurrency: int = DEFAULT_CONCURRENCY, retries: int = RETRIES,
+                 timeout: float = DEFAULT_TIMEOUT, coalesce: bool = True):
+        self.base_url = base_url.rstrip("/")
+        self.url = self.base_url + "/chat/completions"
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.timeout = timeout
+        self.coalesce = coalesce
+        self.label = urlsplit(self.base_url).netloc or self.base_url
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Content-Type"] = "application/json"
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+        self._slots = _FairSlots(max_concurrency)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._latency = metrics.histogram("llm_latency_ms", self.label)
+        self._queue_wait = metrics.histogram("llm_queue_ms", self.label)
+        self.stats = {"calls": 0, "requests": 0, "coalesced": 0, "retries": 0, "failures": 0, "waiting": 0}
+
+    def complete(self, messages: List[Dict], tools: List[Dict]) -> Dict:
+        """One chat completion; identical concurrent calls share a single request"""
+        payload = {"model": self.model, "messages": _wire_messages(messages)}
+        if tools:
+            payload["tools"] = [{"type": "function", "function": schema} for schema in tools]
+        body = json.dumps(payload, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+        if not self.coalesce:
+            with self._lock:
+                self.stats["calls"] += 1
+            return self._send(body)
+
+        key = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            self.stats["calls"] += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            return copy.deepcopy(future.result())
+
+        try:
+            reply = self._send(body)
+            future.set_result(reply)
+            return reply
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def _send(self, body: bytes) -> Dict:
+        """POST with the concurrency cap, retrying transient failures"""
+        for attempt in range(self.retries + 1):
+            queued = time.perf_counter()
+            with self._lock:
+                self.stats["waiting"] += 1
+            self._slots.acquire()
+            try:
+                with self._lock:
+                    self.stats["waiting"] -= 1
+                    self.stats["requests"] += 1
+                start = time.perf_counter()
+                self._queue_wait.observe((start - queued) * 1000.0)
+                try:
+                    return self._post(body)
+                finally:
+                    self._latency.observe((time.perf_counter() - start) * 1000.0)
+            except _Retryable as e:
+                if attempt == self.retries:
+                    self._fail()
+                    raise LLMError(f"LLM request failed after {attempt + 1} attempts: {e}") from e
+                delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+                if e.retry_after is not None:
+                    delay = max(delay, min(e.retry_after, BACKOFF_MAX))
+                with self._lock:
+                    self.stats["retries"] += 1
+            except LLMError:
+                self._fail()
+                raise
+            finally:
+                self._slots.release()
+            # Back off without holding a slot, so other calls keep the backend busy
+            time.sleep(delay)
+
+    def _post(self, body: bytes) -> Dict:
+        try:
+            response = self.session.post(self.url, data=body, timeout=(CONNECT_TIMEOUT, self.timeout))
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise _Retryable(str(e))
+        if response.status_code in RETRY_STATUSES:
+            retry_after = response.headers.get("Retry-After")
+            try:
+                retry_after = float(retry_after) if retry_after else None
+            except ValueError:
+                retry_after = None
+            raise _Retryable(f"HTTP {response.status_code}", retry_after)
+        if response.status_code >= 400:
+            raise LLMError(f"LLM request failed: HTTP {response.status_code} {response.text[:200]}")
+        try:
+            return _parse_reply(response.json())
+        except ValueError:
+            raise LLMError("LLM response is not valid JSON")
+
+    def _fail(self):
+        with self._lock:
+            self.stats["failures"] += 1
+        metrics.record_error("llm", self.label)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return dict(self.stats, backend=self.label, max_concurrency=self.max_concurrency,
+                        in_flight=len(self._inflight))
+
+    def close(self):
+        self.session.close()
+
+
+def get_client(base_url: str, **kwargs) -> LLMClient:
+    """The shared client for `base_url`, created on first use"""
+    key = base_url.rstrip("/")
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = LLMClient(base_url, **kwargs)
+    return client
+
+
+def from_env() -> Optional[LLMClient]:
+    """The shared client configured by LIBRARY_LLM_* variables, or None"""
+    base_url = os.environ.get("LIBRARY_LLM_URL")
+    if not base_url:
+        return None
+    return get_client(
+        base_url,
+        model=os.environ.get("LIBRARY_LLM_MODEL", DEFAULT_MODEL),
+        api_key=os.environ.get("LIBRARY_LLM_API_KEY"),
+        max_concurrency=int(os.environ.get("LIBRARY_LLM_CONCURRENCY", DEFAULT_CONCURRENCY)),
+        retries=int(os.environ.get("LIBRARY_LLM_RETRIES", RETRIES)),
+        timeout=float(os.environ.get("LIBRARY_LLM_TIMEOUT", DEFAULT_TIMEOUT)),
+    )
+
+
+def active_snapshots() -> List[Dict]:
+    with _clients_lock:
+        clients = list(_clients.values())
+    return [client.snapshot() for client in clients]
+
+
+# Local stub server
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers /chat/completions by echoing the last user message.
+
+    Class attributes set the simulated latency and error rate and count
+    requests and TCP connections, so tests can check reuse and retries.
+    """
+    protocol_version = "HTTP/1.1"
+    delay = 0.05
+    error_rate = 0.0
+    connections = 0
+    requests = 0
+    _count_lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StubHandler._count_lock:
+            StubHandler.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with StubHandler._count_lock:
+            StubHandler.requests += 1
+        time.sleep(self.delay)
+        if not self.path.endswith("/chat/completions"):
+            return self._reply(404, {"error": "not found"})
+        if random.random() < self.error_rate:
+            return self._reply(503, {"error": "overloaded"})
+        try:
+            messages = json.loads(body)["messages"]
+        except (ValueError, KeyError):
+            return self._reply(400, {"error": "bad request"})
+        last = next((m.get("content") for m in reversed(messages) if m.get("role") == "user"), "")
+        self._reply(200, {"choices": [{"message": {"role": "assistant", "content": f"stub: {last}"}}]})
+
+    def _reply(self, status: int, payload: Dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(port: int = 0, host: str = "127.0.0.1", delay: float = 0.05,
+               error_rate: float = 0.0) -> ThreadingHTTPServer:
+    """Serve the stub on a background thread; port 0 picks a free port"""
+    StubHandler.delay = delay
+    StubHandler.error_rate = error_rate
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="llm-stub", daemon=True).start()
+    return server
+
+
+def bench(calls: int, concurrency: int, distinct: int, delay: float, error_rate: float) -> Dict:
+    """Drive a client against a fresh stub and summarise what reached the wire"""
+    server = start_stub(delay=delay, error_rate=error_rate)
+    client = LLMClient(f"http://127.0.0.1:{server.server_address[1]}/v1", max_concurrency=concurrency)
+    prompts = [[{"role": "user", "content": f"prompt {i % distinct}"}] for i in range(calls)]
+    latencies = []
+
+    def one(messages):
+        start = time.perf_counter()
+        client.complete(messages, [])
+        latencies.append((time.perf_counter() - start) * 1000.0)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency * 2) as executor:
+        list(executor.map(one, prompts))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    client.close()
+
+    latencies.sort()
+    return dict(client.snapshot(), seconds=round(elapsed, 3),
+                p50_ms=round(latencies[len(latencies) // 2], 1),
+                p99_ms=round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 1),
+                stub_requests=StubHandler.requests, stub_connections=StubHandler.connections)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM client stub server and load check")
+    parser.add_argument("--stub", action="store_true", help="Serve the stub until interrupted")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--delay-ms", type=float, default=50.0, help="Stub latency per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stub requests answered 503")
+    parser.add_argument("--bench", type=int, default=0, metavar="CALLS", help="Run CALLS completions against a stub")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--distinct", type=int, default=0, help="Distinct prompts in the bench (default: all)")
+    args = parser.parse_args()
+
+    if args.bench:
+        result = bench(args.bench, args.concurrency, args.distinct or args.bench,
+                       args.delay_ms / 1000.0, args.error_rate)
+        print(json.dumps(result, indent=2))
+    elif args.stub:
+        server = start_stub(args.port, delay=args.delay_ms / 1000.0, error_rate=args.error_rate)
+        print(f"LLM stub on http://127.0.0.1:{args.port}/v1")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+# loadgen.py
+"""Load generator: many desk sessions through the real agent and database.
+
+Every session is a thread that owns a CompatibleAgent, as the desk
+service gives each session its own agent. The LLM is the deterministic
+FakeLLM (fake_llm.py), so turns follow realistic tool-call sequences
+(look up then order, restock the most urgent title, order then upsell,
+sales report...) and pay model-like latency without calling a model.
+FAST_PATH_SHARE of the messages are commands the agent's router answers
+directly. Tools, the writer actor, order intake, the report snapshot
+and the reader pool are all the real ones, set up the way server.py sets
+them up, so contention on the database shows up as it would in production.
+
+The run reports turns per second, turn latency percentiles (overall, LLM
+turns and fast-path turns), per-tool latency, and database contention:
+connection wait, writer batches and commit time, order batches and any
+"database is locked" errors.
+
+    python loadgen.py --sessions 50 --turns 20 --rows 10000
+    python loadgen.py --db flibrary.db --sessions 50 --duration 60 --latency fixed:300
+    python loadgen.py --sessions 50 --turns 20 --no-service     # per-call connections, no writer actor
+
+--db is copied first; the run never writes to it.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import db_functions
+import metrics
+import order_intake
+import pool
+import snapshot
+import writer as db_writer
+from benchmark import WORDS, generate_dataset, percentile
+from fake_llm import DEFAULT_LATENCY, FakeLLM
+
+FAST_PATH_SHARE = 0.3
+SAMPLE_BOOKS = 500
+
+
+class Workload:
+    """Draws desk messages from the books, customers and orders in the database"""
+
+    def __init__(self, rnd: random.Random):
+        conn = db_functions.get_connection()
+        try:
+            self.books = conn.execute(
+                "SELECT isbn, title FROM books ORDER BY random() LIMIT ?", (SAMPLE_BOOKS,)).fetchall()
+            self.customers = conn.execute("SELECT COALESCE(MAX(id), 1) FROM customers").fetchone()[0]
+            self.orders = conn.execute("SELECT COALESCE(MAX(id), 1) FROM orders").fetchone()[0]
+        finally:
+            conn.close()
+        if not self.books:
+            raise ValueError("The database has no books to generate load from")
+        self.rnd = rnd
+
+    def message(self) -> str:
+        rnd = self.rnd
+        isbn, title = rnd.choice(self.books)
+        customer = rnd.randint(1, self.customers)
+        if rnd.random() < FAST_PATH_SHARE:
+            return rnd.choice([
+                f"order {rnd.randint(1, self.orders)}",
+                f"find {rnd.choice(WORDS)}",
+                f"similar to {isbn}",
+                "inventory summary",
+                "top 5 titles",
+                f"customer value {customer}",
+            ])
+        return rnd.choices([
+            f'Do we have "{title}" in stock? If so, order {rnd.randint(1, 3)} for customer {customer}',
+            f'Please change the price of "{title}" to {rnd.randint(10, 90)}.99',
+            f"Which books are running low? Restock the most urgent one with {rnd.choice([5, 10, 20])}",
+            f'We just got {rnd.choice([5, 10, 20])} copies of "{title}", please add them to stock',
+            f"What's in order {rnd.randint(1, self.orders)} and what else could they buy?",
+            f"How were sales over the last {rnd.choice([7, 30])} days?",
+            f'Anything good to read on "{rnd.choice(WORDS).lower()}"?',
+            f"How much has customer {customer} spent with us?",
+        ], weights=[30, 5, 3, 5, 20, 10, 17, 10])[0]
+
+
+class LoadGenerator:
+    def __init__(self, sessions: int, turns: int = 0, duration: float = 0.0, latency: str = DEFAULT_LATENCY,
+                 think_ms: float = 0.0, seed: int = 42):
+        self.sessions = sessions
+        self.turns = turns
+        self.duration = duration
+        self.latency = latency
+        self.think_ms = think_ms
+        self.seed = seed
+        self.results: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def _session(self, index: int, deadline: Optional[float]):
+        from agent import CompatibleAgent, route
+
+        rnd = random.Random(self.seed * 1000003 + index)
+        workload = Workload(rnd)
+        agent = CompatibleAgent(f"load-{self.seed}-{index}", llm=FakeLLM(self.latency, seed=self.seed))
+        done = 0
+        while (deadline is None and done < self.turns) or (deadline is not None and time.perf_counter() < deadline):
+            message = workload.message()
+            start = time.perf_counter()
+            error = None
+            try:
+                response = agent.run(message)
+                if response.startswith(("Error", "❌")):
+                    error = response.splitlines()[0]
+            except Exception as e:
+                error = str(e)
+            elapsed = (time.perf_counter() - start) * 1000.0
+            with self._lock:
+                self.results.append({"ms": elapsed, "fast": route(message) is not None, "error": error})
+            done += 1
+            if self.think_ms:
+                time.sleep(rnd.expovariate(1.0 / self.think_ms) / 1000.0)
+
+    def run(self) -> Dict:
+        metrics.reset()
+        deadline = time.perf_counter() + self.duration if self.duration else None
+        threads = [threading.Thread(target=self._session, args=(i, deadline), name=f"load-{i}")
+                   for i in range(self.sessions)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.report(time.perf_counter() - start)
+
+    def report(self, seconds: float) -> Dict:
+        def latency(rows: List[Dict]) -> Dict:
+            values = sorted(r["ms"] for r in rows)
+            return {"turns": len(values),
+                    "p50_ms": round(percentile(values, 50), 1),
+                    "p90_ms": round(percentile(values, 90), 1),
+                    "p99_ms": round(percentile(values, 99), 1),
+                    "max_ms": round(values[-1], 1) if values else 0.0}
+
+        errors = [r["error"] for r in self.results if r["error"]]
+        tools = {row["name"]: {"calls": row["count"], "mean_ms": round(row["mean_ms"], 2),
+                               "p50_ms": row["p50_ms"], "p95_ms": row["p95_ms"], "errors": row["errors"]}
+                 for row in metrics.summary() if row["metric"] == "tool_latency_ms"}
+        wait = metrics.histogram("db_connection_wait_ms", "get_connection")
+        commit = metrics.histogram("writer_commit_ms", "writer")
+        batch = metrics.histogram("writer_batch_size", "writer", metrics.ROW_BUCKETS)
+        _, batch_total, batch_count = batch.snapshot()
+        shared, actor, intake = pool.active(), db_writer.active(), order_intake.active()
+
+        return {
+            "sessions": self.sessions,
+            "seconds": round(seconds, 2),
+            "turns_per_sec": round(len(self.results) / seconds, 2) if seconds else 0.0,
+            "latency": latency(self.results),
+            "llm_turns": latency([r for r in self.results if not r["fast"]]),
+            "fast_path_turns": latency([r for r in self.results if r["fast"]]),
+            "errors": len(errors),
+            "locked_errors": sum(1 for e in errors if "locked" in e),
+            "sample_errors": sorted(set(errors))[:5],
+            "tools": tools,
+            "contention": {
+                "connection_wait_p50_ms": wait.quantile(0.50),
+                "connection_wait_p99_ms": wait.quantile(0.99),
+                "writer_commit_p99_ms": commit.quantile(0.99),
+                "writer_mean_batch": round(batch_total / batch_count, 2) if batch_count else 0.0,
+                "writer": actor.snapshot() if actor else None,
+                "pool": shared.snapshot() if shared else None,
+                "orders": intake.snapshot() if intake else None,
+            },
+        }
+
+
+def copy_database(source: str, dest: str):
+    """Consistent copy of `source`, including anything still in its WAL"""
+    src, dst = sqlite3.connect(source), sqlite3.connect(dest)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive many desk sessions through the agent with a fake LLM")
+    parser.add_argument("--sessions", type=int, default=50, help="Concurrent desk sessions")
+    parser.add_argument("--turns", type=int, default=20, help="Turns per session (ignored with --duration)")
+    parser.add_argument("--duration", type=float, default=0.0, help="Run for this many seconds instead")
+    parser.add_argument("--latency", default=DEFAULT_LATENCY,
+                        help="Fake LLM latency: none, fixed:MS, uniform:LO,HI or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Mean pause between a session's turns")
+    parser.add_argument("--rows", type=int, default=10000, help="Books in the generated database")
+    parser.add_argument("--db", help="Copy this database instead of generating one")
+    parser.add_argument("--no-service", action="store_true",
+                        help="Skip the reader pool, writer actor, order intake and report snapshot")
+    parser.add_argument("--pool-size", type=int, default=pool.DEFAULT_SIZE)
+    parser.add_argument("--order-window-ms", type=float, default=order_intake.WINDOW_MS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="library-load-"), "load.db")
+    if args.db:
+        copy_database(args.db, db_path)
+        db_functions.path = db_path
+    else:
+        print(f"Generating {args.rows} books in {db_path}...")
+        generate_dataset(db_path, args.rows)
+
+    if not args.no_service:
+        pool.enable(db_path, args.pool_size)
+        db_functions.get_connection().close()
+        db_writer.start(db_path)
+        if args.order_window_ms > 0:
+            order_intake.start(db_path, args.order_window_ms)
+        snapshot.start(db_path)
+
+    target = f"{args.duration:g} s" if args.duration else f"{args.turns} turns each"
+    print(f"Running {args.sessions} sessions for {target}, LLM latency {args.latency}...")
+    try:
+        report = LoadGenerator(args.sessions, args.turns, args.duration, args.latency,
+                               args.think_ms, args.seed).run()
+    finally:
+        snapshot.stop()
+        order_intake.stop()
+        db_writer.stop()
+        pool.disable()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+# maintenance.py
+"""Background database maintenance.
+
+Long-running processes (the desk service) start a MaintenanceScheduler. It
+wakes up every TICK_SECONDS and, once no write has happened for
+IDLE_SECONDS, runs whichever tasks are due:
+
+    checkpoint          PRAGMA wal_checkpoint, PASSIVE; TRUNCATE once the WAL
+                        is over WAL_TRUNCATE_BYTES
+    optimize            PRAGMA optimize (re-analyzes tables whose plans may
+                        have drifted)
+    analyze             full ANALYZE with an analysis_limit
+    incremental_vacuum  returns up to VACUUM_PAGES free pages to the OS
+                        (needs auto_vacuum=INCREMENTAL, see --convert)
+    retention           archive old logs (see retention.py), at most
+                        RETENTION_ROWS_PER_RUN rows per run
+
+Each run has a time budget. A task only starts while budget is left, and
+each task is bounded on its own (analysis_limit, page count, PASSIVE
+checkpoint), so desk traffic waits at most for one short task. Tasks that
+write go through db_functions.run_write() and queue behind desk writes
+like any other command. A task that reports "more": True stays due, so
+the next idle window carries on where it stopped.
+
+Every run logs the time it took and the bytes it reclaimed, and the last
+results are kept in history for /health.
+
+    python maintenance.py --all              # run every task once
+    python maintenance.py --convert          # switch to incremental vacuum (one VACUUM)
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import db_functions
+import metrics
+
+TICK_SECONDS = 15.0
+IDLE_SECONDS = 5.0
+BUDGET_MS = 250.0
+ANALYSIS_LIMIT = 400
+VACUUM_PAGES = 2000
+WAL_TRUNCATE_BYTES = 64 * 1024 * 1024
+HISTORY_SIZE = 50
+RETENTION_ROWS_PER_RUN = 5000
+
+_active: Optional["MaintenanceScheduler"] = None
+
+
+def _file_bytes() -> int:
+    """Size of the database file plus its WAL"""
+    total = 0
+    for suffix in ("", "-wal"):
+        try:
+            total += os.path.getsize(db_functions.path + suffix)
+        except OSError:
+            pass
+    return total
+
+
+# Tasks. Each returns a dict of details for the log.
+
+def _optimize_tx(conn) -> Dict:
+    conn.execute("PRAGMA optimize").fetchall()
+    return {}
+
+
+def _analyze_tx(conn) -> Dict:
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("ANALYZE")
+    return {}
+
+
+def _incremental_vacuum_tx(conn) -> Dict:
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return {"skipped": "auto_vacuum is not INCREMENTAL (run maintenance.py --convert)"}
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    released = min(free, VACUUM_PAGES)
+    # The sqlite3 module steps this pragma once per execute, and each step frees one page
+    for _ in range(released):
+        conn.execute("PRAGMA incremental_vacuum(1)")
+    return {"free_pages": free, "released_pages": released}
+
+
+def optimize() -> Dict:
+    return db_functions.run_write(_optimize_tx)
+
+
+def analyze() -> Dict:
+    return db_functions.run_write(_analyze_tx)
+
+
+def incremental_vacuum() -> Dict:
+    return db_functions.run_write(_incremental_vacuum_tx)
+
+
+def checkpoint() -> Dict:
+    """Checkpoint the WAL without waiting on readers or the writer"""
+    conn = sqlite3.connect(db_functions.path, timeout=0.05)
+    try:
+        if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+            return {"skipped": "not in WAL mode"}
+        busy, frames, done = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        mode = "PASSIVE"
+        try:
+            wal_bytes = os.path.getsize(db_functions.path + "-wal")
+        except OSError:
+            wal_bytes = 0
+        if not busy and frames == done and wal_bytes > WAL_TRUNCATE_BYTES:
+            # Everything is in the database file; shrink the WAL back to zero
+            busy, frames, done = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            mode = "TRUNCATE"
+        return {"mode": mode, "busy": bool(busy), "wal_frames": frames, "checkpointed": done}
+    finally:
+        conn.close()
+
+
+def archive_old_logs() -> Dict:
+    import retention
+    return retention.archive_logs(max_rows=RETENTION_ROWS_PER_RUN)
+
+
+class Task:
+    def __init__(self, name: str, fn: Callable[[], Dict], interval: float):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.last_run = 0.0
+
+    def due(self, now: float) -> bool:
+        return now - self.last_run >= self.interval
+
+
+def default_tasks() -> List[Task]:
+    """Cheapest and most frequent first; a run goes down the list while budget lasts.
+
+    In WAL mode the file only shrinks when the pages an incremental vacuum
+    released are checkpointed, so the vacuum runs just before the checkpoint.
+    """
+    return [
+        Task("incremental_vacuum", incremental_vacuum, 600.0),
+        Task("checkpoint", checkpoint, 60.0),
+        Task("optimize", optimize, 3600.0),
+        Task("analyze", analyze, 86400.0),
+        Task("retention", archive_old_logs, 86400.0),
+    ]
+
+
+def run_task(task: Task) -> Dict:
+    """Run one task and record how long it took and what it reclaimed"""
+    before = _file_bytes()
+    start = time.perf_counter()
+    try:
+        details = task.fn() or {}
+    except Exception as e:
+        details = {"error": str(e)}
+    elapsed_ms = (time.perf_counter() - start) * 1000.0
+    reclaimed = before - _file_bytes()
+    if not details.get("more"):
+        task.last_run = time.monotonic()
+    metrics.histogram("maintenance_ms", task.name).observe(elapsed_ms)
+
+    entry = {"task": task.name, "ms": round(elapsed_ms, 2), "reclaimed_bytes": max(0, reclaimed),
+             "at": time.strftime("%Y-%m-%d %H:%M:%S"), **details}
+    if "error" in details:
+        print(f"Note: maintenance {task.name} failed after {elapsed_ms:.1f} ms - {details['error']}")
+    elif "skipped" in details:
+        print(f"Note: maintenance {task.name} skipped - {details['skipped']}")
+    else:
+        print(f"Note: maintenance {task.name} took {elapsed_ms:.1f} ms, reclaimed {max(0, reclaimed)} bytes")
+    return entry
+
+
+class MaintenanceScheduler:
+    def __init__(self, tasks: Optional[List[Task]] = None, budget_ms: float = BUDGET_MS,
+                 idle_seconds: float = IDLE_SECONDS, tick: float = TICK_SECONDS):
+        self.tasks = tasks if tasks is not None else default_tasks()
+        self.budget_ms = budget_ms
+        self.idle_seconds = idle_seconds
+        self.tick = tick
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="db-maintenance", daemon=True)
+        # Nothing is due right after startup; the first window comes one interval in
+        now = time.monotonic()
+        for task in self.tasks:
+            task.last_run = now
+
+    def idle(self) -> bool:
+        return time.monotonic() - db_functions.last_write_at >= self.idle_seconds
+
+    def run_due(self, force: bool = False) -> List[Dict]:
+        """Run due tasks (all tasks with force=True) until the budget is spent"""
+        start = time.perf_counter()
+        results = []
+        for task in self.tasks:
+            if (time.perf_counter() - start) * 1000.0 >= self.budget_ms and not force:
+                break
+            if force or task.due(time.monotonic()):
+                entry = run_task(task)
+                self.history.append(entry)
+                results.append(entry)
+        return results
+
+    def _run(self):
+        while not self._stop.wait(self.tick):
+            if self.idle():
+                self.run_due()
+
+    def start(self) -> "MaintenanceScheduler":
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def snapshot(self) -> Dict:
+        return {"budget_ms": self.budget_ms, "recent": list(self.history)[-10:]}
+
+
+def convert_to_incremental() -> Dict:
+    """Switch the database to auto_vacuum=INCREMENTAL; rebuilds it with one VACUUM"""
+    conn = sqlite3.connect(db_functions.path, isolation_level=None)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return {"message": "auto_vacuum is already INCREMENTAL"}
+        before = _file_bytes()
+        start = time.perf_counter()
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        return {"message": f"Converted to incremental vacuum in {elapsed_ms:.0f} ms, "
+                           f"reclaimed {max(0, before - _file_bytes())} bytes"}
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        conn.close()
+
+
+def start(**kwargs) -> MaintenanceScheduler:
+    """Start the process-wide maintenance scheduler"""
+    global _active
+    stop()
+    _active = MaintenanceScheduler(**kwargs).start()
+    return _active
+
+
+def stop():
+    global _active
+    if _active is not None:
+        _active.stop()
+        _active = None
+
+
+def active() -> Optional[MaintenanceScheduler]:
+    return _active
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run database maintenance tasks")
+    parser.add_argument("--all", action="store_true", help="Run every task once, ignoring the budget")
+    parser.add_argument("--convert", action="store_true",
+                        help="Switch to auto_vacuum=INCREMENTAL first (rewrites the database)")
+    parser.add_argument("--db", default=None, help="Database path (default: db_functions.path)")
+    args = parser.parse_args()
+
+    if args.db:
+        db_functions.path = args.db
+    if args.convert:
+        result = convert_to_incremental()
+        print(result.get("error") or result["message"])
+    if args.all or not args.convert:
+        tasks = default_tasks() if args.all else [t for t in default_tasks() if t.name != "retention"]
+        MaintenanceScheduler(tasks).run_due(force=True)
+
+
+if __name__ == "__main__":
+    main()
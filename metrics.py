@@ -0,0 +1,311 @@
+# metrics.py
+"""In-process latency metrics for tools and database calls.
+
+Every tool and db_functions call is wrapped with @timed, which records
+latency, rows returned and errors into fixed-bucket histograms. The
+numbers can be scraped in Prometheus text format from a local HTTP
+endpoint or printed periodically as a log summary.
+
+Environment variables:
+    LIBRARY_METRICS=0                  disable recording entirely
+    LIBRARY_METRICS_PORT=9108          serve /metrics on 127.0.0.1:<port>
+    LIBRARY_METRICS_LOG_INTERVAL=60    log a summary every N seconds
+"""
+import functools
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+import tracing
+
+logger = logging.getLogger("library.metrics")
+
+ENABLED = os.environ.get("LIBRARY_METRICS", "1") != "0"
+
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+ROW_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 500, 1000, 10000, 100000)
+SIZE_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+HELP = {
+    "tool_latency_ms": "Agent tool call latency in milliseconds",
+    "tool_output_chars": "Characters in rendered agent tool output",
+    "db_latency_ms": "db_functions call latency in milliseconds",
+    "db_rows": "Rows returned by db_functions calls",
+    "db_connection_wait_ms": "Time spent opening a database connection in milliseconds",
+    "writer_batch_size": "Write commands committed together by the writer actor",
+    "writer_commit_ms": "Writer actor batch transaction time in milliseconds",
+    "order_batch_size": "Orders validated and committed together by order intake",
+    "maintenance_ms": "Database maintenance task time in milliseconds",
+    "llm_latency_ms": "LLM backend HTTP request time in milliseconds, per attempt",
+    "llm_queue_ms": "Time an LLM request waited for a backend concurrency slot in milliseconds",
+    "llm_prompt_tokens": "Estimated LLM input tokens per agent turn, summed over its tool steps",
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram, safe to observe from several threads"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        # acquire/release is measurably cheaper than `with` on this hot path
+        self._lock.acquire()
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+        self._lock.release()
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket that contains it"""
+        counts, _, count = self.snapshot()
+        if not count:
+            return 0.0
+        target = q * count
+        seen = 0
+        for bound, n in zip(self.buckets, counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+_histograms: Dict[Tuple[str, str], Histogram] = {}
+_errors: Dict[Tuple[str, str], int] = {}
+_registry_lock = threading.Lock()
+
+
+def histogram(metric: str, name: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS_MS) -> Histogram:
+    """Get or create the histogram for a metric and call name"""
+    key = (metric, name)
+    hist = _histograms.get(key)
+    if hist is None:
+        with _registry_lock:
+            hist = _histograms.setdefault(key, Histogram(buckets))
+    return hist
+
+
+def record_error(kind: str, name: str):
+    with _registry_lock:
+        _errors[(kind, name)] = _errors.get((kind, name), 0) + 1
+
+
+def _row_count(result) -> int:
+    """Best-effort number of rows in a db_functions result"""
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        lists = [len(v) for v in result.values() if isinstance(v, list)]
+        return sum(lists) if lists else 1
+    return 0 if result is None else 1
+
+
+def timed(kind: str, name: str = None):
+    """Record latency and result size of every call to the decorated function.
+
+    kind is "tool" or "db". Histograms are looked up once at decoration
+    time, so a call costs two perf_counter reads and two observations
+    (about 2-3 µs, well under 1% of a sub-millisecond db call).
+    When tracing is configured, each call also gets a "<kind>.<name>" span.
+    """
+    def decorator(fn):
+        label = name or fn.__name__
+        latency = histogram(f"{kind}_latency_ms", label)
+        # Tool output is measured when rendered (see results.py), so no
+        # tool_output_chars series is declared here to sit at zero
+        size = None if kind == "tool" else histogram(f"{kind}_rows", label, ROW_BUCKETS)
+
+        span_name = f"{kind}.{label}"
+
+        def measured(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                latency.observe((time.perf_counter() - start) * 1000.0)
+                record_error(kind, label)
+                raise
+            latency.observe((time.perf_counter() - start) * 1000.0)
+
+            if kind == "tool":
+                # Structured results are measured when rendered (see results.py)
+                if isinstance(result, str):
+                    histogram("tool_output_chars", label, SIZE_BUCKETS).observe(len(result))
+                elif getattr(result, "error", None):
+                    record_error(kind, label)
+            elif isinstance(result, dict) and "error" in result:
+                record_error(kind, label)
+            else:
+                size.observe(_row_count(result))
+            return result
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracing.ENABLED:
+                return measured(*args, **kwargs)
+            with tracing.span(span_name) as span:
+                result = measured(*args, **kwargs)
+                if isinstance(result, dict) and "error" in result:
+                    span.set_error(str(result["error"]))
+                elif kind == "tool":
+                    if getattr(result, "error", None):
+                        span.set_error(result.error)
+                    elif isinstance(result, str):
+                        span.set_attribute("tool.output_chars", len(result))
+                else:
+                    span.set_attribute("db.rows", _row_count(result))
+                return result
+
+        return wrapper
+    return decorator
+
+
+_connection_wait = histogram("db_connection_wait_ms", "get_connection")
+
+
+def observe_connection_wait(ms: float):
+    if ENABLED:
+        _connection_wait.observe(ms)
+
+
+def _format_bound(bound: float) -> str:
+    return str(int(bound)) if float(bound).is_integer() else str(bound)
+
+
+def render_prometheus() -> str:
+    """Render every histogram and error counter in Prometheus text format"""
+    lines = []
+    by_metric: Dict[str, List[Tuple[str, Histogram]]] = {}
+    # Copy under the lock: other threads may register histograms meanwhile
+    with _registry_lock:
+        histograms = sorted(_histograms.items())
+        errors = sorted(_errors.items())
+    for (metric, name), hist in histograms:
+        by_metric.setdefault(metric, []).append((name, hist))
+
+    for metric, entries in by_metric.items():
+        full = f"library_{metric}"
+        lines.append(f"# HELP {full} {HELP.get(metric, metric)}")
+        lines.append(f"# TYPE {full} histogram")
+        for name, hist in entries:
+            counts, total, count = hist.snapshot()
+            cumulative = 0
+            for bound, n in zip(hist.buckets, counts):
+                cumulative += n
+                lines.append(f'{full}_bucket{{name="{name}",le="{_format_bound(bound)}"}} {cumulative}')
+            lines.append(f'{full}_bucket{{name="{name}",le="+Inf"}} {count}')
+            lines.append(f'{full}_sum{{name="{name}"}} {total:.6f}')
+            lines.append(f'{full}_count{{name="{name}"}} {count}')
+
+    lines.append("# HELP library_errors_total Calls that raised or returned an error")
+    lines.append("# TYPE library_errors_total counter")
+    for (kind, name), n in errors:
+        lines.append(f'library_errors_total{{kind="{kind}",name="{name}"}} {n}')
+
+    return "\n".join(lines) + "\n"
+
+
+def summary() -> List[Dict]:
+    """Per-call latency summary, slowest p95 first"""
+    rows = []
+    with _registry_lock:
+        histograms = list(_histograms.items())
+        errors = dict(_errors)
+    for (metric, name), hist in histograms:
+        if not metric.endswith("_latency_ms") and metric != "db_connection_wait_ms":
+            continue
+        _, total, count = hist.snapshot()
+        if not count:
+            continue
+        rows.append({
+            "metric": metric,
+            "name": name,
+            "count": count,
+            "mean_ms": total / count,
+            "p50_ms": hist.quantile(0.50),
+            "p95_ms": hist.quantile(0.95),
+            "errors": errors.get((metric.split("_")[0], name), 0)
+        })
+    return sorted(rows, key=lambda r: r["p95_ms"], reverse=True)
+
+
+def log_summary():
+    for row in summary():
+        logger.info(
+            "%s %s: %d calls, mean %.2f ms, p50<=%s ms, p95<=%s ms, %d errors",
+            row["metric"], row["name"], row["count"], row["mean_ms"],
+            _format_bound(row["p50_ms"]), _format_bound(row["p95_ms"]), row["errors"]
+        )
+
+
+def reset():
+    """Clear all recorded values (histogram objects stay registered)"""
+    with _registry_lock:
+        for hist in _histograms.values():
+            with hist._lock:
+                hist.counts = [0] * len(hist.counts)
+                hist.sum = 0.0
+                hist.count = 0
+        _errors.clear()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int = 9108, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics on a background thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    logger.info("Serving metrics on http://%s:%d/metrics", host, port)
+    return server
+
+
+def start_log_summary(interval: float = 60.0) -> threading.Event:
+    """Log a summary every `interval` seconds until the returned event is set"""
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            log_summary()
+
+    threading.Thread(target=loop, name="metrics-log", daemon=True).start()
+    return stop
+
+
+def start_from_env():
+    """Start the exporter and/or periodic summary if configured by environment"""
+    port = os.environ.get("LIBRARY_METRICS_PORT")
+    if port:
+        start_http_server(int(port))
+    interval = os.environ.get("LIBRARY_METRICS_LOG_INTERVAL")
+    if interval:
+        start_log_summary(float(interval))
@@ -0,0 +1,134 @@
+# order_intake.py
+"""Order-intake mode: group-commit concurrent create_order calls.
+
+With intake running, db_functions.create_order() hands its order to a
+collector thread instead of writing it directly. The collector waits a
+few milliseconds after the first order arrives (WINDOW_MS) and gathers
+everything else that comes in meanwhile, up to MAX_BATCH orders. The
+batch then goes to db_functions._create_orders_tx as one write:
+
+- one query reads every book the batch touches,
+- orders are validated in arrival order against stock tracked in memory,
+- the accepted orders, their items, the stock updates, the rollups and
+  the tool-call log rows are written in a single transaction.
+
+Each caller still gets its own result: the created order, or an
+{"error"} when that order alone was invalid. If the transaction itself
+fails, every order in the batch gets the exception.
+
+The window only adds latency when orders are rare. Under load it turns a
+commit per order into a commit per batch. The write goes through
+db_functions.run_write(), so it works with or without the writer actor.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+import db_functions
+import metrics
+
+WINDOW_MS = 2.0
+MAX_BATCH = 128
+
+_STOP = object()
+_active: Optional["OrderIntake"] = None
+
+_batch_sizes = metrics.histogram("order_batch_size", "order_intake", metrics.ROW_BUCKETS)
+
+
+class OrderIntake:
+    def __init__(self, path: str, window_ms: float = WINDOW_MS, max_batch: int = MAX_BATCH):
+        self.path = path
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="order-intake", daemon=True)
+        self._stopped = False
+        self.stats = {"orders": 0, "rejected": 0, "batches": 0, "largest_batch": 0}
+
+    def start(self) -> "OrderIntake":
+        self._thread.start()
+        return self
+
+    def submit(self, customer_id: int, items: List[Dict], log_session: Optional[str] = None) -> Future:
+        """Queue an order for the next batch; the future resolves to its result"""
+        if self._stopped:
+            raise RuntimeError("Order intake is stopped")
+        future = Future()
+        self._queue.put((customer_id, items, log_session, future))
+        return future
+
+    def stop(self, timeout: float = 10.0):
+        """Apply the orders already queued, then stop collecting"""
+        if not self._stopped:
+            self._stopped = True
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _collect(self) -> List:
+        batch = [self._queue.get()]
+        if batch[0] is _STOP:
+            return batch
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item is _STOP:
+                break
+        return batch
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = self._collect()
+            if _STOP in batch:
+                stopping = True
+                batch = [item for item in batch if item is not _STOP]
+            if batch:
+                self._apply(batch)
+
+    def _apply(self, batch: List):
+        orders = [entry[:3] for entry in batch]
+        try:
+            results = db_functions.run_write(db_functions._create_orders_tx, orders)
+        except Exception as e:
+            for *_, future in batch:
+                future.set_exception(e)
+            return
+
+        _batch_sizes.observe(len(batch))
+        self.stats["batches"] += 1
+        self.stats["orders"] += len(batch)
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+        for (*_, future), result in zip(batch, results):
+            if "error" in result:
+                self.stats["rejected"] += 1
+            future.set_result(result)
+
+    def snapshot(self) -> Dict:
+        return dict(self.stats, queued=self._queue.qsize())
+
+
+def start(path: str, window_ms: float = WINDOW_MS, max_batch: int = MAX_BATCH) -> OrderIntake:
+    """Route create_order() for `path` through a group-committing intake"""
+    global _active
+    stop()
+    _active = OrderIntake(path, window_ms, max_batch).start()
+    return _active
+
+
+def stop():
+    global _active
+    if _active is not None:
+        _active.stop()
+        _active = None
+
+
+def active() -> Optional[OrderIntake]:
+    return _active
@@ -0,0 +1,155 @@
+# pool.py
+"""Shared SQLite connection pool for long-running processes.
+
+The desk GUI opens a connection per call, which is fine for one terminal.
+The headless service (server.py) serves many desks from one process, so
+it enables a pool instead. The pool has:
+
+- up to `size` reader connections in WAL mode. Readers never block the
+  writer or each other. A connection is reused once the caller close()s it.
+- one writer connection behind a lock. Every mutation in the process
+  goes through it, one transaction at a time. SQLite never sees two writers
+  and callers never get "database is locked". A thread that already holds
+  the writer (e.g. create_order logging its tool call) gets it again
+  without waiting; the connection is reset only when the outermost holder
+  closes it.
+
+db_functions.get_connection() draws from the active pool when there is
+one; callers keep calling close() as before.
+
+When the writer actor (writer.py) is running, mutations go to it instead
+and the pool's writer connection stays idle.
+"""
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+import profiler
+
+DEFAULT_SIZE = 8
+ACQUIRE_TIMEOUT = 30.0
+BUSY_TIMEOUT_MS = 5000
+
+_active: Optional["ConnectionPool"] = None
+
+
+class _PooledMixin:
+    """Returns the connection to its pool on close() instead of closing it"""
+    pool: Optional["ConnectionPool"] = None
+    is_writer = False
+
+    def close(self):
+        if self.pool is None:
+            return super().close()
+        self.pool.release(self)
+
+    def really_close(self):
+        self.pool = None
+        super().close()
+
+
+class ConnectionPool:
+    def __init__(self, path: str, size: int = DEFAULT_SIZE):
+        self.path = path
+        self.size = size
+        base = profiler.ProfilingConnection if profiler.ENABLED else sqlite3.Connection
+        self._factory = type("PooledConnection", (_PooledMixin, base), {})
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._all = []
+        self._write_lock = threading.Lock()
+        self._writer_owner = None
+        self._writer_depth = 0
+        self._writer = self._open(writer=True)
+        self.stats = {"opened": 0, "reader_acquires": 0, "writer_acquires": 0, "writer_wait_ms": 0.0}
+
+    def _open(self, writer: bool = False) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000.0,
+                               check_same_thread=False, factory=self._factory)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.pool = self
+        conn.is_writer = writer
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Borrow a reader connection, opening one if none is idle"""
+        if not self._slots.acquire(timeout=ACQUIRE_TIMEOUT):
+            raise TimeoutError(f"No database connection free after {ACQUIRE_TIMEOUT:.0f}s")
+        self.stats["reader_acquires"] += 1
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            conn = self._open()
+            self.stats["opened"] += 1
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def acquire_writer(self) -> sqlite3.Connection:
+        """Wait for the writer connection; it is held until close()"""
+        me = threading.get_ident()
+        if self._writer_owner == me:
+            self._writer_depth += 1
+            return self._writer
+        start = time.perf_counter()
+        if not self._write_lock.acquire(timeout=ACQUIRE_TIMEOUT):
+            raise TimeoutError(f"Writer connection busy for {ACQUIRE_TIMEOUT:.0f}s")
+        self._writer_owner, self._writer_depth = me, 1
+        self.stats["writer_acquires"] += 1
+        self.stats["writer_wait_ms"] += (time.perf_counter() - start) * 1000.0
+        return self._writer
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.is_writer:
+            self._writer_depth -= 1
+            if self._writer_depth > 0:
+                return
+        # Leave no open transaction or per-call setting behind for the next borrower
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = None
+        if conn.is_writer:
+            self._writer_owner = None
+            self._write_lock.release()
+        else:
+            self._idle.put(conn)
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            conns, self._all = self._all, []
+        for conn in conns:
+            conn.really_close()
+
+    def snapshot(self) -> Dict:
+        return dict(self.stats, size=self.size, idle=self._idle.qsize(),
+                    writer_busy=self._write_lock.locked())
+
+
+def enable(path: str, size: int = DEFAULT_SIZE) -> ConnectionPool:
+    """Route db_functions.get_connection() through a pool for `path`"""
+    global _active
+    disable()
+    _active = ConnectionPool(path, size)
+    return _active
+
+
+def disable():
+    global _active
+    if _active is not None:
+        _active.close()
+        _active = None
+
+
+def active() -> Optional[ConnectionPool]:
+    return _active
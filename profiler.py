@@ -0,0 +1,315 @@
+# profiler.py
+"""Opt-in SQL profiler for every connection opened by db_functions.
+
+When enabled, get_connection() returns a ProfilingConnection. It uses
+sqlite3's trace callback to capture the expanded text of each statement
+and a progress handler to count virtual machine steps. Its cursors time
+each statement from execute() until the last row is fetched. Statements
+slower than the threshold get their EXPLAIN QUERY PLAN captured and are
+flagged when the plan contains a full SCAN. They are appended to a
+JSON-lines slow query log.
+
+Enable with LIBRARY_DB_PROFILE=1 (and optionally LIBRARY_DB_SLOW_MS,
+LIBRARY_DB_SLOW_LOG) or by calling profiler.enable().
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+ENABLED = os.environ.get("LIBRARY_DB_PROFILE", "0") == "1"
+SLOW_MS = float(os.environ.get("LIBRARY_DB_SLOW_MS", "50"))
+SLOW_LOG_PATH = os.environ.get("LIBRARY_DB_SLOW_LOG", "slow_queries.jsonl")
+
+# Progress handler granularity in SQLite VM instructions
+PROGRESS_STEPS = 1000
+RECENT_LIMIT = 1000
+
+# Modules whose frames identify the code path that issued a statement
+CALLER_MODULES = ("tools", "agent", "db_functions", "analytics", "inventory_analytics")
+
+_lock = threading.Lock()
+_recent = deque(maxlen=RECENT_LIMIT)
+_stats: Dict[str, Dict] = {}
+
+
+def enable(slow_ms: Optional[float] = None, log_path: Optional[str] = None):
+    """Turn profiling on for connections opened from now on"""
+    global ENABLED, SLOW_MS, SLOW_LOG_PATH
+    ENABLED = True
+    if slow_ms is not None:
+        SLOW_MS = slow_ms
+    if log_path is not None:
+        SLOW_LOG_PATH = log_path
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def connect(database: str, **kwargs) -> sqlite3.Connection:
+    """Open a profiled connection"""
+    return sqlite3.connect(database, factory=ProfilingConnection, **kwargs)
+
+
+def _normalize(sql: str) -> str:
+    return " ".join(sql.split())
+
+
+def _caller_path() -> str:
+    """Names of the tool/db functions on the stack, outermost first"""
+    names = []
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module in CALLER_MODULES and frame.f_code.co_name not in ("wrapper", "<lambda>"):
+            names.append(frame.f_code.co_name)
+        frame = frame.f_back
+    return " > ".join(reversed(names))
+
+
+def _plan_has_scan(plan: List[Dict]) -> List[str]:
+    """Return the plan lines that scan a whole table or index"""
+    return [
+        step["detail"] for step in plan
+        if step["detail"].startswith("SCAN ") and not step["detail"].startswith("SCAN CONSTANT ROW")
+    ]
+
+
+class StatementRecord:
+    __slots__ = ("sql", "expanded_sql", "params", "started", "duration_ms", "rows", "vm_steps", "caller")
+
+    def __init__(self, sql: str, params):
+        self.sql = sql
+        self.expanded_sql = None
+        self.params = params
+        self.started = time.perf_counter()
+        self.duration_ms = 0.0
+        self.rows = 0
+        self.vm_steps = 0
+        self.caller = ""
+
+
+class ProfilingConnection(sqlite3.Connection):
+    """Connection that times every statement run through its cursors or its execute shortcuts"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.current: Optional[StatementRecord] = None
+        self._explaining = False
+        self.set_trace_callback(self._on_trace)
+        self.set_progress_handler(self._on_progress, PROGRESS_STEPS)
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or ProfilingCursor)
+
+    # sqlite3's shortcuts open plain cursors internally, so route them through ours
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def _on_trace(self, statement: str):
+        if self.current is not None and self.current.expanded_sql is None and not self._explaining:
+            self.current.expanded_sql = statement
+
+    def _on_progress(self):
+        if self.current is not None:
+            self.current.vm_steps += PROGRESS_STEPS
+        return 0
+
+    def commit(self):
+        self._timed("COMMIT", super().commit)
+
+    def rollback(self):
+        self._timed("ROLLBACK", super().rollback)
+
+    def close(self):
+        if self.current is not None:
+            self.finish(self.current)
+        super().close()
+
+    def _timed(self, sql: str, fn):
+        if self.current is not None:
+            self.finish(self.current)
+        record = StatementRecord(sql, None)
+        try:
+            return fn()
+        finally:
+            record.duration_ms = (time.perf_counter() - record.started) * 1000.0
+            _store(record, None)
+
+    def finish(self, record: StatementRecord):
+        """Close out a statement: store it and capture its plan if it was slow"""
+        if self.current is record:
+            self.current = None
+        plan = None
+        if record.duration_ms >= SLOW_MS:
+            record.caller = _caller_path()
+            plan = self._explain(record)
+        _store(record, plan)
+
+    def _explain(self, record: StatementRecord) -> Optional[List[Dict]]:
+        keyword = record.sql.lstrip().split(None, 1)[0].upper() if record.sql.strip() else ""
+        if keyword not in ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE"):
+            return None
+        self._explaining = True
+        try:
+            cur = sqlite3.Connection.cursor(self, sqlite3.Cursor)
+            cur.execute("EXPLAIN QUERY PLAN " + record.sql, record.params or ())
+            return [{"id": r[0], "parent": r[1], "detail": r[3]} for r in cur.fetchall()]
+        except sqlite3.Error as e:
+            return [{"id": 0, "parent": 0, "detail": f"EXPLAIN failed: {e}"}]
+        finally:
+            self._explaining = False
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    """Cursor that attributes execute and fetch time to the running statement"""
+
+    def _begin(self, sql: str, params):
+        conn = self.connection
+        if conn.current is not None:
+            conn.finish(conn.current)
+        record = StatementRecord(sql, params)
+        conn.current = record
+        return record
+
+    def _end_step(self, record: StatementRecord, started: float, rows: int, done: bool):
+        record.duration_ms += (time.perf_counter() - started) * 1000.0
+        record.rows += rows
+        if done and self.connection.current is record:
+            self.connection.finish(record)
+
+    def execute(self, sql, parameters=()):
+        record = self._begin(sql, parameters)
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        # Statements that return no rows are complete once execute returns
+        self._end_step(record, started, 0, self.description is None)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        record = self._begin(sql, None)
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._end_step(record, started, max(self.rowcount, 0), True)
+        return self
+
+    def fetchone(self):
+        record = self.connection.current
+        started = time.perf_counter()
+        row = super().fetchone()
+        if record is not None:
+            self._end_step(record, started, 0 if row is None else 1, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        record = self.connection.current
+        size = self.arraysize if size is None else size
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        if record is not None:
+            self._end_step(record, started, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        record = self.connection.current
+        started = time.perf_counter()
+        rows = super().fetchall()
+        if record is not None:
+            self._end_step(record, started, len(rows), True)
+        return rows
+
+
+def _store(record: StatementRecord, plan: Optional[List[Dict]]):
+    key = _normalize(record.sql)
+    scans = _plan_has_scan(plan) if plan else []
+    with _lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = {
+                "sql": key, "calls": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "rows": 0, "vm_steps": 0, "slow_calls": 0, "full_scan": False,
+                "scan_details": [], "callers": []
+            }
+        stats["calls"] += 1
+        stats["total_ms"] += record.duration_ms
+        stats["max_ms"] = max(stats["max_ms"], record.duration_ms)
+        stats["rows"] += record.rows
+        stats["vm_steps"] += record.vm_steps
+        if plan is not None:
+            stats["slow_calls"] += 1
+            if scans:
+                stats["full_scan"] = True
+                stats["scan_details"] = scans
+            if record.caller and record.caller not in stats["callers"]:
+                stats["callers"].append(record.caller)
+        _recent.append({
+            "sql": key,
+            "duration_ms": round(record.duration_ms, 3),
+            "rows": record.rows,
+            "vm_steps": record.vm_steps
+        })
+
+    if plan is not None:
+        _log_slow(record, plan, scans)
+
+
+def _log_slow(record: StatementRecord, plan: List[Dict], scans: List[str]):
+    entry = {
+        "timestamp": datetime.now().isoformat(),
+        "sql": _normalize(record.sql),
+        "expanded_sql": record.expanded_sql,
+        "duration_ms": round(record.duration_ms, 3),
+        "rows": record.rows,
+        "vm_steps": record.vm_steps,
+        "caller": record.caller,
+        "full_scan": bool(scans),
+        "plan": [step["detail"] for step in plan]
+    }
+    try:
+        with _lock, open(SLOW_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"Note: Could not write slow query log - {e}")
+
+
+def recent() -> List[Dict]:
+    """The most recent statements, oldest first"""
+    with _lock:
+        return list(_recent)
+
+
+def report(limit: int = 20) -> List[Dict]:
+    """Statements ranked by total time spent in them"""
+    with _lock:
+        rows = [dict(s) for s in _stats.values()]
+    for row in rows:
+        row["mean_ms"] = row["total_ms"] / row["calls"] if row["calls"] else 0.0
+    return sorted(rows, key=lambda r: r["total_ms"], reverse=True)[:limit]
+
+
+def print_report(limit: int = 20):
+    print(f"{'calls':>7} {'total ms':>10} {'mean ms':>9} {'max ms':>9} {'rows':>8}  statement")
+    for row in report(limit):
+        flag = " [FULL SCAN]" if row["full_scan"] else ""
+        print(f"{row['calls']:>7} {row['total_ms']:>10.2f} {row['mean_ms']:>9.3f} "
+              f"{row['max_ms']:>9.3f} {row['rows']:>8}  {row['sql'][:100]}{flag}")
+        for detail in row["scan_details"]:
+            print(f"{'':>48}↳ {detail}")
+        for caller in row["callers"]:
+            print(f"{'':>48}↳ via {caller}")
+
+
+def reset():
+    with _lock:
+        _recent.clear()
+        _stats.clear()
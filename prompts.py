@@ -0,0 +1,120 @@
+# prompts.py
+"""Prompt assembly for the agent's LLM loop.
+
+Tool docstrings in tools.py are written for people. They carry
+CROSS-FUNCTION RELATIONSHIPS and "When used together" blocks that run to
+several hundred characters per tool. Sent as-is, they cost the model
+thousands of input tokens on every step of every turn. The model gets a
+compact view instead:
+
+- each tool's schema keeps its name, its one-line summary and its
+  argument types and descriptions; defaults are already in the
+  descriptions and unknown arguments are rejected by the validator, so
+  "default" and "additionalProperties" are dropped
+- the relationship blocks are dropped. They pair nearly every tool with
+  every other one; the one ordering rule that matters (look a book up
+  before acting on it) is a sentence in the system message
+
+Both are built once per registry and reused as the same objects, so every
+request starts with byte-identical system text and tools. Backends with
+prefix caching can then serve that part from cache.
+
+Token counts are estimated at CHARS_PER_TOKEN characters per token. The
+agent records the prompt tokens of each turn as llm_prompt_tokens, and
+
+    python prompts.py
+
+compares the full docstring schemas with the compact ones.
+"""
+import argparse
+import json
+import math
+import os
+from typing import Dict, List
+
+SYSTEM_PROMPT = (
+    "You are a library desk assistant. Use the tools to look up books, "
+    "place and check orders, restock, change prices and report on sales. "
+    "Look a book up before ordering, restocking or repricing it, and "
+    "never invent ISBNs, stock levels or order numbers."
+)
+
+CHARS_PER_TOKEN = 4
+
+# LIBRARY_PROMPT_SCHEMAS=full sends the whole docstrings, for comparison
+FULL_SCHEMAS = os.environ.get("LIBRARY_PROMPT_SCHEMAS", "compact") == "full"
+
+
+class Prefix:
+    """The static start of every LLM request: system text and tool schemas"""
+
+    def __init__(self, system: str, tools: List[Dict]):
+        self.system = system
+        self.tools = tools
+        self.tokens = count_tokens(system) + count_tokens(tools)
+
+
+_prefixes: Dict[int, Prefix] = {}
+
+
+def count_tokens(value) -> int:
+    """Estimated tokens in a string, or in anything else as compact JSON"""
+    if not isinstance(value, str):
+        value = json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    return math.ceil(len(value) / CHARS_PER_TOKEN)
+
+
+def compact_schema(tool) -> Dict:
+    properties = {}
+    for name, prop in tool.schema["properties"].items():
+        properties[name] = {k: v for k, v in prop.items() if k != "default"}
+    parameters = {"type": "object", "properties": properties}
+    if tool.schema["required"]:
+        parameters["required"] = tool.schema["required"]
+    return {"name": tool.name, "description": tool.summary, "parameters": parameters}
+
+
+def build_prefix(registry, full: bool = False) -> Prefix:
+    tools = registry.schemas() if full else [compact_schema(tool) for tool in registry]
+    return Prefix(SYSTEM_PROMPT, tools)
+
+
+def prefix(registry) -> Prefix:
+    """The cached prefix for `registry`; rebuilt only if tools were added since"""
+    cached = _prefixes.get(id(registry))
+    if cached is None or len(cached.tools) != len(registry):
+        cached = _prefixes[id(registry)] = build_prefix(registry, FULL_SCHEMAS)
+    return cached
+
+
+def report(registry, turn_steps: int = 2) -> List[Dict]:
+    """Prompt tokens with full and compact schemas, per tool and for a turn of `turn_steps` LLM calls"""
+    full, compact = build_prefix(registry, full=True), build_prefix(registry)
+    rows = [{"part": tool.name, "full": count_tokens(f), "compact": count_tokens(c)}
+            for tool, f, c in zip(registry, full.tools, compact.tools)]
+    rows.append({"part": "system", "full": count_tokens(full.system), "compact": count_tokens(compact.system)})
+    rows.append({"part": "prefix per LLM call", "full": full.tokens, "compact": compact.tokens})
+    rows.append({"part": f"prefix per {turn_steps}-step turn", "full": full.tokens * turn_steps,
+                 "compact": compact.tokens * turn_steps})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare prompt tokens of full and compact tool schemas")
+    parser.add_argument("--steps", type=int, default=2, help="LLM calls per turn (default: 2)")
+    parser.add_argument("--show", action="store_true", help="Print the compact system text and schemas")
+    args = parser.parse_args()
+
+    from tools import TOOL_REGISTRY
+    if args.show:
+        compact = build_prefix(TOOL_REGISTRY)
+        print(compact.system)
+        print(json.dumps(compact.tools, indent=2))
+    print(f"{'part':<28}{'full':>8}{'compact':>10}{'saved':>8}")
+    for row in report(TOOL_REGISTRY, args.steps):
+        saved = 1 - row["compact"] / row["full"] if row["full"] else 0.0
+        print(f"{row['part']:<28}{row['full']:>8}{row['compact']:>10}{saved:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+# recommendations.py
+"""Co-purchase recommendations: "customers who bought this also bought".
+
+co_purchases is a sparse co-occurrence matrix over order_items, one row
+per ordered pair of books that appeared in the same order, holding how
+many orders contained both. similar_books keeps the best TOP_N partners
+of every book, so serving a recommendation is one primary-key range read.
+
+Both tables are refreshed the same way as the sales rollups (see
+analytics.py). Orders past the 'co_purchases' watermark in rollup_state
+are folded in by refresh_recommendations(), which create_order runs inside
+its own transaction. Pair counts only ever grow, so a book's new top
+list can be merged from its current one and the pairs that just changed.
+Nothing else has to be re-ranked.
+
+    python recommendations.py --rebuild
+"""
+import argparse
+import sqlite3
+from typing import Dict
+
+import db_functions
+import snapshot
+from analytics import ensure_rollup_tables
+from metrics import timed
+
+TOP_N = 10
+
+RECOMMENDATION_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS co_purchases (
+        isbn TEXT NOT NULL,
+        other TEXT NOT NULL,
+        together INTEGER NOT NULL,
+        PRIMARY KEY (isbn, other)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS similar_books (
+        isbn TEXT NOT NULL,
+        rank INTEGER NOT NULL,
+        other TEXT NOT NULL,
+        together INTEGER NOT NULL,
+        PRIMARY KEY (isbn, rank)
+    ) WITHOUT ROWID""",
+]
+
+_ready_paths = set()
+
+
+def ensure_recommendation_tables(cursor):
+    """Create the recommendation tables once per database"""
+    if db_functions.path in _ready_paths:
+        return
+    ensure_rollup_tables(cursor)
+    for statement in RECOMMENDATION_SCHEMA:
+        cursor.execute(statement)
+    _ready_paths.add(db_functions.path)
+
+
+def refresh_recommendations(cursor) -> int:
+    """Fold every order newer than the last processed one into the co-purchase tables.
+
+    Runs on the caller's cursor, so create_order can call it inside its own
+    transaction. Returns the number of orders folded in.
+    """
+    ensure_recommendation_tables(cursor)
+
+    cursor.execute("SELECT last_order_id FROM rollup_state WHERE name = 'co_purchases'")
+    row = cursor.fetchone()
+    last_id = row[0] if row else 0
+
+    cursor.execute("SELECT COALESCE(MAX(id), 0), COUNT(*) FROM orders WHERE id > ?", (last_id,))
+    upto_id, new_orders = cursor.fetchone()
+    if not new_orders:
+        return 0
+
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS changed_pairs (
+            isbn TEXT NOT NULL,
+            other TEXT NOT NULL,
+            together INTEGER NOT NULL,
+            PRIMARY KEY (isbn, other)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("DELETE FROM temp.changed_pairs")
+    cursor.execute("""
+        INSERT INTO temp.changed_pairs (isbn, other, together)
+        SELECT a.isbn, b.isbn, COUNT(DISTINCT a.order_id)
+        FROM order_items a
+        JOIN order_items b ON b.order_id = a.order_id AND b.isbn <> a.isbn
+        WHERE a.order_id > ? AND a.order_id <= ?
+        GROUP BY a.isbn, b.isbn
+    """, (last_id, upto_id))
+
+    cursor.execute("""
+        INSERT INTO co_purchases (isbn, other, together)
+        SELECT isbn, other, together FROM temp.changed_pairs WHERE true
+        ON CONFLICT(isbn, other) DO UPDATE SET together = together + excluded.together
+    """)
+
+    # Everything that can be in a touched book's top list now: its old list
+    # plus the pairs that just grew
+    cursor.execute("""
+        WITH touched AS (SELECT DISTINCT isbn FROM temp.changed_pairs),
+        candidates AS (
+            SELECT s.isbn, s.other FROM similar_books s JOIN touched t ON t.isbn = s.isbn
+            UNION
+            SELECT isbn, other FROM temp.changed_pairs
+        ),
+        ranked AS (
+            SELECT c.isbn, c.other, cp.together,
+                   ROW_NUMBER() OVER (PARTITION BY c.isbn ORDER BY cp.together DESC, c.other) AS rank
+            FROM candidates c
+            JOIN co_purchases cp ON cp.isbn = c.isbn AND cp.other = c.other
+        )
+        SELECT isbn, rank, other, together FROM ranked WHERE rank <= ?
+    """, (TOP_N,))
+    ranked = cursor.fetchall()
+    cursor.execute("DELETE FROM similar_books WHERE isbn IN (SELECT DISTINCT isbn FROM temp.changed_pairs)")
+    cursor.executemany("INSERT INTO similar_books (isbn, rank, other, together) VALUES (?, ?, ?, ?)", ranked)
+
+    cursor.execute(
+        "INSERT INTO rollup_state (name, last_order_id) VALUES ('co_purchases', ?) "
+        "ON CONFLICT(name) DO UPDATE SET last_order_id = excluded.last_order_id",
+        (upto_id,)
+    )
+    return new_orders
+
+
+def _pending_orders(cursor) -> bool:
+    """True if some orders have not been folded into the co-purchase tables yet"""
+    try:
+        cursor.execute("""
+            SELECT COALESCE(MAX(id), 0) > COALESCE(
+                (SELECT last_order_id FROM rollup_state WHERE name = 'co_purchases'), 0)
+            FROM orders
+        """)
+    except sqlite3.OperationalError:
+        return True
+    return bool(cursor.fetchone()[0])
+
+
+def _refresh_tx(conn) -> int:
+    return refresh_recommendations(conn.cursor())
+
+
+def catch_up(conn) -> int:
+    """Fold in orders that reached the database without create_order"""
+    if snapshot.current() is not None:
+        return 0
+    if not _pending_orders(conn.cursor()):
+        return 0
+    return db_functions.run_write(_refresh_tx)
+
+
+def _rebuild_tx(conn) -> int:
+    cursor = conn.cursor()
+    ensure_recommendation_tables(cursor)
+    cursor.execute("DELETE FROM co_purchases")
+    cursor.execute("DELETE FROM similar_books")
+    cursor.execute("DELETE FROM rollup_state WHERE name = 'co_purchases'")
+    return refresh_recommendations(cursor)
+
+
+def rebuild_recommendations() -> Dict:
+    """Drop the co-purchase tables and rebuild them from the full order history"""
+    try:
+        processed = db_functions.run_write(_rebuild_tx)
+        return {"orders_processed": processed,
+                "message": f"Rebuilt co-purchase recommendations from {processed} orders"}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@timed("db")
+def similar_books(isbn: str, limit: int = 5) -> Dict:
+    """Books most often bought in the same order as `isbn`"""
+    limit = max(1, min(int(limit), TOP_N))
+    conn = db_functions.get_connection()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    try:
+        catch_up(conn)
+        cursor.execute("SELECT isbn, title, author, price, stock FROM books WHERE isbn = ?", (isbn,))
+        book = cursor.fetchone()
+        if book is None:
+            return {"error": f"Book with ISBN {isbn} not found"}
+        cursor.execute("""
+            SELECT b.isbn, b.title, b.author, b.price, b.stock, s.together
+            FROM similar_books s
+            JOIN books b ON b.isbn = s.other
+            WHERE s.isbn = ?
+            ORDER BY s.rank
+            LIMIT ?
+        """, (isbn, limit))
+        return {"book": dict(book), "similar": [dict(row) for row in cursor.fetchall()]}
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild or query co-purchase recommendations")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild from the full order history")
+    parser.add_argument("--isbn", help="Print the books most often bought with this ISBN")
+    parser.add_argument("--db", default=None, help="Database path (default: db_functions.path)")
+    args = parser.parse_args()
+
+    if args.db:
+        db_functions.path = args.db
+    if args.rebuild:
+        result = rebuild_recommendations()
+        print(result.get("error") or result["message"])
+    if args.isbn:
+        result = similar_books(args.isbn, TOP_N)
+        if "error" in result:
+            print(result["error"])
+        for book in result.get("similar", []):
+            print(f"{book['together']:>5}  {book['title']}  ({book['isbn']})")
+
+
+if __name__ == "__main__":
+    main()
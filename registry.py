@@ -0,0 +1,290 @@
+# registry.py
+"""Native tool registry for the desk agent.
+
+Each tool is declared once with @TOOL_REGISTRY.tool (see tools.py). The
+registry reads its typed signature and its docstring and builds two things:
+a JSON schema to describe it to an LLM, and an argument validator compiled
+from generated Python source. The validator coerces the usual LLM slips
+("5" for 5, 9780132350884 for "9780132350884") and rejects unknown or
+missing arguments with ToolValidationError.
+
+Tools behave like LangChain tools where the rest of the code relies on it
+(.name, .description, .args, .invoke(dict)), and they do not import
+LangChain. Calling a tool directly (tool(q="python")) skips validation
+entirely. That path is for trusted callers such as batch jobs and the
+agent's fast-path router. Tool.as_langchain() and
+ToolRegistry.as_langchain() build LangChain StructuredTools on demand.
+
+The docstring is written for people. What a model needs is pulled out of
+it separately: the summary (its first paragraph) and the argument
+descriptions. prompts.py assembles those into the compact prompt.
+"""
+import inspect
+import re
+import typing
+from typing import Callable, Dict, List, Optional
+
+JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+_MISSING = object()
+
+
+class ToolValidationError(ValueError):
+    """Arguments passed to a tool do not match its signature"""
+
+
+def _to_str(tool: str, arg: str, value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise ToolValidationError(f"{tool}: '{arg}' must be a string, got {type(value).__name__}")
+
+
+def _to_int(tool: str, arg: str, value):
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and re.fullmatch(r"\s*[-+]?\d+\s*", value):
+        return int(value)
+    raise ToolValidationError(f"{tool}: '{arg}' must be an integer, got {value!r}")
+
+
+def _to_float(tool: str, arg: str, value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip().lstrip("$"))
+        except ValueError:
+            pass
+    raise ToolValidationError(f"{tool}: '{arg}' must be a number, got {value!r}")
+
+
+def _to_bool(tool: str, arg: str, value):
+    if isinstance(value, str) and value.strip().lower() in ("true", "false", "yes", "no", "1", "0"):
+        return value.strip().lower() in ("true", "yes", "1")
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    raise ToolValidationError(f"{tool}: '{arg}' must be true or false, got {value!r}")
+
+
+COERCERS = {str: _to_str, int: _to_int, float: _to_float, bool: _to_bool}
+
+
+def _unwrap_optional(annotation):
+    """Return (inner type, allows None) for X and Optional[X]"""
+    if typing.get_origin(annotation) is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        if len(args) == 1:
+            return args[0], True
+    return annotation, False
+
+
+def _parse_arg_docs(doc: str) -> Dict[str, str]:
+    """Argument descriptions from the "Args:" section of a docstring"""
+    docs: Dict[str, str] = {}
+    match = re.search(r"^\s*Args:\s*$(.*?)(?:^\s*Returns:|\Z)", doc, re.M | re.S)
+    if not match:
+        return docs
+    lines = [line for line in match.group(1).splitlines() if line.strip()]
+    if not lines:
+        return docs
+    # Entries sit at the section's base indent; deeper lines continue the previous one
+    base = min(len(line) - len(line.lstrip()) for line in lines)
+    current = None
+    for line in lines:
+        entry = re.match(r"(\w+):\s*(.*)", line[base:])
+        if entry and len(line) - len(line.lstrip()) == base:
+            current = entry.group(1)
+            docs[current] = entry.group(2).strip()
+        elif current is not None:
+            docs[current] += " " + line.strip()
+    return docs
+
+
+def _summary(doc: str) -> str:
+    """The first paragraph of a docstring, on one line"""
+    return " ".join(doc.strip().split("\n\n", 1)[0].split())
+
+
+def _compile_validator(tool_name: str, params: List[Dict]) -> Callable[[Dict], Dict]:
+    """Generate and compile a validator specialised to one tool's parameters.
+
+    The generated function does one class check per argument on the happy
+    path and only falls back to a coercer when the type is off.
+    """
+    namespace = {
+        "ToolValidationError": ToolValidationError,
+        "MISSING": _MISSING,
+        "KNOWN": frozenset(p["name"] for p in params),
+        "TOOL": tool_name,
+    }
+    lines = [
+        "def validate(args):",
+        "    if args.__class__ is not dict:",
+        "        raise ToolValidationError(f'{TOOL}: arguments must be an object, got {type(args).__name__}')",
+        "    if not KNOWN.issuperset(args):",
+        "        unknown = ', '.join(sorted(set(args) - KNOWN))",
+        "        raise ToolValidationError(f'{TOOL}: unknown argument(s) {unknown}')",
+        "    out = {}",
+    ]
+    for i, p in enumerate(params):
+        name, kind = p["name"], p["type"]
+        type_ref, coerce_ref = f"T{i}", f"C{i}"
+        namespace[type_ref] = kind
+        namespace[coerce_ref] = COERCERS.get(kind)
+        lines.append(f"    v = args.get({name!r}, MISSING)")
+        if p["required"]:
+            lines.append("    if v is MISSING:")
+            lines.append(f"        raise ToolValidationError(TOOL + {': missing required argument ' + name!r})")
+            body = "    "
+        else:
+            lines.append("    if v is not MISSING:")
+            body = "        "
+        if p["nullable"]:
+            lines.append(f"{body}if v is None:")
+            lines.append(f"{body}    out[{name!r}] = None")
+            lines.append(f"{body}else:")
+            body += "    "
+        if namespace[coerce_ref] is not None:
+            lines.append(f"{body}if v.__class__ is not {type_ref}:")
+            lines.append(f"{body}    v = {coerce_ref}(TOOL, {name!r}, v)")
+        lines.append(f"{body}out[{name!r}] = v")
+    lines.append("    return out")
+
+    exec(compile("\n".join(lines), f"<validator {tool_name}>", "exec"), namespace)
+    return namespace["validate"]
+
+
+class Tool:
+    """A registered tool: the function plus its schema and validator"""
+
+    def __init__(self, func: Callable, name: Optional[str] = None, description: Optional[str] = None):
+        self.func = func
+        self.name = name or func.__name__
+        doc = inspect.getdoc(func) or ""
+        self.description = description or doc
+        self.summary = _summary(self.description)
+        self.arg_docs = _parse_arg_docs(doc)
+        self.params = self._parameters(func)
+        self.schema = self._json_schema()
+        self.validate = _compile_validator(self.name, self.params)
+        self._langchain = None
+
+    def __repr__(self):
+        return f"<Tool {self.name}>"
+
+    @staticmethod
+    def _parameters(func: Callable) -> List[Dict]:
+        hints = typing.get_type_hints(inspect.unwrap(func))
+        params = []
+        for p in inspect.signature(func).parameters.values():
+            kind, nullable = _unwrap_optional(hints.get(p.name, str))
+            if kind not in JSON_TYPES:
+                raise TypeError(f"{func.__name__}: unsupported type {kind!r} for argument '{p.name}'")
+            params.append({
+                "name": p.name,
+                "type": kind,
+                "nullable": nullable,
+                "required": p.default is inspect.Parameter.empty,
+                "default": None if p.default is inspect.Parameter.empty else p.default
+            })
+        return params
+
+    def _json_schema(self) -> Dict:
+        properties = {}
+        for p in self.params:
+            prop = {"type": [JSON_TYPES[p["type"]], "null"] if p["nullable"] else JSON_TYPES[p["type"]]}
+            if p["name"] in self.arg_docs:
+                prop["description"] = self.arg_docs[p["name"]]
+            if not p["required"]:
+                prop["default"] = p["default"]
+            properties[p["name"]] = prop
+        return {
+            "type": "object",
+            "properties": properties,
+            "required": [p["name"] for p in self.params if p["required"]],
+            "additionalProperties": False
+        }
+
+    @property
+    def args(self) -> Dict:
+        """Argument schemas keyed by name, as LangChain tools expose them"""
+        return self.schema["properties"]
+
+    def __call__(self, *args, **kwargs):
+        """Call the tool directly, without validation"""
+        return self.func(*args, **kwargs)
+
+    def invoke(self, input, config=None):
+        """Validate arguments from an untrusted caller (e.g. an LLM) and run the tool.
+
+        A bare string is accepted for tools whose first argument is a string,
+        matching LangChain's single-input behaviour.
+        """
+        if isinstance(input, str) and self.params and self.params[0]["type"] is str:
+            input = {self.params[0]["name"]: input}
+        return self.func(**self.validate(input))
+
+    run = invoke
+
+    def as_langchain(self):
+        """Wrap this tool as a LangChain StructuredTool (imports LangChain on first use)"""
+        if self._langchain is None:
+            from langchain_core.tools import StructuredTool
+            # LangChain resends the description on every step, so it gets the
+            # summary and arguments rather than the whole docstring
+            args = "".join(f"\n    {name}: {text}" for name, text in self.arg_docs.items())
+            self._langchain = StructuredTool.from_function(
+                func=self.func, name=self.name,
+                description=self.summary + ("\n\nArgs:" + args if args else "")
+            )
+        return self._langchain
+
+
+class ToolRegistry:
+    """Named collection of tools"""
+
+    def __init__(self):
+        self._tools: Dict[str, Tool] = {}
+
+    def tool(self, func: Optional[Callable] = None, *, name: Optional[str] = None):
+        """Register a function as a tool; usable as @registry.tool or @registry.tool(name=...)"""
+        def register(fn: Callable) -> Tool:
+            t = Tool(fn, name=name)
+            if t.name in self._tools:
+                raise ValueError(f"Tool '{t.name}' is already registered")
+            self._tools[t.name] = t
+            return t
+        return register(func) if func is not None else register
+
+    def get(self, name: str) -> Optional[Tool]:
+        return self._tools.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __iter__(self):
+        return iter(self._tools.values())
+
+    def __len__(self):
+        return len(self._tools)
+
+    def names(self) -> List[str]:
+        return list(self._tools)
+
+    def invoke(self, name: str, args: Dict):
+        """Validate and run a tool by name"""
+        t = self._tools.get(name)
+        if t is None:
+            raise ToolValidationError(f"Unknown tool '{name}'")
+        return t.invoke(args)
+
+    def schemas(self) -> List[Dict]:
+        """Function-calling schemas for every tool"""
+        return [{
+            "name": t.name,
+            "description": t.description,
+            "parameters": t.schema
+        } for t in self._tools.values()]
+
+    def as_langchain(self) -> List:
+        return [t.as_langchain() for t in self._tools.values()]
@@ -0,0 +1,314 @@
+# replay.py
+"""Capture and replay: re-run recorded tool calls against a copy of the database.
+
+Sources:
+
+- the tool_calls log of a database (--from-db, default the source
+  database), plus its archived partitions with --archived (see
+  retention.py)
+- a JSON-lines trace (--trace). Each line is an object with "tool" (or
+  "name") and "args" (or "args_json"), and optionally "session_id" and
+  "ts" (epoch seconds or "YYYY-MM-DD HH:MM:SS"). A line with "message"
+  instead is sent to a CompatibleAgent for that session, which answers
+  fast-path commands without an LLM.
+
+Logs written before tools took over logging from db_functions record some
+actions twice: once by the tool and once by the db_functions call under
+it, with different argument names (e.g. create_order with
+book_title/customer_input/quantity and with customer_id/items). Only
+records whose arguments fit the tool's signature are replayed; the
+lower-level duplicates are counted as skipped.
+
+Calls keep their recorded spacing, divided by --speed (0 replays as
+fast as possible). Calls logged in the same second are spread evenly over
+that second, since created_at has one-second resolution. Up to
+--concurrency calls run at once, on a copy of --db set up like the desk
+service (reader pool, writer actor, order intake, report snapshot). The
+report has latency percentiles and throughput per tool, and how late
+calls started when the workers could not keep up. It is written in benchmark.py's format, so
+--compare flags regressions against an earlier run.
+
+    python replay.py --db flibrary.db --speed 10 --concurrency 8
+    python replay.py --db prod-copy.db --archived --since "2026-09-01" --speed 0 --output replay.json
+    python replay.py --db prod-copy.db --trace capture.jsonl --compare replay.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import db_functions
+import metrics
+import order_intake
+import pool
+import snapshot
+import writer as db_writer
+from benchmark import _git_commit, compare, percentile
+from loadgen import copy_database
+from results import ToolResult
+
+
+def _timestamp(value) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def _record(tool: Optional[str], args, session_id: Optional[str], ts, message: Optional[str] = None) -> Dict:
+    if isinstance(args, str):
+        args = json.loads(args) if args.strip() else {}
+    if tool and not tool.endswith("_tool"):
+        tool += "_tool"
+    return {"tool": tool, "args": args or {}, "session_id": session_id or "replay",
+            "ts": _timestamp(ts), "message": message}
+
+
+def load_tool_calls(path: str, since: Optional[str] = None, until: Optional[str] = None,
+                    limit: Optional[int] = None, archived: bool = False) -> List[Dict]:
+    """Recorded tool calls from a database's tool_calls log, oldest first"""
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("""
+            SELECT session_id, name, args_json, created_at FROM tool_calls
+            WHERE (? IS NULL OR created_at >= ?) AND (? IS NULL OR created_at <= ?)
+            ORDER BY id LIMIT ?
+        """, (since, since, until, until, -1 if limit is None else limit)).fetchall()
+    finally:
+        conn.close()
+    records = [_record(name, args, session, created) for session, name, args, created in rows]
+
+    if archived:
+        import retention
+        saved, db_functions.path = db_functions.path, path
+        try:
+            old = retention.find_archived("tool_calls", since=since, until=until, limit=limit or 10 ** 9)
+        finally:
+            db_functions.path = saved
+        records = [_record(r["name"], r["args_json"], r["session_id"], r["created_at"]) for r in old] + records
+    return records[:limit] if limit else records
+
+
+def load_trace(path: str, limit: Optional[int] = None) -> List[Dict]:
+    """Records from a JSON-lines trace, in file order"""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                print(f"Note: skipping trace line {number} - not valid JSON")
+                continue
+            records.append(_record(entry.get("tool") or entry.get("name"),
+                                   entry.get("args", entry.get("args_json")),
+                                   entry.get("session_id"), entry.get("ts", entry.get("created_at")),
+                                   entry.get("message")))
+            if limit and len(records) >= limit:
+                break
+    return records
+
+
+def schedule(records: List[Dict], speed: float) -> List[Dict]:
+    """Give every record an `at` offset in seconds from the start of the replay"""
+    if speed <= 0 or not any(r["ts"] is not None for r in records):
+        for r in records:
+            r["at"] = 0.0
+        return records
+    first = min(r["ts"] for r in records if r["ts"] is not None)
+    previous = first
+    groups: Dict[float, List[Dict]] = {}
+    for r in records:
+        ts = r["ts"] if r["ts"] is not None else previous
+        previous = ts
+        groups.setdefault(ts, []).append(r)
+    for ts, group in groups.items():
+        # One-second timestamps: spread each second's calls across it
+        step = 1.0 / len(group) if float(ts).is_integer() else 0.0
+        for i, r in enumerate(group):
+            r["at"] = (ts - first + i * step) / speed
+    records.sort(key=lambda r: r["at"])
+    return records
+
+
+class Replayer:
+    def __init__(self, records: List[Dict], concurrency: int = 8):
+        from tools import TOOL_REGISTRY
+        self.registry = TOOL_REGISTRY
+        self.records = records
+        self.concurrency = concurrency
+        self.results: List[Dict] = []
+        self.skipped: Dict[str, int] = {}
+        self._agents = {}
+        self._lock = threading.Lock()
+
+    def _runnable(self, record: Dict) -> bool:
+        if record["message"]:
+            return True
+        tool = self.registry.get(record["tool"] or "")
+        reason = None
+        if tool is None:
+            reason = f"unknown tool {record['tool']}"
+        elif not {p["name"] for p in tool.params}.issuperset(record["args"]):
+            reason = f"{record['tool']} logged by db_functions"
+        if reason:
+            self.skipped[reason] = self.skipped.get(reason, 0) + 1
+        return reason is None
+
+    def _agent(self, session_id: str):
+        from agent import CompatibleAgent
+        with self._lock:
+            agent = self._agents.get(session_id)
+            if agent is None:
+                agent = self._agents[session_id] = CompatibleAgent(session_id)
+        return agent
+
+    def _call(self, record: Dict, started_at: float):
+        begin = time.perf_counter()
+        lateness = (begin - started_at - record["at"]) * 1000.0
+        name, error = record["tool"], None
+        db_functions.set_current_session(record["session_id"])
+        try:
+            if record["message"]:
+                name = "agent.run"
+                self._agent(record["session_id"]).run(record["message"])
+            else:
+                result = self.registry.invoke(name, record["args"])
+                if isinstance(result, ToolResult) and result.error is not None:
+                    error = result.error
+        except Exception as e:
+            error = str(e)
+        elapsed = (time.perf_counter() - begin) * 1000.0
+        with self._lock:
+            self.results.append({"name": name, "ms": elapsed, "late_ms": max(0.0, lateness), "error": error})
+
+    def run(self) -> Dict:
+        runnable = [r for r in self.records if self._runnable(r)]
+        metrics.reset()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="replay") as executor:
+            for record in runnable:
+                delay = start + record["at"] - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self._call, record, start)
+        return self.report(time.perf_counter() - start, runnable)
+
+    def report(self, seconds: float, runnable: List[Dict]) -> Dict:
+        by_name: Dict[str, List[Dict]] = {}
+        for r in self.results:
+            by_name.setdefault(r["name"], []).append(r)
+
+        results = {}
+        for name, rows in sorted(by_name.items()):
+            values = sorted(r["ms"] for r in rows)
+            results[f"replay.{name}"] = {
+                "calls": len(rows),
+                "errors": sum(1 for r in rows if r["error"]),
+                "ops_per_sec": round(len(rows) / seconds, 2) if seconds else 0.0,
+                "mean_ms": round(sum(values) / len(values), 3),
+                "p50_ms": round(percentile(values, 50), 3),
+                "p90_ms": round(percentile(values, 90), 3),
+                "p99_ms": round(percentile(values, 99), 3),
+                "max_ms": round(values[-1], 3),
+            }
+        late = sorted(r["late_ms"] for r in self.results)
+        recorded = runnable[-1]["at"] if runnable else 0.0
+        errors = sorted({r["error"] for r in self.results if r["error"]})
+        return {
+            "calls": len(self.results),
+            "seconds": round(seconds, 2),
+            "calls_per_sec": round(len(self.results) / seconds, 2) if seconds else 0.0,
+            "schedule_seconds": round(recorded, 2),
+            "late_p50_ms": round(percentile(late, 50), 1),
+            "late_p99_ms": round(percentile(late, 99), 1),
+            "skipped": self.skipped,
+            "sample_errors": errors[:5],
+            "results": results,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded tool calls against a copy of the database")
+    parser.add_argument("--db", default=None, help="Database to copy and replay against (default: db_functions.path)")
+    parser.add_argument("--from-db", help="Read tool_calls from this database (default: --db)")
+    parser.add_argument("--trace", help="Read calls from a JSON-lines trace instead")
+    parser.add_argument("--archived", action="store_true", help="Include archived tool calls (see retention.py)")
+    parser.add_argument("--since", help="Only calls logged at or after this time")
+    parser.add_argument("--until", help="Only calls logged at or before this time")
+    parser.add_argument("--limit", type=int, help="Replay at most this many calls")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Speed-up over the recorded pace (0 = as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Calls in flight at once")
+    parser.add_argument("--no-service", action="store_true",
+                        help="Skip the reader pool, writer actor, order intake and report snapshot")
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    parser.add_argument("--compare", help="Previous replay report to compare against")
+    args = parser.parse_args()
+
+    # Read the baseline first: --output may be the same file and is overwritten below
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    source = args.db or db_functions.path
+    if args.trace:
+        records = load_trace(args.trace, args.limit)
+    else:
+        records = load_tool_calls(args.from_db or source, args.since, args.until, args.limit, args.archived)
+    if not records:
+        print("Nothing to replay")
+        return
+    schedule(records, args.speed)
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="library-replay-"), "replay.db")
+    copy_database(source, db_path)
+    db_functions.path = db_path
+    if not args.no_service:
+        pool.enable(db_path)
+        db_functions.get_connection().close()
+        db_writer.start(db_path)
+        order_intake.start(db_path)
+        snapshot.start(db_path)
+
+    pace = "as fast as possible" if args.speed <= 0 else f"at {args.speed:g}x"
+    print(f"Replaying {len(records)} calls {pace} with concurrency {args.concurrency} against {db_path}...")
+    try:
+        report = Replayer(records, args.concurrency).run()
+    finally:
+        snapshot.stop()
+        order_intake.stop()
+        db_writer.stop()
+        pool.disable()
+
+    report = {"meta": {"commit": _git_commit(), "timestamp": datetime.now().isoformat(),
+                       "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                       "source": os.path.abspath(source), "speed": args.speed,
+                       "concurrency": args.concurrency}, **report}
+    print(json.dumps({k: v for k, v in report.items() if k != "meta"}, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if previous is not None:
+        print(f"\nCompared with {args.compare} ({previous.get('meta', {}).get('commit', '?')}):")
+        for line in compare(previous, report):
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,482 @@
+# results.py
+"""Structured tool results with deferred text rendering.
+
+Tools return a ToolResult: the kind of result plus the data behind it.
+Nothing is formatted until someone asks for text, and then it is
+formatted once per style:
+
+    "compact"  terse key=value lines for the LLM (no emoji, Markdown or hints)
+    "rich"     the Markdown the desk GUI shows, with related-action suggestions
+
+str(result) is the rich rendering. Programs can read result.data directly.
+"""
+from typing import Callable, Dict, Optional
+
+import metrics
+
+RENDERERS: Dict[str, Dict[str, Callable[[Dict], str]]] = {}
+
+
+def renderer(kind: str, style: str):
+    """Register the function that renders `kind` results in `style`"""
+    def register(fn):
+        RENDERERS.setdefault(kind, {})[style] = fn
+        return fn
+    return register
+
+
+class ToolResult:
+    __slots__ = ("kind", "data", "error", "_rendered")
+
+    def __init__(self, kind: str, data: Optional[Dict] = None, error: Optional[str] = None):
+        self.kind = kind
+        self.data = data or {}
+        self.error = error
+        self._rendered = {}
+
+    @classmethod
+    def failure(cls, kind: str, message: str) -> "ToolResult":
+        return cls(kind, error=message)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def render(self, style: str = "rich") -> str:
+        text = self._rendered.get(style)
+        if text is None:
+            if self.error is not None:
+                text = self.error if style == "rich" else "error: " + self.error.lstrip("❌ ")
+            else:
+                text = RENDERERS[self.kind][style](self.data)
+            self._rendered[style] = text
+            if metrics.ENABLED:
+                metrics.histogram("tool_output_chars", f"{self.kind}.{style}", metrics.SIZE_BUCKETS).observe(len(text))
+        return text
+
+    def compact(self) -> str:
+        return self.render("compact")
+
+    def __str__(self):
+        return self.render("rich")
+
+    def __repr__(self):
+        return f"<ToolResult {self.kind}{' error' if self.error else ''}>"
+
+    def to_dict(self) -> Dict:
+        if self.error is not None:
+            return {"kind": self.kind, "error": self.error}
+        return {"kind": self.kind, "data": self.data}
+
+
+def render(result, style: str = "rich") -> str:
+    """Text for a tool's return value, which may already be a plain string"""
+    return result.render(style) if isinstance(result, ToolResult) else str(result)
+
+
+def _stock_status(stock: int) -> str:
+    return "🟢 Good" if stock > 5 else "🟡 Low" if stock > 0 else "🔴 Out"
+
+
+# find_books
+
+@renderer("find_books", "rich")
+def _find_books_rich(d: Dict) -> str:
+    q, by, books = d['query'], d['by'], d['books']
+    if not books:
+        if d['cursor']:
+            return f"No more books for '{q}' (searching by {by})."
+        return f"No books found for '{q}' (searching by {by})."
+
+    books_list = []
+    for i, book in enumerate(books, d['offset'] + 1):
+        books_list.append(
+            f"{i}. **{book['title']}** by {book['author']}\n"
+            f"   ISBN: {book['isbn']}, Price: ${book['price']:.2f}\n"
+            f"   Stock: {book['stock']} copies ({_stock_status(book['stock'])})"
+        )
+
+    first, last = d['offset'] + 1, d['offset'] + len(books)
+    if "total" in d:
+        total = f"{d['total']}+" if d['total_is_estimate'] else str(d['total'])
+        header = f"📚 Found {total} book(s) for '{q}' (searching by {by}), showing {first}-{last}:"
+    else:
+        header = f"📚 Books {first}-{last} for '{q}' (searching by {by}):"
+
+    response = header + "\n\n" + "\n\n".join(books_list)
+    if d['next_cursor']:
+        response += f"\n\nMore results available. Next page: `find_books_tool(cursor='{d['next_cursor']}')`"
+    return response
+
+
+@renderer("find_books", "compact")
+def _find_books_compact(d: Dict) -> str:
+    books = d['books']
+    head = f"books q={d['query']!r} by={d['by']}"
+    if not books:
+        return head + " none"
+    head += f" {d['offset'] + 1}-{d['offset'] + len(books)}"
+    if "total" in d:
+        head += f" of {d['total']}{'+' if d['total_is_estimate'] else ''}"
+    lines = [head, "isbn|title|author|price|stock"]
+    lines += [f"{b['isbn']}|{b['title']}|{b['author']}|{b['price']:.2f}|{b['stock']}" for b in books]
+    if d['next_cursor']:
+        lines.append(f"next_cursor={d['next_cursor']}")
+    return "\n".join(lines)
+
+
+# create_order
+
+@renderer("create_order", "rich")
+def _create_order_rich(d: Dict) -> str:
+    response = f"✅ **Order #{d['order_id']} Created Successfully!**\n\n"
+    response += f"Order Details:\n"
+    response += f"  • Order ID: {d['order_id']}\n"
+    response += f"  • Customer: ID {d['customer_id']}\n"
+    response += f"  • Book: {d['book_title']}\n"
+    response += f"  • Quantity: {d['quantity']}\n"
+    response += f"  • Total: ${d['total_amount']:.2f}\n"
+    response += f"  • Status: {d['status']}\n\n"
+
+    # Show stock change
+    for change in d['stock_changes']:
+        response += f"📊 Stock Update:\n"
+        response += f"  • Book: {change['title']}\n"
+        response += f"  • Old stock: {change['old_stock']} copies\n"
+        response += f"  • New stock: {change['new_stock']} copies\n"
+        response += f"  • Reduction: {change['old_stock'] - change['new_stock']} copies\n"
+
+    # Suggest related actions
+    response += f"\nRelated Actions:\n"
+    response += f"  • Check order: `order_status_tool(order_id={d['order_id']})`\n"
+    response += f"  • View inventory: `inventory_summary_tool(threshold=5)`\n"
+    if (d['stock_changes'] or [{}])[0].get('new_stock', 0) < 3:
+        response += f"  ⚠️ Low stock! Consider: `restock_book_tool(isbn='{d['isbn']}', quantity=10)`\n"
+    return response
+
+
+@renderer("create_order", "compact")
+def _create_order_compact(d: Dict) -> str:
+    text = (f"order_created id={d['order_id']} customer={d['customer_id']} isbn={d['isbn']} "
+            f"qty={d['quantity']} total={d['total_amount']:.2f} status={d['status']}")
+    for change in d['stock_changes']:
+        text += f"\nstock {change['isbn']} {change['old_stock']}->{change['new_stock']}"
+    return text
+
+
+# restock_book
+
+@renderer("restock_book", "rich")
+def _restock_book_rich(d: Dict) -> str:
+    quantity, old_stock = d['quantity'], d['old_stock']
+    increase = f"+{quantity/old_stock*100:.1f}%" if old_stock else "was out of stock"
+    response = f"**Successfully Restocked!**\n\n"
+    response += f"Restock Details:\n"
+    response += f"  • Book: {d['title']}\n"
+    response += f"  • ISBN: {d['isbn']}\n"
+    response += f"  • Added: {quantity} copies\n"
+    response += f"  • Old stock: {old_stock} copies\n"
+    response += f"  • New stock: {d['new_stock']} copies\n"
+    response += f"  • Increase: {quantity} copies ({increase})\n\n"
+
+    response += f"📊 Inventory Impact:\n"
+    response += f"  • Inventory value added: ${quantity * d['price']:.2f}\n"
+    response += f"  • Book's new total value: ${d['new_stock'] * d['price']:.2f}\n"
+    return response
+
+
+@renderer("restock_book", "compact")
+def _restock_book_compact(d: Dict) -> str:
+    return f"restocked isbn={d['isbn']} title={d['title']!r} added={d['quantity']} stock {d['old_stock']}->{d['new_stock']}"
+
+
+# update_price
+
+@renderer("update_price", "rich")
+def _update_price_rich(d: Dict) -> str:
+    isbn, old_price, new_price, stock = d['isbn'], d['old_price'], d['new_price'], d['stock']
+    price_change = new_price - old_price
+    percent_change = (price_change / old_price * 100) if old_price > 0 else 0
+
+    response = f"**Price Updated Successfully!**\n\n"
+    response += f"Price Change Details:\n"
+    response += f"  • Book: {d['title']}\n"
+    response += f"  • ISBN: {isbn}\n"
+    response += f"  • Old price: ${old_price:.2f}\n"
+    response += f"  • New price: ${new_price:.2f}\n"
+    response += f"  • Change: ${price_change:+.2f} ({percent_change:+.1f}%)\n"
+    response += f"  • Current stock: {stock} copies\n"
+    response += f"  • Inventory value change: ${price_change * stock:+.2f}\n\n"
+
+    response += f"📊 Inventory Impact:\n"
+    response += f"  • Book's new total value: ${new_price * stock:.2f}\n\n"
+
+    # Suggest related actions
+    response += f"Related Actions:\n"
+    if price_change > 0:
+        response += f"  • Consider restock discount: `restock_book_tool(isbn='{isbn}', quantity=10)`\n"
+    response += f"  • Create order with new price: `create_order_tool(book_title='{d['title']}', customer_input='1', quantity=1)`\n"
+    response += f"  • Books bought with it: `similar_books_tool(isbn='{isbn}')`\n"
+    return response
+
+
+@renderer("update_price", "compact")
+def _update_price_compact(d: Dict) -> str:
+    return (f"price_updated isbn={d['isbn']} title={d['title']!r} "
+            f"price {d['old_price']:.2f}->{d['new_price']:.2f} stock={d['stock']}")
+
+
+# order_status
+
+@renderer("order_status", "rich")
+def _order_status_rich(d: Dict) -> str:
+    items = d['items']
+    stock_info = ""
+    inventory_suggestions = ""
+    for item in items:
+        if item.get('stock') is None:
+            continue
+        stock_info += f"    • '{item['title']}': {item['stock']} copies\n"
+        if item['stock'] < 3:
+            inventory_suggestions += f"    ⚠️ '{item['title']}' is low! Restock: `restock_book_tool(isbn='{item['isbn']}', quantity=10)`\n"
+
+    response = f"**Order #{d['order_id']} Status**\n\n"
+    response += f"Order Summary:\n"
+    response += f"  • Status: {d['status']}\n"
+    response += f"  • Customer: {d.get('customer_name', 'Unknown')}\n"
+    response += f"  • Date: {d['created_at']}\n"
+    response += f"  • Total Amount: ${d['total_amount']:.2f}\n"
+    response += f"  • Items: {len(items)}\n\n"
+
+    if items:
+        response += f"🛒 Order Items:\n"
+        for i, item in enumerate(items, 1):
+            response += f"  {i}. {item['title']} by {item['author']}\n"
+            response += f"     Qty: {item.get('qty', 1)}, Price: ${item['price']:.2f}, Subtotal: ${item['subtotal']:.2f}\n"
+
+    if stock_info:
+        response += f"\nCurrent Stock Levels:\n{stock_info}"
+
+    if inventory_suggestions:
+        response += f"\nInventory Suggestions:\n{inventory_suggestions}"
+
+    # Suggest related actions
+    response += f"\nRelated Actions:\n"
+    response += f"  • Create similar order: `create_order_tool(book_title='{items[0]['title'] if items else 'Clean Code'}', customer_input='{d.get('customer_id', 1)}', quantity=1)`\n"
+    response += f"  • Check inventory: `inventory_summary_tool(threshold=5)`\n"
+    if items:
+        response += f"  • Suggest more: `similar_books_tool(isbn='{items[0]['isbn']}')`\n"
+    return response
+
+
+@renderer("order_status", "compact")
+def _order_status_compact(d: Dict) -> str:
+    lines = [f"order id={d['order_id']} status={d['status']} customer={d.get('customer_name')} "
+             f"(id {d['customer_id']}) date={d['created_at']} total={d['total_amount']:.2f}",
+             "isbn|title|qty|price|subtotal|stock"]
+    lines += [f"{i['isbn']}|{i['title']}|{i['qty']}|{i['price']:.2f}|{i['subtotal']:.2f}|{i.get('stock')}"
+              for i in d['items']]
+    return "\n".join(lines)
+
+
+# inventory_summary
+
+@renderer("inventory_summary", "rich")
+def _inventory_summary_rich(d: Dict) -> str:
+    threshold = d['low_stock_threshold']
+    low_stock_details = ""
+    restock_suggestions = ""
+    for i, book in enumerate(d['low_stock_books'][:3], 1):  # Top 3 only
+        low_stock_details += f"  {i}. **{book['title']}** by {book['author']}\n"
+        low_stock_details += f"     ISBN: {book['isbn']}, Stock: {book['stock']}, Price: ${book['price']:.2f}\n"
+        restock_suggestions += f"  • Restock '{book['title']}': `restock_book_tool(isbn='{book['isbn']}', quantity=10)`\n"
+
+    response = f"**Inventory Summary**\n\n"
+    response += f"Overview:\n"
+    response += f"  • Total books: {d['total_books']}\n"
+    response += f"  • Total inventory value: ${d['total_inventory_value']:.2f}\n"
+    response += f"  • Out of stock: {d['out_of_stock_count']} books\n"
+    response += f"  • Low stock (≤{threshold}): {d['low_stock_count']} books\n\n"
+
+    if low_stock_details:
+        response += f"📉 Top Low-Stock Books:\n{low_stock_details}\n"
+
+    # Health assessment
+    response += f"Inventory Health:\n"
+    if d['out_of_stock_count'] > 0:
+        response += f" {d['out_of_stock_count']} book(s) are OUT OF STOCK - Urgent action needed!\n"
+    if d['low_stock_count'] > 0:
+        response += f"{d['low_stock_count']} book(s) are running low - Consider restocking\n"
+    if d['out_of_stock_count'] == 0 and d['low_stock_count'] == 0:
+        response += f"  ✅ All books are sufficiently stocked\n"
+
+    if restock_suggestions:
+        response += f"\nRestock Suggestions:\n{restock_suggestions}"
+
+    # Suggest related actions
+    response += f"\nRelated Actions:\n"
+    response += f"  • Check specific book: `find_books_tool(q='Clean Code', by='title')`\n"
+    response += f"  • Create order: `create_order_tool(book_title='The Pragmatic Programmer', customer_input='1', quantity=1)`\n"
+    response += f"  • Update prices: `update_price_tool(isbn='9780132350884', new_price=45.00)`\n"
+    return response
+
+
+@renderer("inventory_summary", "compact")
+def _inventory_summary_compact(d: Dict) -> str:
+    lines = [f"inventory books={d['total_books']} value={d['total_inventory_value']:.2f} "
+             f"out_of_stock={d['out_of_stock_count']} low_stock(<={d['low_stock_threshold']})={d['low_stock_count']}"]
+    if d['low_stock_books']:
+        lines.append("lowest: isbn|title|stock")
+        lines += [f"{b['isbn']}|{b['title']}|{b['stock']}" for b in d['low_stock_books'][:10]]
+    return "\n".join(lines)
+
+
+# restock_suggestions
+
+@renderer("restock_suggestions", "rich")
+def _restock_suggestions_rich(d: Dict) -> str:
+    if not d['suggestions']:
+        return f"✅ No titles need restocking based on the last {d['days']} days of sales."
+
+    classes = d['class_counts']
+    response = f"**Restock Suggestions**\n\n"
+    response += f"  • Titles analysed: {d['total_titles']}\n"
+    response += f"  • Titles below reorder point: {d['restock_count']}\n"
+    response += f"  • ABC classes: A={classes.get('A', 0)}, B={classes.get('B', 0)}, C={classes.get('C', 0)}\n"
+    response += f"  • Sales window: {d['days']} days, lead time: {d['lead_time_days']} days\n\n"
+
+    for i, s in enumerate(d['suggestions'], 1):
+        response += f"  {i}. **{s['title']}** by {s['author']} [{s['abc_class']}]\n"
+        response += f"     ISBN: {s['isbn']}, Stock: {s['stock']}, Sells {s['velocity']:.2f}/day, "
+        response += f"Cover: {s['days_of_cover']:.1f} days\n"
+        response += f"     Restock: `restock_book_tool(isbn='{s['isbn']}', quantity={s['suggested_qty']})`\n"
+    return response
+
+
+@renderer("restock_suggestions", "compact")
+def _restock_suggestions_compact(d: Dict) -> str:
+    lines = [f"restock window={d['days']}d lead={d['lead_time_days']}d below_reorder={d['restock_count']}"]
+    if d['suggestions']:
+        lines.append("isbn|title|class|stock|per_day|cover_days|order_qty")
+        lines += [f"{s['isbn']}|{s['title']}|{s['abc_class']}|{s['stock']}|{s['velocity']:.2f}|"
+                  f"{s['days_of_cover']:.1f}|{s['suggested_qty']}" for s in d['suggestions']]
+    return "\n".join(lines)
+
+
+# top_titles
+
+@renderer("top_titles", "rich")
+def _top_titles_rich(d: Dict) -> str:
+    if not d['titles']:
+        return f"No sales recorded in the last {d['days']} day(s)."
+
+    response = f"🏆 **Top {len(d['titles'])} Titles (last {d['days']} days)**\n\n"
+    for i, row in enumerate(d['titles'], 1):
+        response += f"  {i}. **{row['title']}** by {row['author']}\n"
+        response += f"     ISBN: {row['isbn']}, Sold: {row['qty']} copies, Revenue: ${row['revenue']:.2f}\n"
+    return response
+
+
+@renderer("top_titles", "compact")
+def _top_titles_compact(d: Dict) -> str:
+    lines = [f"top_titles days={d['days']}", "isbn|title|qty|revenue"]
+    lines += [f"{r['isbn']}|{r['title']}|{r['qty']}|{r['revenue']:.2f}" for r in d['titles']]
+    return "\n".join(lines)
+
+
+# revenue_by_day
+
+@renderer("revenue_by_day", "rich")
+def _revenue_by_day_rich(d: Dict) -> str:
+    if not d['by_day']:
+        return f"No sales recorded in the last {d['days']} day(s)."
+
+    response = f"📈 **Revenue by Day (last {d['days']} days)**\n\n"
+    for row in d['by_day']:
+        response += f"  • {row['day']}: {row['orders']} order(s), {row['qty']} copies, ${row['revenue']:.2f}\n"
+    response += f"\nTotal: {d['total_orders']} order(s), ${d['total_revenue']:.2f}\n"
+    return response
+
+
+@renderer("revenue_by_day", "compact")
+def _revenue_by_day_compact(d: Dict) -> str:
+    lines = [f"revenue days={d['days']} orders={d.get('total_orders', 0)} total={d.get('total_revenue', 0):.2f}",
+             "day|orders|qty|revenue"]
+    lines += [f"{r['day']}|{r['orders']}|{r['qty']}|{r['revenue']:.2f}" for r in d['by_day']]
+    return "\n".join(lines)
+
+
+# customer_value
+
+@renderer("customer_value", "rich")
+def _customer_value_rich(d: Dict) -> str:
+    response = f"👤 **Customer Value: {d['name']}** (ID {d['customer_id']})\n\n"
+    response += f"  • Orders: {d['orders']}\n"
+    response += f"  • Copies bought: {d['items']}\n"
+    response += f"  • Lifetime revenue: ${d['revenue']:.2f}\n"
+    response += f"  • Average order value: ${d['average_order_value']:.2f}\n"
+    if d['first_order_at']:
+        response += f"  • First order: {d['first_order_at']}\n"
+        response += f"  • Last order: {d['last_order_at']}\n"
+    return response
+
+
+@renderer("customer_value", "compact")
+def _customer_value_compact(d: Dict) -> str:
+    return (f"customer id={d['customer_id']} name={d['name']!r} orders={d['orders']} items={d['items']} "
+            f"revenue={d['revenue']:.2f} aov={d['average_order_value']:.2f} "
+            f"first={d['first_order_at']} last={d['last_order_at']}")
+
+
+# similar_books
+
+@renderer("similar_books", "rich")
+def _similar_books_rich(d: Dict) -> str:
+    book = d['book']
+    if not d['similar']:
+        return (f"No co-purchases recorded yet for **{book['title']}**. "
+                f"Try `find_books_tool(q='{book['author']}', by='author')` for more by the same author.")
+
+    response = f"🛍️ Customers who bought **{book['title']}** also bought:\n\n"
+    for i, other in enumerate(d['similar'], 1):
+        response += f"{i}. **{other['title']}** by {other['author']}\n"
+        response += f"   ISBN: {other['isbn']}, Price: ${other['price']:.2f}, "
+        response += f"Stock: {other['stock']} ({_stock_status(other['stock'])}), Bought together: {other['together']}x\n"
+    return response
+
+
+@renderer("similar_books", "compact")
+def _similar_books_compact(d: Dict) -> str:
+    book = d['book']
+    lines = [f"similar_books isbn={book['isbn']} title={book['title']!r}"]
+    if not d['similar']:
+        return lines[0] + " none"
+    lines.append("isbn|title|author|price|stock|together")
+    lines += [f"{b['isbn']}|{b['title']}|{b['author']}|{b['price']:.2f}|{b['stock']}|{b['together']}"
+              for b in d['similar']]
+    return "\n".join(lines)
+
+
+# books_about
+
+@renderer("books_about", "rich")
+def _books_about_rich(d: Dict) -> str:
+    if not d['books']:
+        return f"No books found about '{d['topic']}'. Try `find_books_tool(q='{d['topic']}')` for a title search."
+
+    response = f"📚 Books about '{d['topic']}':\n\n"
+    for i, book in enumerate(d['books'], 1):
+        response += f"{i}. **{book['title']}** by {book['author']}\n"
+        response += f"   ISBN: {book['isbn']}, Price: ${book['price']:.2f}\n"
+        response += f"   Stock: {book['stock']} copies ({_stock_status(book['stock'])}), Match: {book['score']:.0%}\n\n"
+    return response.rstrip("\n")
+
+
+@renderer("books_about", "compact")
+def _books_about_compact(d: Dict) -> str:
+    if not d['books']:
+        return f"books_about topic={d['topic']!r} none"
+    lines = [f"books_about topic={d['topic']!r}", "isbn|title|author|price|stock|score"]
+    lines += [f"{b['isbn']}|{b['title']}|{b['author']}|{b['price']:.2f}|{b['stock']}|{b['score']:.2f}"
+              for b in d['books']]
+    return "\n".join(lines)
@@ -0,0 +1,340 @@
+# retention.py
+"""Retention and archival for the messages and tool_calls logs.
+
+Both logs are append-only. Rows older than RETENTION_DAYS are moved out of
+the operational database into monthly archive databases next to it:
+
+    db/archive/library-log-2026-09.db
+
+Archive rows keep their original id, session, name and timestamp as plain
+indexed columns. The text payloads (message content, tool-call args and
+results) are stored as zlib-compressed BLOBs. The archive_partitions table
+in the operational database records each archive file, the time range it
+covers and its row counts. find_archived() uses it to open only the
+partitions a lookup needs.
+
+Moving a batch is crash-safe. Rows are copied into the archive and
+committed there first (INSERT OR IGNORE on the original id), then deleted
+from the operational database through db_functions.run_write(). A run
+interrupted between the two steps just copies the same rows again next time.
+
+compact_tool_calls() rewrites existing tool-call JSON without whitespace.
+New rows are written compact already.
+
+    python retention.py --days 30 --compact
+"""
+import argparse
+import json
+import os
+import sqlite3
+import zlib
+from typing import Dict, List, Optional
+
+import db_functions
+
+RETENTION_DAYS = int(os.environ.get("LIBRARY_RETENTION_DAYS", 90))
+BATCH_SIZE = 2000
+COMPACT_MIN_CHARS = 200
+
+# Per logged table: plain columns, then compressed payload columns
+TABLES = {
+    "messages": (("session_id", "role"), ("content",)),
+    "tool_calls": (("session_id", "name"), ("args_json", "result_json")),
+}
+
+ARCHIVE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY,
+        session_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        content BLOB NOT NULL,
+        created_at TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, created_at)",
+    """CREATE TABLE IF NOT EXISTS tool_calls (
+        id INTEGER PRIMARY KEY,
+        session_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        args_json BLOB NOT NULL,
+        result_json BLOB NOT NULL,
+        created_at TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_tool_calls_session ON tool_calls(session_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_tool_calls_name ON tool_calls(name, created_at)",
+]
+
+CATALOG_SCHEMA = """CREATE TABLE IF NOT EXISTS archive_partitions (
+    partition TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    file TEXT NOT NULL,
+    first_at TEXT,
+    last_at TEXT,
+    rows INTEGER NOT NULL DEFAULT 0,
+    raw_bytes INTEGER NOT NULL DEFAULT 0,
+    stored_bytes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (partition, table_name)
+)"""
+
+
+def archive_dir() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(db_functions.path)), "archive")
+
+
+def partition_file(partition: str) -> str:
+    stem = os.path.splitext(os.path.basename(db_functions.path))[0]
+    return os.path.join(archive_dir(), f"{stem}-log-{partition}.db")
+
+
+def _open_archive(partition: str) -> sqlite3.Connection:
+    os.makedirs(archive_dir(), exist_ok=True)
+    conn = sqlite3.connect(partition_file(partition))
+    for statement in ARCHIVE_SCHEMA:
+        conn.execute(statement)
+    return conn
+
+
+def compress(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), 6)
+
+
+def decompress(blob: bytes) -> str:
+    return zlib.decompress(blob).decode("utf-8")
+
+
+def _delete_tx(conn, table: str, ids: List[int], catalog: List[tuple]):
+    conn.execute(CATALOG_SCHEMA)
+    conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(i,) for i in ids])
+    conn.executemany("""
+        INSERT INTO archive_partitions
+            (partition, table_name, file, first_at, last_at, rows, raw_bytes, stored_bytes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(partition, table_name) DO UPDATE SET
+            first_at = MIN(first_at, excluded.first_at),
+            last_at = MAX(last_at, excluded.last_at),
+            rows = rows + excluded.rows,
+            raw_bytes = raw_bytes + excluded.raw_bytes,
+            stored_bytes = stored_bytes + excluded.stored_bytes
+    """, catalog)
+
+
+def _archive_batch(table: str, rows: List[tuple]) -> Dict:
+    """Copy one batch into its partitions, then drop it from the operational DB"""
+    plain, packed = TABLES[table]
+    columns = ("id",) + plain + packed + ("created_at",)
+    by_partition: Dict[str, List[tuple]] = {}
+    for row in rows:
+        by_partition.setdefault((row[-1] or "unknown")[:7], []).append(row)
+
+    catalog = []
+    raw_total = stored_total = 0
+    for partition, part_rows in by_partition.items():
+        encoded = []
+        raw = stored = 0
+        for row in part_rows:
+            payload = row[1 + len(plain):-1]
+            blobs = [compress(text) for text in payload]
+            raw += sum(len(text) for text in payload)
+            stored += sum(len(blob) for blob in blobs)
+            encoded.append(row[:1 + len(plain)] + tuple(blobs) + row[-1:])
+        archive = _open_archive(partition)
+        try:
+            archive.executemany(
+                f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                encoded
+            )
+            archive.commit()
+        finally:
+            archive.close()
+        catalog.append((partition, table, os.path.basename(partition_file(partition)),
+                        part_rows[0][-1], part_rows[-1][-1], len(part_rows), raw, stored))
+        raw_total += raw
+        stored_total += stored
+
+    db_functions.run_write(_delete_tx, table, [row[0] for row in rows], catalog)
+    return {"rows": len(rows), "raw_bytes": raw_total, "stored_bytes": stored_total,
+            "partitions": sorted(by_partition)}
+
+
+def archive_logs(days: int = RETENTION_DAYS, batch_size: int = BATCH_SIZE,
+                 max_rows: Optional[int] = None) -> Dict:
+    """Move messages and tool calls older than `days` into the archive.
+
+    With max_rows, stop after moving that many rows in total and report
+    "more": True; the next call carries on from the oldest rows left.
+    """
+    columns_by_table = {table: ("id",) + plain + packed + ("created_at",)
+                        for table, (plain, packed) in TABLES.items()}
+    summary = {"days": days, "raw_bytes": 0, "stored_bytes": 0, "partitions": set(), "more": False}
+    budget = max_rows
+    try:
+        conn = db_functions.get_connection()
+        try:
+            cutoff = conn.execute("SELECT datetime('now', ?)", (f"-{int(days)} days",)).fetchone()[0]
+        finally:
+            conn.close()
+
+        for table, columns in columns_by_table.items():
+            moved = 0
+            last_id = 0
+            while True:
+                if budget is not None and budget <= 0:
+                    summary["more"] = True
+                    break
+                # Walk by id so each batch is a rowid range scan
+                conn = db_functions.get_connection()
+                try:
+                    rows = conn.execute(
+                        f"SELECT {', '.join(columns)} FROM {table} "
+                        f"WHERE id > ? AND created_at < ? ORDER BY id LIMIT ?",
+                        (last_id, cutoff, batch_size if budget is None else min(batch_size, budget))
+                    ).fetchall()
+                finally:
+                    conn.close()
+                if not rows:
+                    break
+                result = _archive_batch(table, rows)
+                moved += result["rows"]
+                if budget is not None:
+                    budget -= result["rows"]
+                summary["raw_bytes"] += result["raw_bytes"]
+                summary["stored_bytes"] += result["stored_bytes"]
+                summary["partitions"].update(result["partitions"])
+                last_id = rows[-1][0]
+            summary[table] = moved
+    except Exception as e:
+        return {"error": str(e)}
+
+    summary["partitions"] = sorted(summary["partitions"])
+    summary["cutoff"] = cutoff
+    summary["message"] = (f"Archived {summary['messages']} messages and {summary['tool_calls']} tool calls "
+                          f"older than {cutoff} ({summary['raw_bytes']} -> {summary['stored_bytes']} bytes)")
+    if summary["more"]:
+        summary["message"] += "; more left for the next run"
+    return summary
+
+
+def _rewrite_tx(conn, updates: List[tuple]):
+    conn.executemany("UPDATE tool_calls SET args_json = ?, result_json = ? WHERE id = ?", updates)
+
+
+def _compact(text: str) -> str:
+    return json.dumps(json.loads(text), separators=(",", ":"))
+
+
+def compact_tool_calls(min_chars: int = COMPACT_MIN_CHARS, batch_size: int = BATCH_SIZE) -> Dict:
+    """Re-encode tool-call JSON of at least `min_chars` without whitespace"""
+    rewritten = saved = 0
+    last_id = 0
+    try:
+        while True:
+            conn = db_functions.get_connection()
+            try:
+                rows = conn.execute("""
+                    SELECT id, args_json, result_json FROM tool_calls
+                    WHERE id > ? AND length(args_json) + length(result_json) >= ?
+                    ORDER BY id LIMIT ?
+                """, (last_id, min_chars, batch_size)).fetchall()
+            finally:
+                conn.close()
+            if not rows:
+                break
+            updates = []
+            for row_id, args, result in rows:
+                try:
+                    new_args, new_result = _compact(args), _compact(result)
+                except ValueError:
+                    continue
+                delta = len(args) + len(result) - len(new_args) - len(new_result)
+                if delta > 0:
+                    updates.append((new_args, new_result, row_id))
+                    saved += delta
+            if updates:
+                db_functions.run_write(_rewrite_tx, updates)
+                rewritten += len(updates)
+            last_id = rows[-1][0]
+    except Exception as e:
+        return {"error": str(e)}
+    return {"rewritten": rewritten, "bytes_saved": saved,
+            "message": f"Compacted {rewritten} tool calls, saving {saved} bytes"}
+
+
+def partitions(table: str, since: Optional[str] = None, until: Optional[str] = None) -> List[Dict]:
+    """Catalog entries for `table` that overlap [since, until]"""
+    conn = db_functions.get_connection()
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute("""
+            SELECT * FROM archive_partitions
+            WHERE table_name = ? AND (? IS NULL OR last_at >= ?) AND (? IS NULL OR first_at <= ?)
+            ORDER BY partition
+        """, (table, since, since, until, until)).fetchall()
+        return [dict(row) for row in rows]
+    except sqlite3.OperationalError:
+        # Nothing archived yet
+        return []
+    finally:
+        conn.close()
+
+
+def find_archived(table: str = "messages", session_id: Optional[str] = None, name: Optional[str] = None,
+                  since: Optional[str] = None, until: Optional[str] = None, limit: int = 100) -> List[Dict]:
+    """Look up archived rows, oldest first, decompressing their payloads"""
+    if table not in TABLES:
+        raise ValueError(f"Unknown log table: {table}")
+    plain, packed = TABLES[table]
+    columns = ("id",) + plain + packed + ("created_at",)
+    filters, params = [], []
+    for column, value in (("session_id", session_id), ("name", name)):
+        if value is not None:
+            filters.append(f"{column} = ?")
+            params.append(value)
+    if since is not None:
+        filters.append("created_at >= ?")
+        params.append(since)
+    if until is not None:
+        filters.append("created_at <= ?")
+        params.append(until)
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+
+    found = []
+    for entry in partitions(table, since, until):
+        path = os.path.join(archive_dir(), entry["file"])
+        if not os.path.exists(path):
+            continue
+        conn = sqlite3.connect(path)
+        try:
+            rows = conn.execute(
+                f"SELECT {', '.join(columns)} FROM {table} {where} ORDER BY id LIMIT ?",
+                params + [limit - len(found)]
+            ).fetchall()
+        finally:
+            conn.close()
+        for row in rows:
+            record = dict(zip(columns, row))
+            for column in packed:
+                record[column] = decompress(record[column])
+            found.append(record)
+        if len(found) >= limit:
+            break
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive and compact the message and tool-call logs")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS, help="Keep this many days in the operational DB")
+    parser.add_argument("--compact", action="store_true", help="Also rewrite remaining tool-call JSON compactly")
+    parser.add_argument("--max-rows", type=int, default=None, help="Move at most this many rows in this run")
+    parser.add_argument("--db", default=None, help="Database path (default: db_functions.path)")
+    args = parser.parse_args()
+
+    if args.db:
+        db_functions.path = args.db
+    result = archive_logs(args.days, max_rows=args.max_rows)
+    print(result.get("error") or result["message"])
+    if args.compact:
+        result = compact_tool_calls()
+        print(result.get("error") or result["message"])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,21 @@
 # db_init.py
 import sqlite3
 import os
+from analytics import ROLLUP_SCHEMA
+from title_index import TITLE_INDEX_SCHEMA
+from topic_index import TOPIC_INDEX_SCHEMA
+from recommendations import RECOMMENDATION_SCHEMA
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "flibrary.db")
 
+# Bumped whenever migrate_db gains a new step
+SCHEMA_VERSION = 5
+
 def init_db():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
+    # Must be set before the first table; lets maintenance.py hand free pages back
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
 
     cursor.executescript("""
     CREATE TABLE IF NOT EXISTS books (
@@ -28,6 +37,7 @@ def init_db():
         customer_id INTEGER NOT NULL,
         status TEXT DEFAULT 'created',
         created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        total_amount REAL,
         FOREIGN KEY (customer_id) REFERENCES customers(id)
     );
 
@@ -35,6 +45,8 @@ def init_db():
         order_id INTEGER NOT NULL,
         isbn TEXT NOT NULL,
         qty INTEGER NOT NULL CHECK (qty > 0),
+        unit_price REAL,
+        line_total REAL,
         FOREIGN KEY (order_id) REFERENCES orders(id),
         FOREIGN KEY (isbn) REFERENCES books(isbn)
     );
@@ -55,11 +67,85 @@ def init_db():
         result_json TEXT NOT NULL,
         created_at TEXT DEFAULT CURRENT_TIMESTAMP
     );
+
+    -- Keyset pagination walks these in (column, isbn) order
+    CREATE INDEX IF NOT EXISTS idx_books_title ON books(title, isbn);
+    CREATE INDEX IF NOT EXISTS idx_books_author ON books(author, isbn);
+    CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id);
     """)
 
+    for statement in ROLLUP_SCHEMA + TITLE_INDEX_SCHEMA + TOPIC_INDEX_SCHEMA + RECOMMENDATION_SCHEMA:
+        cursor.execute(statement)
+
     conn.commit()
+    migrate_db(conn)
     conn.close()
     print("✅ Database schema created successfully")
 
+def _columns(cursor, table):
+    return {row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()}
+
+def backfill_price_snapshots(cursor):
+    """Fill in missing order line prices and order totals from current book prices"""
+    cursor.execute("""
+        UPDATE order_items
+        SET unit_price = (SELECT price FROM books WHERE books.isbn = order_items.isbn)
+        WHERE unit_price IS NULL
+    """)
+    cursor.execute("UPDATE order_items SET line_total = unit_price * qty WHERE line_total IS NULL")
+    cursor.execute("""
+        UPDATE orders
+        SET total_amount = (
+            SELECT COALESCE(SUM(line_total), 0) FROM order_items WHERE order_items.order_id = orders.id
+        )
+        WHERE total_amount IS NULL
+    """)
+
+def migrate_db(conn):
+    """Bring an existing database up to SCHEMA_VERSION"""
+    cursor = conn.cursor()
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+
+    # Nothing to migrate until the base schema exists
+    if not _columns(cursor, "order_items"):
+        return
+
+    if version < 1:
+        # Version 1: order lines snapshot their price, orders store their total
+        if "unit_price" not in _columns(cursor, "order_items"):
+            cursor.execute("ALTER TABLE order_items ADD COLUMN unit_price REAL")
+            cursor.execute("ALTER TABLE order_items ADD COLUMN line_total REAL")
+        if "total_amount" not in _columns(cursor, "orders"):
+            cursor.execute("ALTER TABLE orders ADD COLUMN total_amount REAL")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id)")
+        backfill_price_snapshots(cursor)
+
+    if version < 2:
+        # Version 2: trigram title index, built from the pending queue on first lookup
+        for statement in TITLE_INDEX_SCHEMA:
+            cursor.execute(statement)
+        cursor.execute("INSERT OR IGNORE INTO title_index_pending (isbn) SELECT isbn FROM books")
+
+    if version < 3:
+        # Version 3: topic vector index, built from the pending queue on first search
+        for statement in TOPIC_INDEX_SCHEMA:
+            cursor.execute(statement)
+        cursor.execute("INSERT OR IGNORE INTO topic_index_pending (isbn) SELECT isbn FROM books")
+
+    if version < 4:
+        # Version 4: co-purchase tables, filled from the order history on first use
+        for statement in ROLLUP_SCHEMA + RECOMMENDATION_SCHEMA:
+            cursor.execute(statement)
+
+    if version < 5:
+        # Version 5: keyset pagination walks books in (column, isbn) order
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_books_title ON books(title, isbn)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_books_author ON books(author, isbn)")
+
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+
 if __name__ == "__main__":
     init_db()
@@ -1,6 +1,7 @@
 # db_seed.py
 import sqlite3
 import os
+from schema import backfill_price_snapshots
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "flibrary.db")
 
@@ -42,7 +43,7 @@ def seed_db():
     )
 
     cursor.executemany(
-        "INSERT INTO order_items VALUES (?, ?, ?)",
+        "INSERT INTO order_items (order_id, isbn, qty) VALUES (?, ?, ?)",
         [
             (1, '9780132350884', 2),
             (1, '9780134685991', 1),
@@ -53,6 +54,9 @@ def seed_db():
         ]
     )
 
+    # Sample orders take their prices from the seeded catalogue
+    backfill_price_snapshots(cursor)
+
     conn.commit()
     conn.close()
     print("✅ Database seeded successfully")
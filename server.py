@@ -0,0 +1,397 @@
+# server.py
+"""Headless desk service: one agent process for many desk terminals.
+
+An asyncio HTTP/1.1 and WebSocket server (standard library only) that
+routes each desk session to its own CompatibleAgent. Turns run on a
+bounded worker pool. Reads use a shared pool of WAL connections (see
+pool.py). Every mutation goes to the writer actor (see writer.py), which
+group-commits whatever is queued, and orders placed within a few
+milliseconds of each other are validated and applied as one batch (see
+order_intake.py). Turns within one session run in order.
+Different sessions run concurrently. Database maintenance runs in quiet
+periods (see maintenance.py). Report and analytics tools read a snapshot
+of the database that is refreshed in the background (see snapshot.py).
+
+    python server.py --port 8765 --workers 16
+
+HTTP API (JSON bodies):
+    GET    /health                       status, sessions, pool, writer, order intake, maintenance, reports and LLM
+    POST   /sessions                     -> {"session_id"}
+    POST   /sessions/<id>/messages       {"message"} -> {"session_id", "response", "ms"}
+    GET    /sessions/<id>/history        -> {"messages"}
+    PUT    /sessions/<id>/history        {"messages"} replaces the agent's history
+    DELETE /sessions/<id>/history        clears it
+
+WebSocket: GET /ws?session=<id>. Each text frame is {"message": ...} and
+gets one {"session_id", "response", "ms"} frame back.
+
+The desk GUI uses the service when LIBRARY_DESK_SERVER is set (see client.py).
+Messages the fast path cannot answer go to the LLM backend configured by
+LIBRARY_LLM_URL, shared by every session (see llm_client.py).
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import struct
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import db_functions
+import llm_client
+import maintenance
+import metrics
+import order_intake
+import pool
+import snapshot
+import writer as db_writer
+import tracing
+
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 16
+SESSION_IDLE_SECONDS = 3600
+MAX_BODY_BYTES = 1 << 20
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Session:
+    def __init__(self, session_id: str, agent):
+        self.session_id = session_id
+        self.agent = agent
+        self.lock = asyncio.Lock()
+        self.last_seen = time.monotonic()
+
+
+class SessionRouter:
+    """Maps session ids to agents and runs their turns on the worker pool"""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, agent_factory=None):
+        if agent_factory is None:
+            from functools import partial
+            from agent import CompatibleAgent
+            agent_factory = partial(CompatibleAgent, llm=llm_client.from_env())
+        self.agent_factory = agent_factory
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="desk-turn")
+        self.sessions: Dict[str, Session] = {}
+
+    def get(self, session_id: Optional[str] = None) -> Session:
+        session_id = session_id or str(uuid.uuid4())
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = Session(session_id, self.agent_factory(session_id=session_id))
+        session.last_seen = time.monotonic()
+        return session
+
+    async def run_turn(self, session_id: str, message: str) -> Dict:
+        session = self.get(session_id)
+        async with session.lock:
+            start = time.perf_counter()
+            response = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self._turn, session, message
+            )
+        return {"session_id": session_id, "response": response,
+                "ms": round((time.perf_counter() - start) * 1000.0, 2)}
+
+    @staticmethod
+    def _turn(session: Session, message: str) -> str:
+        with tracing.turn(session.session_id, name="server.turn"):
+            try:
+                return session.agent.run(message)
+            except Exception as e:
+                return f"Error processing message: {e}"
+
+    def expire_idle(self, max_idle: float = SESSION_IDLE_SECONDS) -> int:
+        now = time.monotonic()
+        idle = [sid for sid, s in self.sessions.items()
+                if now - s.last_seen > max_idle and not s.lock.locked()]
+        for sid in idle:
+            del self.sessions[sid]
+        return len(idle)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class DeskServer:
+    def __init__(self, router: SessionRouter):
+        self.router = router
+
+    # HTTP
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                url = urlsplit(target)
+                if url.path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+                    await self._websocket(reader, writer, headers, parse_qs(url.query))
+                    break
+                try:
+                    status, payload = await self._dispatch(method, url.path, body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except HttpError as e:
+            await self._respond(writer, e.status, {"error": str(e)}, False)
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader) -> Optional[Tuple[str, str, Dict, bytes]]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise HttpError(413, "Request headers too large")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", "0") or 0)
+        except ValueError:
+            raise HttpError(400, "Invalid Content-Length")
+        if length < 0:
+            raise HttpError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    async def _respond(self, writer, status: int, payload: Dict, keep_alive: bool = True):
+        body = json.dumps(payload).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Dict]:
+        parts = [p for p in path.split("/") if p]
+
+        if parts == ["health"] and method == "GET":
+            shared = pool.active()
+            actor = db_writer.active()
+            intake = order_intake.active()
+            upkeep = maintenance.active()
+            reports = snapshot.active()
+            return 200, {"status": "ok", "sessions": len(self.router.sessions),
+                         "pool": shared.snapshot() if shared else None,
+                         "writer": actor.snapshot() if actor else None,
+                         "orders": intake.snapshot() if intake else None,
+                         "maintenance": upkeep.snapshot() if upkeep else None,
+                         "reports": reports.snapshot() if reports else None,
+                         "llm": llm_client.active_snapshots()}
+
+        if parts == ["sessions"] and method == "POST":
+            return 201, {"session_id": self.router.get().session_id}
+
+        if len(parts) == 3 and parts[0] == "sessions":
+            session_id, resource = parts[1], parts[2]
+            data = self._json(body) if body else {}
+
+            if resource == "messages" and method == "POST":
+                message = data.get("message")
+                if not isinstance(message, str) or not message.strip():
+                    raise HttpError(400, "'message' must be a non-empty string")
+                return 200, await self.router.run_turn(session_id, message)
+
+            if resource == "history":
+                agent = self.router.get(session_id).agent
+                if method == "GET":
+                    return 200, {"session_id": session_id, "messages": agent.get_chat_history()}
+                if method == "PUT":
+                    messages = data.get("messages")
+                    if not isinstance(messages, list):
+                        raise HttpError(400, "'messages' must be a list")
+                    agent.chat_history = list(messages)
+                    return 200, {"session_id": session_id, "messages": len(messages)}
+                if method == "DELETE":
+                    agent.reset_chat()
+                    return 200, {"session_id": session_id, "messages": 0}
+                raise HttpError(405, f"{method} not allowed on {path}")
+
+        raise HttpError(404, f"No route for {method} {path}")
+
+    @staticmethod
+    def _json(body: bytes) -> Dict:
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise HttpError(400, "Body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HttpError(400, "Body must be a JSON object")
+        return data
+
+    # WebSocket (RFC 6455, text frames only)
+
+    async def _websocket(self, reader, writer, headers: Dict, query: Dict):
+        key = headers.get("sec-websocket-key")
+        if not key:
+            raise HttpError(400, "Missing Sec-WebSocket-Key")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+        ).encode("latin-1"))
+        await writer.drain()
+
+        session_id = (query.get("session") or [None])[0] or self.router.get().session_id
+        fragments = []
+        while True:
+            opcode, payload = await self._read_frame(reader)
+            if opcode == 0x8:  # close
+                await self._send_frame(writer, 0x8, payload[:2])
+                return
+            if opcode == 0x9:  # ping
+                await self._send_frame(writer, 0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            fragments.append(payload)
+            if not opcode & 0x80:  # more fragments follow
+                continue
+            text = b"".join(fragments).decode("utf-8", "replace")
+            fragments = []
+            try:
+                data = json.loads(text)
+                message = data["message"] if isinstance(data, dict) else None
+                if not isinstance(message, str) or not message.strip():
+                    raise ValueError("'message' must be a non-empty string")
+                reply = await self.router.run_turn(session_id, message)
+            except (ValueError, KeyError) as e:
+                reply = {"session_id": session_id, "error": str(e)}
+            await self._send_frame(writer, 0x1, json.dumps(reply).encode("utf-8"))
+
+    @staticmethod
+    async def _read_frame(reader) -> Tuple[int, bytes]:
+        """Read one frame; the returned opcode has bit 0x80 set on the final fragment"""
+        b1, b2 = await reader.readexactly(2)
+        length = b2 & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", await reader.readexactly(8))[0]
+        if length > MAX_BODY_BYTES:
+            raise ConnectionError("WebSocket frame too large")
+        mask = await reader.readexactly(4) if b2 & 0x80 else None
+        payload = await reader.readexactly(length)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        opcode = b1 & 0x0F
+        if opcode >= 0x8:
+            return opcode, payload
+        return opcode | (b1 & 0x80), payload
+
+    @staticmethod
+    async def _send_frame(writer, opcode: int, payload: bytes):
+        length = len(payload)
+        if length < 126:
+            head = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 1 << 16:
+            head = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            head = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        writer.write(head + payload)
+        await writer.drain()
+
+
+async def _expire_sessions(router: SessionRouter, interval: float = 60.0):
+    while True:
+        await asyncio.sleep(interval)
+        router.expire_idle()
+
+
+async def serve(host: str = "127.0.0.1", port: int = DEFAULT_PORT, workers: int = DEFAULT_WORKERS,
+                pool_size: int = pool.DEFAULT_SIZE, agent_factory=None,
+                order_window_ms: float = order_intake.WINDOW_MS,
+                maintenance_budget_ms: float = maintenance.BUDGET_MS,
+                report_refresh_s: float = snapshot.REFRESH_SECONDS):
+    pool.enable(db_functions.path, pool_size)
+    # Run any schema migration before the writer takes over
+    db_functions.get_connection().close()
+    db_writer.start(db_functions.path)
+    if order_window_ms > 0:
+        order_intake.start(db_functions.path, order_window_ms)
+    if maintenance_budget_ms > 0:
+        maintenance.start(budget_ms=maintenance_budget_ms)
+    if report_refresh_s > 0:
+        snapshot.start(db_functions.path, report_refresh_s)
+    router = SessionRouter(workers, agent_factory)
+    server = await asyncio.start_server(DeskServer(router).handle, host, port)
+    expiry = asyncio.create_task(_expire_sessions(router))
+    print(f"Library desk service on http://{host}:{port} ({workers} workers, pool of {pool_size})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        expiry.cancel()
+        snapshot.stop()
+        maintenance.stop()
+        router.shutdown()
+        order_intake.stop()
+        db_writer.stop()
+        pool.disable()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the library desk agent as a service")
+    parser.add_argument("--host", default=os.environ.get("LIBRARY_SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("LIBRARY_SERVER_PORT", DEFAULT_PORT)))
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent agent turns")
+    parser.add_argument("--pool-size", type=int, default=pool.DEFAULT_SIZE, help="Reader connections")
+    parser.add_argument("--order-window-ms", type=float, default=order_intake.WINDOW_MS,
+                        help="Batch orders arriving within this window (0 disables)")
+    parser.add_argument("--maintenance-budget-ms", type=float, default=maintenance.BUDGET_MS,
+                        help="Time budget per maintenance run (0 disables maintenance)")
+    parser.add_argument("--report-refresh-s", type=float, default=snapshot.REFRESH_SECONDS,
+                        help="Refresh the report snapshot this often (0 runs reports on the live database)")
+    parser.add_argument("--db", default=None, help="Database path (default: db_functions.path)")
+    args = parser.parse_args()
+
+    if args.db:
+        db_functions.path = args.db
+    metrics.start_from_env()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.pool_size,
+                          order_window_ms=args.order_window_ms,
+                          maintenance_budget_ms=args.maintenance_budget_ms,
+                          report_refresh_s=args.report_refresh_s))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+# snapshot.py
+"""Consistent read-only copies of the database for reporting.
+
+A long report against the live database competes with desk writes. In
+rollback-journal mode its read lock blocks every commit; in WAL mode it
+pins the WAL so checkpoints cannot finish. take() copies the database
+with the SQLite backup API instead, STEP_PAGES pages at a time, and
+pauses between steps so writers get the lock in between. The copy lives
+either in memory (shared cache, so several connections can read it) or
+in a temporary file.
+
+If other connections keep writing while the copy runs, SQLite restarts
+the backup. After MAX_RESTARTS restarts the rest is copied in one step,
+so a busy database still gets a snapshot.
+
+Reads can be pointed at a snapshot for a block of code:
+
+    with snapshot.take(memory=True) as snap, snapshot.using(snap):
+        analytics.top_titles(365)            # reads the copy
+        db_functions.create_order(...)       # writes still go to the live DB
+
+Inside using(), db_functions.get_connection() hands out query_only
+connections to the copy. Writes (run_write / get_connection(write=True))
+are unaffected.
+
+Long-running processes start() a ReportSnapshots keeper, which takes a
+snapshot up front and replaces it every REFRESH_SECONDS. The report and
+analytics tools wrap their reads in reporting(), which points them at the
+keeper's latest snapshot, so report data is at most one interval old and
+never holds a lock on the live file. Without a keeper, reporting() reads
+the live database. The previous snapshot stays open for one more interval
+so reports that started on it can finish.
+
+    python snapshot.py --out report.db       # file snapshot of db_functions.path
+"""
+import argparse
+import contextvars
+import itertools
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import db_functions
+import profiler
+
+STEP_PAGES = 1024
+STEP_SLEEP = 0.005
+MAX_RESTARTS = 3
+REFRESH_SECONDS = 300.0
+
+_current: contextvars.ContextVar = contextvars.ContextVar("snapshot", default=None)
+_names = itertools.count(1)
+_active: Optional["ReportSnapshots"] = None
+
+
+class _Restarted(Exception):
+    pass
+
+
+class Snapshot:
+    def __init__(self, source: str, uri: str, keeper: sqlite3.Connection,
+                 file_path: Optional[str] = None, delete_file: bool = False):
+        self.source = source
+        self.uri = uri
+        self.file_path = file_path
+        self.delete_file = delete_file
+        self._keeper = keeper
+        self.taken_at = time.time()
+        self.pages = 0
+        self.steps = 0
+        self.restarts = 0
+        self.seconds = 0.0
+
+    @property
+    def in_memory(self) -> bool:
+        return self.file_path is None
+
+    def connect(self) -> sqlite3.Connection:
+        """A new read-only connection to the copy"""
+        if self._keeper is None:
+            raise RuntimeError("Snapshot is closed")
+        if profiler.ENABLED:
+            conn = profiler.connect(self.uri, uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def close(self):
+        if self._keeper is None:
+            return
+        self._keeper.close()
+        self._keeper = None
+        if self.delete_file and os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def describe(self) -> str:
+        where = "memory" if self.in_memory else self.file_path
+        return (f"Snapshot of {self.source} in {where}: {self.pages} pages in {self.steps} steps, "
+                f"{self.restarts} restarts, {self.seconds * 1000:.0f} ms")
+
+
+def take(memory: bool = True, dest: Optional[str] = None, pages: int = STEP_PAGES,
+         sleep: float = STEP_SLEEP, keep_file: bool = False) -> Snapshot:
+    """Copy db_functions.path into a new snapshot.
+
+    memory=True keeps the copy in RAM. Otherwise it is written to `dest`, or
+    to a temporary file that is deleted when the snapshot is closed.
+    """
+    source = db_functions.path
+    if memory:
+        uri = f"file:library-snapshot-{os.getpid()}-{next(_names)}?mode=memory&cache=shared"
+        keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    else:
+        if dest is None:
+            fd, dest = tempfile.mkstemp(prefix="library-snapshot-", suffix=".db")
+            os.close(fd)
+        elif os.path.exists(dest):
+            os.remove(dest)
+        keeper = sqlite3.connect(dest, check_same_thread=False)
+        uri = f"file:{os.path.abspath(dest)}?mode=ro"
+
+    snap = Snapshot(source, uri, keeper, None if memory else dest, delete_file=not memory and not keep_file)
+    state = {"remaining": None}
+
+    def progress(status, remaining, total):
+        # remaining jumps back up when another connection's write restarts the copy
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            snap.restarts += 1
+        state["remaining"] = remaining
+        snap.pages = total
+        snap.steps += 1
+        if snap.restarts >= MAX_RESTARTS:
+            raise _Restarted()
+
+    # Bring the rollups up to date first, so reports on the copy never need to write
+    import analytics
+    import recommendations
+    conn = db_functions.get_connection()
+    try:
+        analytics.catch_up(conn)
+        recommendations.catch_up(conn)
+    finally:
+        conn.close()
+
+    start = time.perf_counter()
+    src = sqlite3.connect(source)
+    try:
+        try:
+            src.backup(keeper, pages=pages, progress=progress, sleep=sleep)
+        except _Restarted:
+            src.backup(keeper, pages=-1)
+        # A read-only WAL file would need its -shm next to it
+        keeper.execute("PRAGMA journal_mode = DELETE")
+    except Exception:
+        keeper.close()
+        if not memory and os.path.exists(dest):
+            os.remove(dest)
+        raise
+    finally:
+        src.close()
+    snap.seconds = time.perf_counter() - start
+    return snap
+
+
+def current() -> Optional[Snapshot]:
+    """The snapshot reads are pointed at, if any"""
+    return _current.get()
+
+
+@contextmanager
+def using(snap: Optional[Snapshot]):
+    """Send db_functions reads in this block (and this context) to `snap`; None means the live database"""
+    token = _current.set(snap)
+    try:
+        yield snap
+    finally:
+        _current.reset(token)
+
+
+def live():
+    """Read the live database in this block, even inside using()"""
+    return using(None)
+
+
+class ReportSnapshots:
+    """Keeps a recent snapshot of one database for reports, refreshed in the background"""
+
+    def __init__(self, path: str, interval: float = REFRESH_SECONDS, memory: bool = False):
+        self.path = path
+        self.interval = interval
+        self.memory = memory
+        self.refreshes = 0
+        self.last_error: Optional[str] = None
+        self._snap: Optional[Snapshot] = None
+        self._previous: Optional[Snapshot] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="report-snapshots", daemon=True)
+
+    def start(self) -> "ReportSnapshots":
+        self.refresh()
+        self._thread.start()
+        return self
+
+    def current(self) -> Optional[Snapshot]:
+        return self._snap
+
+    def refresh(self):
+        """Take a new snapshot and retire the current one"""
+        try:
+            snap = take(memory=self.memory)
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Note: Could not refresh the report snapshot - {e}")
+            return
+        with self._lock:
+            expired, self._previous, self._snap = self._previous, self._snap, snap
+            self.refreshes += 1
+        if expired is not None:
+            expired.close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+    def stop(self, timeout: float = 30.0):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        with self._lock:
+            retired, self._snap, self._previous = (self._snap, self._previous), None, None
+        for snap in retired:
+            if snap is not None:
+                snap.close()
+
+    def snapshot(self) -> Dict:
+        snap = self._snap
+        return {"refreshes": self.refreshes, "interval_s": self.interval, "last_error": self.last_error,
+                "age_s": round(time.time() - snap.taken_at, 1) if snap else None,
+                "copy_ms": round(snap.seconds * 1000.0, 1) if snap else None}
+
+
+def start(path: Optional[str] = None, interval: float = REFRESH_SECONDS, memory: bool = False) -> ReportSnapshots:
+    """Keep a report snapshot of `path` (default db_functions.path), refreshed every `interval` seconds"""
+    global _active
+    stop()
+    _active = ReportSnapshots(path or db_functions.path, interval, memory).start()
+    return _active
+
+
+def stop():
+    global _active
+    if _active is not None:
+        _active.stop()
+        _active = None
+
+
+def active() -> Optional[ReportSnapshots]:
+    return _active
+
+
+@contextmanager
+def reporting():
+    """Run the reads in this block on the report snapshot, when one is kept for the current database"""
+    keeper = _active
+    snap = keeper.current() if keeper is not None and keeper.path == db_functions.path else None
+    if snap is None or current() is not None:
+        yield current()
+        return
+    with using(snap):
+        yield snap
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Take a consistent copy of the database")
+    parser.add_argument("--out", required=True, help="Where to write the copy")
+    parser.add_argument("--db", default=None, help="Database path (default: db_functions.path)")
+    parser.add_argument("--pages", type=int, default=STEP_PAGES, help="Pages copied per step")
+    args = parser.parse_args()
+
+    if args.db:
+        db_functions.path = args.db
+    snap = take(memory=False, dest=args.out, pages=args.pages, keep_file=True)
+    print(snap.describe())
+    snap.close()
+
+
+if __name__ == "__main__":
+    main()
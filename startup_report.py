@@ -0,0 +1,98 @@
+# startup_report.py
+"""Import-time report for the desk frontend.
+
+Runs `python -X importtime` in a fresh interpreter for each group of
+modules and ranks what they pulled in by cumulative import time. The
+first-paint group is everything frontend.py imports before the window is
+shown, including interpreter startup. It is checked against a budget. The
+agent stack is loaded in the background and only reported.
+
+    python startup_report.py                # report and check the budget
+    python startup_report.py --top 30 --budget-ms 400
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+FIRST_PAINT_BUDGET_MS = 500.0
+
+# Imported before the window appears (the top of frontend.py and its __main__ block)
+FIRST_PAINT_MODULES = ["customtkinter", "tracing", "metrics"]
+# Imported on the warm-up thread
+BACKGROUND_MODULES = ["agent"]
+
+
+def import_times(modules: List[str]) -> Dict:
+    """Import `modules` in one clean interpreter and parse the -X importtime log"""
+    # Keep going past a missing module so the rest of the group is still timed
+    code = "\n".join(
+        f"try:\n    import {m}\nexcept Exception as e:\n    print('{m}: ' + repr(e))" for m in modules
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True,
+        # The repo's own modules must import from wherever the report is run
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:   self [us] | cumulative [us] | <indent>name"
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        entries.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_ms": int(self_us) / 1000.0,
+            "cumulative_ms": int(cumulative_us) / 1000.0
+        })
+
+    top_level = [e for e in entries if e["depth"] == 0]
+    errors = proc.stdout.strip().splitlines()
+    return {
+        "modules": modules,
+        "ok": proc.returncode == 0 and not errors,
+        "errors": errors,
+        "total_ms": sum(e["cumulative_ms"] for e in top_level),
+        "entries": entries
+    }
+
+
+def print_report(result: Dict, top: int):
+    print(f"import {', '.join(result['modules'])}: {result['total_ms']:.1f} ms")
+    for error in result["errors"]:
+        print(f"    failed: {error}")
+    ranked = sorted(result["entries"], key=lambda e: e["cumulative_ms"], reverse=True)[:top]
+    for e in ranked:
+        print(f"    {e['cumulative_ms']:>9.1f} ms  {e['self_ms']:>8.1f} ms self  {e['module']}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Report frontend import times")
+    parser.add_argument("--top", type=int, default=15, help="Modules to list per import")
+    parser.add_argument("--budget-ms", type=float, default=FIRST_PAINT_BUDGET_MS,
+                        help="Import budget for everything loaded before first paint")
+    args = parser.parse_args(argv)
+
+    print("== First paint ==")
+    first_paint = import_times(FIRST_PAINT_MODULES)
+    print_report(first_paint, args.top)
+
+    print("\n== Background warm-up ==")
+    print_report(import_times(BACKGROUND_MODULES), args.top)
+
+    first_paint_ms = first_paint["total_ms"]
+    print(f"\nFirst-paint imports: {first_paint_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if not first_paint["ok"]:
+        print("Note: Some first-paint modules failed to import; the total is incomplete")
+        return 2
+    if first_paint_ms > args.budget_ms:
+        print("Over budget - move the slowest imports above off the first-paint path")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
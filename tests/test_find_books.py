@@ -0,0 +1,100 @@
+# tests/test_find_books.py
+"""Book search: keyset pages walk an index and cursors resume where they stopped."""
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_functions
+from tools import TOOL_REGISTRY
+
+SOURCE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "flibrary.db")
+
+
+@pytest.fixture
+def library(tmp_path):
+    saved = db_functions.path
+    db_functions.path = str(tmp_path / "library.db")
+    shutil.copy(SOURCE_DB, db_functions.path)
+    try:
+        yield db_functions.path
+    finally:
+        db_functions.path = saved
+
+
+@pytest.mark.parametrize("by", ["title", "author"])
+def test_migrated_database_pages_through_an_index(library, by):
+    conn = db_functions.get_connection()
+    try:
+        plan = [row[3] for row in conn.execute(
+            f"EXPLAIN QUERY PLAN SELECT isbn FROM books WHERE {by} LIKE ? AND ({by}, isbn) > (?, ?) "
+            f"ORDER BY {by}, isbn LIMIT ?", ("%a%", "a", "0", 11))]
+    finally:
+        conn.close()
+    assert any(f"idx_books_{by}" in step for step in plan)
+    assert not any("TEMP B-TREE" in step for step in plan)
+
+
+def _all_books(path, by="title"):
+    conn = sqlite3.connect(path)
+    try:
+        return [row[0] for row in conn.execute(f"SELECT isbn FROM books ORDER BY {by}, isbn")]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("by", ["title", "author"])
+def test_cursor_round_trip_visits_every_book_once(library, by):
+    expected = _all_books(library, by)
+    seen, offsets = [], []
+    page = db_functions.find_books_page("", by, page_size=3, with_total=True)
+    assert page["total"] == len(expected)
+    while True:
+        assert "error" not in page
+        offsets.append(page["offset"])
+        seen.extend(book["isbn"] for book in page["books"])
+        if not page["next_cursor"]:
+            break
+        page = db_functions.find_books_page(cursor=page["next_cursor"])
+        assert (page["by"], page["page_size"]) == (by, 3)
+
+    assert seen == expected
+    assert offsets == list(range(0, len(expected), 3))
+
+
+def test_last_page_has_no_cursor(library):
+    total = len(_all_books(library))
+    page = db_functions.find_books_page("", page_size=total)
+    assert len(page["books"]) == total
+    assert page["next_cursor"] is None
+
+    page = db_functions.find_books_page("no such title anywhere", page_size=5)
+    assert page["books"] == []
+    assert page["next_cursor"] is None
+
+
+@pytest.mark.parametrize("state", [
+    {"q": "", "by": "title", "n": "xx", "after": ["a", "1"]},
+    {"q": "", "by": "title", "n": 0, "after": ["a", "1"]},
+    {"q": "", "by": "title", "n": 5, "after": ["a", "1"], "offset": "ten"},
+    {"q": "", "by": "title", "n": 5, "after": ["a", "1"], "offset": -1},
+    {"q": "", "by": "title", "n": 5, "after": "a"},
+    {"q": "", "by": "title", "n": 5, "after": ["a", 1]},
+    {"q": 3, "by": "title", "n": 5, "after": ["a", "1"]},
+    {"q": "", "by": "title", "n": 5},
+])
+def test_bad_cursor_is_rejected(library, state):
+    token = db_functions.encode_cursor(state)
+    assert db_functions.find_books_page(cursor=token) == {"error": "Invalid or expired cursor"}
+
+    result = TOOL_REGISTRY.invoke("find_books_tool", {"cursor": token})
+    assert not result.ok
+    assert "Invalid or expired cursor" in result.error
+
+
+def test_garbage_cursor_is_rejected(library):
+    assert db_functions.find_books_page(cursor="%%%not-base64") == {"error": "Invalid or expired cursor"}
@@ -0,0 +1,53 @@
+# tests/test_inventory_analytics.py
+"""Inventory snapshots: writes through db_functions must not be served stale."""
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_functions
+import inventory_analytics
+
+SOURCE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "flibrary.db")
+
+
+@pytest.fixture
+def library(tmp_path):
+    saved = db_functions.path
+    db_functions.path = str(tmp_path / "library.db")
+    shutil.copy(SOURCE_DB, db_functions.path)
+    inventory_analytics.invalidate_snapshots()
+    try:
+        yield db_functions.path
+    finally:
+        inventory_analytics.invalidate_snapshots()
+        db_functions.path = saved
+
+
+def test_snapshot_follows_orders_restocks_and_price_changes(library):
+    conn = sqlite3.connect(library)
+    try:
+        isbn, stock = conn.execute("SELECT isbn, stock FROM books WHERE stock > 2 ORDER BY isbn LIMIT 1").fetchone()
+        customer_id = conn.execute("SELECT MIN(id) FROM customers").fetchone()[0]
+    finally:
+        conn.close()
+
+    # The order gives the title recent sales, so it enters the snapshot
+    assert "error" not in db_functions.create_order(customer_id, [{"isbn": isbn, "qty": 1}])
+    snapshot = inventory_analytics.get_snapshot()
+    assert snapshot.stock[snapshot.isbns.index(isbn)] == stock - 1
+
+    assert "error" not in db_functions.restock_book(isbn, 5)
+    snapshot = inventory_analytics.get_snapshot()
+    assert snapshot.stock[snapshot.isbns.index(isbn)] == stock + 4
+
+    assert "error" not in db_functions.update_price(isbn, 12.5)
+    snapshot = inventory_analytics.get_snapshot()
+    assert snapshot.price[snapshot.isbns.index(isbn)] == 12.5
+
+    # Without writes the cached snapshot is reused
+    assert inventory_analytics.get_snapshot() is snapshot
@@ -0,0 +1,61 @@
+# tests/test_order_intake.py
+"""Order intake: one invalid order must not fail the rest of its batch."""
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_functions
+import order_intake
+
+SOURCE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "flibrary.db")
+
+
+@pytest.fixture
+def intake(tmp_path):
+    saved = db_functions.path
+    db_functions.path = str(tmp_path / "library.db")
+    shutil.copy(SOURCE_DB, db_functions.path)
+    # A wide window so every order submitted below lands in one batch
+    active = order_intake.start(db_functions.path, window_ms=200.0)
+    try:
+        yield active
+    finally:
+        order_intake.stop()
+        db_functions.path = saved
+
+
+def _book(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT isbn, stock FROM books WHERE stock > 2 ORDER BY isbn LIMIT 1").fetchone()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("bad_items", [
+    lambda isbn: [{"isbn": isbn, "qty": 0}],
+    lambda isbn: [{"isbn": isbn, "qty": -3}],
+    lambda isbn: [{"isbn": isbn}],
+    lambda isbn: [{"qty": 1}],
+])
+def test_bad_order_does_not_fail_its_batch(intake, bad_items):
+    isbn, stock = _book(db_functions.path)
+    good = intake.submit(1, [{"isbn": isbn, "qty": 1}])
+    bad = intake.submit(1, bad_items(isbn))
+
+    good_result, bad_result = good.result(timeout=10), bad.result(timeout=10)
+
+    assert "error" in bad_result
+    assert "error" not in good_result
+    assert intake.stats["batches"] == 1
+    conn = sqlite3.connect(db_functions.path)
+    try:
+        assert conn.execute("SELECT stock FROM books WHERE isbn = ?", (isbn,)).fetchone()[0] == stock - 1
+        assert conn.execute("SELECT COUNT(*) FROM orders WHERE id = ?", (good_result["order_id"],)).fetchone()[0] == 1
+    finally:
+        conn.close()
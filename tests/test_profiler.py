@@ -0,0 +1,47 @@
+# tests/test_profiler.py
+"""SQL profiler: statements run through the connection shortcuts are recorded too."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import profiler
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "SLOW_LOG_PATH", str(tmp_path / "slow.jsonl"))
+    profiler.reset()
+    conn = profiler.connect(":memory:")
+    try:
+        yield conn
+    finally:
+        conn.close()
+        profiler.reset()
+
+
+def _stats(sql):
+    return next((row for row in profiler.report(100) if row["sql"] == sql), None)
+
+
+def test_connection_execute_is_profiled(conn):
+    conn.execute("CREATE TABLE t (n INTEGER)")
+    conn.executemany("INSERT INTO t (n) VALUES (?)", [(i,) for i in range(5)])
+    rows = conn.execute("SELECT n FROM t WHERE n >= ?", (2,)).fetchall()
+
+    assert len(rows) == 3
+    assert _stats("CREATE TABLE t (n INTEGER)")["calls"] == 1
+    assert _stats("INSERT INTO t (n) VALUES (?)")["rows"] == 5
+    select = _stats("SELECT n FROM t WHERE n >= ?")
+    assert select["calls"] == 1
+    assert select["rows"] == 3
+
+
+def test_slow_connection_execute_gets_a_plan(conn, monkeypatch):
+    monkeypatch.setattr(profiler, "SLOW_MS", 0.0)
+    conn.execute("CREATE TABLE t (n INTEGER)")
+    conn.execute("SELECT n FROM t").fetchall()
+
+    assert _stats("SELECT n FROM t")["full_scan"]
@@ -0,0 +1,143 @@
+# tests/test_registry.py
+"""Tool registry: schemas from signatures and docstrings, and the compiled argument validator."""
+import os
+import sys
+from typing import Optional
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from registry import ToolRegistry, ToolValidationError
+
+
+@pytest.fixture
+def registry():
+    registry = ToolRegistry()
+
+    @registry.tool
+    def lookup_tool(isbn: str, quantity: int = 1, price: Optional[float] = None, exact: bool = False):
+        """
+        Look a book up.
+
+        A longer note for people that the model does not need.
+
+        Args:
+            isbn: Book ISBN
+            quantity: Copies wanted
+                (default: 1)
+            price: Expected price
+            exact: Only exact matches
+
+        Returns:
+            The arguments it was called with
+        """
+        return {"isbn": isbn, "quantity": quantity, "price": price, "exact": exact}
+
+    return registry
+
+
+def test_optional_arguments_take_their_defaults(registry):
+    assert registry.invoke("lookup_tool", {"isbn": "9780132350884"}) == {
+        "isbn": "9780132350884", "quantity": 1, "price": None, "exact": False}
+
+
+def test_missing_required_argument(registry):
+    with pytest.raises(ToolValidationError, match="missing required argument isbn"):
+        registry.invoke("lookup_tool", {"quantity": 2})
+
+
+def test_unknown_arguments_are_rejected(registry):
+    with pytest.raises(ToolValidationError, match="unknown argument\\(s\\) colour, size"):
+        registry.invoke("lookup_tool", {"isbn": "1", "size": 3, "colour": "red"})
+
+
+def test_unknown_tool(registry):
+    with pytest.raises(ToolValidationError, match="Unknown tool 'nope'"):
+        registry.invoke("nope", {})
+
+
+def test_arguments_must_be_an_object(registry):
+    with pytest.raises(ToolValidationError, match="must be an object"):
+        registry.get("lookup_tool").invoke(["9780132350884"])
+
+
+def test_bare_string_fills_the_first_argument(registry):
+    assert registry.get("lookup_tool").invoke("9780132350884")["isbn"] == "9780132350884"
+
+
+@pytest.mark.parametrize("args, expected", [
+    ({"isbn": 9780132350884}, {"isbn": "9780132350884"}),
+    ({"isbn": "1", "quantity": "5"}, {"quantity": 5}),
+    ({"isbn": "1", "quantity": " -2 "}, {"quantity": -2}),
+    ({"isbn": "1", "quantity": 3.0}, {"quantity": 3}),
+    ({"isbn": "1", "price": "$12.50"}, {"price": 12.5}),
+    ({"isbn": "1", "price": 12}, {"price": 12.0}),
+    ({"isbn": "1", "price": None}, {"price": None}),
+    ({"isbn": "1", "exact": "yes"}, {"exact": True}),
+    ({"isbn": "1", "exact": 0}, {"exact": False}),
+])
+def test_common_slips_are_coerced(registry, args, expected):
+    result = registry.invoke("lookup_tool", args)
+    for name, value in expected.items():
+        assert result[name] == value
+        assert type(result[name]) is type(value)
+
+
+@pytest.mark.parametrize("args, message", [
+    ({"isbn": ["1"]}, "'isbn' must be a string"),
+    ({"isbn": True}, "'isbn' must be a string"),
+    ({"isbn": "1", "quantity": "five"}, "'quantity' must be an integer"),
+    ({"isbn": "1", "quantity": 2.5}, "'quantity' must be an integer"),
+    ({"isbn": "1", "quantity": None}, "'quantity' must be an integer"),
+    ({"isbn": "1", "price": "cheap"}, "'price' must be a number"),
+    ({"isbn": "1", "exact": "maybe"}, "'exact' must be true or false"),
+    ({"isbn": "1", "exact": 2}, "'exact' must be true or false"),
+])
+def test_coercion_failures(registry, args, message):
+    with pytest.raises(ToolValidationError, match=message):
+        registry.invoke("lookup_tool", args)
+
+
+def test_schema_from_signature_and_docstring(registry):
+    tool = registry.get("lookup_tool")
+    assert tool.summary == "Look a book up."
+    assert tool.schema == {
+        "type": "object",
+        "properties": {
+            "isbn": {"type": "string", "description": "Book ISBN"},
+            "quantity": {"type": "integer", "description": "Copies wanted (default: 1)", "default": 1},
+            "price": {"type": ["number", "null"], "description": "Expected price", "default": None},
+            "exact": {"type": "boolean", "description": "Only exact matches", "default": False},
+        },
+        "required": ["isbn"],
+        "additionalProperties": False,
+    }
+
+
+def test_duplicate_names_and_unsupported_types_are_refused(registry):
+    with pytest.raises(ValueError, match="already registered"):
+        @registry.tool(name="lookup_tool")
+        def other(isbn: str):
+            """Another lookup"""
+
+    with pytest.raises(TypeError, match="unsupported type"):
+        @registry.tool
+        def listing_tool(isbns: list):
+            """Look several books up"""
+
+
+def test_direct_calls_skip_validation(registry):
+    assert registry.get("lookup_tool")(isbn=5)["isbn"] == 5
+
+
+def test_as_langchain(registry):
+    pytest.importorskip("langchain_core")
+    wrapped = registry.as_langchain()[0]
+    assert wrapped.name == "lookup_tool"
+    assert "Look a book up." in wrapped.description
+    assert "A longer note" not in wrapped.description
+    assert "quantity: Copies wanted (default: 1)" in wrapped.description
+    assert set(wrapped.args) == {"isbn", "quantity", "price", "exact"}
+    assert wrapped.invoke({"isbn": "1", "quantity": 2})["quantity"] == 2
+    assert registry.get("lookup_tool").as_langchain() is wrapped
@@ -0,0 +1,119 @@
+# tests/test_snapshot.py
+"""Report snapshots: report reads run on a copy and never hold locks on the live database."""
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_functions
+import inventory_analytics
+import snapshot
+from tools import TOOL_REGISTRY
+
+SOURCE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "flibrary.db")
+
+
+@pytest.fixture
+def library(tmp_path):
+    saved = db_functions.path
+    db_functions.path = str(tmp_path / "library.db")
+    shutil.copy(SOURCE_DB, db_functions.path)
+    # Rollback-journal mode, where an open read blocks every commit
+    conn = sqlite3.connect(db_functions.path)
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+    inventory_analytics.invalidate_snapshots()
+    try:
+        yield db_functions.path
+    finally:
+        snapshot.stop()
+        inventory_analytics.invalidate_snapshots()
+        db_functions.path = saved
+
+
+def _order_args(path):
+    conn = sqlite3.connect(path)
+    try:
+        isbn = conn.execute("SELECT isbn FROM books WHERE stock > 2 ORDER BY isbn LIMIT 1").fetchone()[0]
+        customer_id = conn.execute("SELECT MIN(id) FROM customers").fetchone()[0]
+    finally:
+        conn.close()
+    return customer_id, [{"isbn": isbn, "qty": 1}]
+
+
+def test_open_live_read_blocks_commits(library):
+    # Why reports need a copy: a read transaction on the live file stops writers
+    reader = sqlite3.connect(library, isolation_level=None)
+    reader.execute("BEGIN")
+    reader.execute("SELECT COUNT(*) FROM books").fetchone()
+    try:
+        writer = sqlite3.connect(library, timeout=0.1)
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            writer.execute("UPDATE books SET stock = stock + 1")
+            writer.commit()
+        writer.close()
+    finally:
+        reader.execute("COMMIT")
+        reader.close()
+
+
+def test_report_read_does_not_block_create_order(library):
+    snapshot.start(library, interval=3600)
+    customer_id, items = _order_args(library)
+
+    with snapshot.reporting() as snap:
+        assert snap is snapshot.active().current()
+        conn = db_functions.get_connection()
+        conn.isolation_level = None
+        conn.execute("BEGIN")
+        conn.execute("SELECT COUNT(*) FROM books").fetchone()
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                start = time.perf_counter()
+                result = executor.submit(db_functions.create_order, customer_id, items).result(timeout=10)
+                elapsed = time.perf_counter() - start
+        finally:
+            conn.execute("COMMIT")
+            conn.close()
+
+    assert "error" not in result
+    assert elapsed < 1.0
+
+
+def test_report_tools_read_the_snapshot_until_refreshed(library):
+    keeper = snapshot.start(library, interval=3600)
+    customer_id, items = _order_args(library)
+
+    def sold():
+        result = TOOL_REGISTRY.invoke("top_titles_tool", {"days": 1, "limit": 10})
+        return sum(row["qty"] for row in result.data["titles"] if row["isbn"] == items[0]["isbn"])
+
+    before = sold()
+    assert "error" not in db_functions.create_order(customer_id, items)
+    assert sold() == before
+    keeper.refresh()
+    assert sold() == before + 1
+
+
+def test_restock_suggestions_use_live_stock(library):
+    keeper = snapshot.start(library, interval=3600)
+    customer_id, items = _order_args(library)
+    isbn = items[0]["isbn"]
+    assert "error" not in db_functions.create_order(customer_id, items)
+    keeper.refresh()
+
+    assert "error" not in db_functions.restock_book(isbn, 50)
+    with snapshot.reporting():
+        snap = inventory_analytics.get_snapshot()
+    conn = sqlite3.connect(library)
+    try:
+        stock = conn.execute("SELECT stock FROM books WHERE isbn = ?", (isbn,)).fetchone()[0]
+    finally:
+        conn.close()
+    assert snap.stock[snap.isbns.index(isbn)] == stock
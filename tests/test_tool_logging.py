@@ -0,0 +1,75 @@
+# tests/test_tool_logging.py
+"""Audit log: every action is written to tool_calls exactly once."""
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_functions
+import uow
+from tools import TOOL_REGISTRY
+
+SOURCE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "flibrary.db")
+
+
+@pytest.fixture
+def library(tmp_path):
+    saved = db_functions.path
+    db_functions.path = str(tmp_path / "library.db")
+    shutil.copy(SOURCE_DB, db_functions.path)
+    try:
+        yield db_functions.path
+    finally:
+        db_functions.path = saved
+
+
+def _logged(path, session_id):
+    conn = sqlite3.connect(path)
+    try:
+        return [name for (name,) in conn.execute(
+            "SELECT name FROM tool_calls WHERE session_id = ? ORDER BY id", (session_id,))]
+    finally:
+        conn.close()
+
+
+def _book(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT isbn, title FROM books WHERE stock > 2 ORDER BY isbn LIMIT 1").fetchone()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("in_turn", [True, False])
+def test_tools_log_each_action_once(library, in_turn):
+    isbn, title = _book(library)
+    calls = [
+        ("create_order_tool", {"book_title": title, "customer_input": "1", "quantity": 1}, "create_order"),
+        ("restock_book_tool", {"isbn": isbn, "quantity": 2}, "restock_book"),
+        ("update_price_tool", {"isbn": isbn, "new_price": 19.5}, "update_price"),
+    ]
+    session_id = f"log-{in_turn}"
+    db_functions.set_current_session(session_id)
+    for tool, args, _ in calls:
+        if in_turn:
+            with uow.unit_of_work(session_id):
+                result = TOOL_REGISTRY.invoke(tool, args)
+        else:
+            result = TOOL_REGISTRY.invoke(tool, args)
+        assert result.ok, result.error
+
+    assert _logged(library, session_id) == [name for *_, name in calls]
+
+
+def test_direct_db_calls_still_log(library):
+    isbn, _ = _book(library)
+    db_functions.set_current_session("direct")
+    assert "error" not in db_functions.create_order(1, [{"isbn": isbn, "qty": 1}])
+    assert "error" not in db_functions.restock_book(isbn, 2)
+    assert "error" not in db_functions.update_price(isbn, 21.0)
+
+    assert _logged(library, "direct") == ["create_order", "restock_book", "update_price"]
@@ -0,0 +1,43 @@
+# tests/test_uow.py
+"""Unit of work: tools reuse what the turn already read and add no lookups of their own."""
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_functions
+import uow
+from tools import TOOL_REGISTRY
+
+SOURCE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "flibrary.db")
+
+
+@pytest.fixture
+def library(tmp_path):
+    saved = db_functions.path
+    db_functions.path = str(tmp_path / "library.db")
+    shutil.copy(SOURCE_DB, db_functions.path)
+    try:
+        yield db_functions.path
+    finally:
+        db_functions.path = saved
+
+
+def test_restock_reports_price_without_a_book_lookup(library):
+    conn = sqlite3.connect(library)
+    try:
+        isbn, price, stock = conn.execute("SELECT isbn, price, stock FROM books ORDER BY isbn LIMIT 1").fetchone()
+    finally:
+        conn.close()
+
+    with uow.unit_of_work("restock") as work:
+        result = TOOL_REGISTRY.invoke("restock_book_tool", {"isbn": isbn, "quantity": 3})
+        assert (work.cache_hits, work.cache_misses) == (0, 0)
+
+    assert result.ok
+    assert result.data["price"] == price
+    assert (result.data["old_stock"], result.data["new_stock"]) == (stock, stock + 3)
@@ -0,0 +1,128 @@
+# tests/test_writer.py
+"""Writer actor: batched commits, per-command savepoints, futures and draining on stop."""
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_functions
+import writer as db_writer
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / "writer.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (n INTEGER PRIMARY KEY)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _insert(conn, n):
+    conn.execute("INSERT INTO t (n) VALUES (?)", (n,))
+    return n
+
+
+def _insert_then_fail(conn, n):
+    conn.execute("INSERT INTO t (n) VALUES (?)", (n,))
+    raise ValueError(f"command {n} failed")
+
+
+def _rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return [n for (n,) in conn.execute("SELECT n FROM t ORDER BY n")]
+    finally:
+        conn.close()
+
+
+def test_queued_commands_share_one_commit(path):
+    actor = db_writer.Writer(path)
+    # Queued before the thread starts, so the first batch picks up all of them
+    futures = [actor.submit(_insert, n) for n in range(5)]
+    actor.start()
+    try:
+        assert [f.result(timeout=10) for f in futures] == list(range(5))
+    finally:
+        actor.stop()
+
+    assert _rows(path) == list(range(5))
+    assert actor.stats["batches"] == 1
+    assert actor.stats["largest_batch"] == 5
+
+
+def test_batches_are_capped_at_max_batch(path):
+    actor = db_writer.Writer(path, max_batch=3)
+    futures = [actor.submit(_insert, n) for n in range(7)]
+    actor.start()
+    try:
+        for f in futures:
+            f.result(timeout=10)
+    finally:
+        actor.stop()
+
+    assert actor.stats["batches"] == 3
+    assert actor.stats["largest_batch"] == 3
+
+
+def test_failing_command_rolls_back_alone(path):
+    actor = db_writer.Writer(path)
+    ok_before = actor.submit(_insert, 1)
+    failing = actor.submit(_insert_then_fail, 2)
+    ok_after = actor.submit(_insert, 3)
+    actor.start()
+    try:
+        assert ok_before.result(timeout=10) == 1
+        with pytest.raises(ValueError, match="command 2 failed"):
+            failing.result(timeout=10)
+        assert ok_after.result(timeout=10) == 3
+    finally:
+        actor.stop()
+
+    # The failed command's own insert was undone by its savepoint
+    assert _rows(path) == [1, 3]
+    assert actor.stats["batches"] == 1
+    assert actor.stats["failed"] == 1
+
+
+def test_constraint_error_reaches_the_caller(path):
+    actor = db_writer.Writer(path).start()
+    try:
+        actor.submit(_insert, 1).result(timeout=10)
+        with pytest.raises(sqlite3.IntegrityError):
+            actor.submit(_insert, 1).result(timeout=10)
+    finally:
+        actor.stop()
+    assert _rows(path) == [1]
+
+
+def test_stop_drains_the_queue(path):
+    actor = db_writer.Writer(path, max_batch=4, linger_ms=50.0).start()
+    futures = [actor.submit(_insert, n) for n in range(10)]
+    actor.stop()
+
+    assert all(f.done() for f in futures)
+    assert [f.result() for f in futures] == list(range(10))
+    assert _rows(path) == list(range(10))
+    with pytest.raises(RuntimeError):
+        actor.submit(_insert, 99)
+
+
+def test_run_write_goes_through_the_active_writer(path):
+    saved = db_functions.path
+    db_functions.path = path
+    actor = db_writer.start(path)
+    try:
+        assert db_functions.run_write(_insert, 7) == 7
+        with pytest.raises(ValueError):
+            db_functions.run_write(_insert_then_fail, 8)
+    finally:
+        db_writer.stop()
+        db_functions.path = saved
+
+    assert actor.stats["commands"] == 2
+    assert _rows(path) == [7]
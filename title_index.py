@@ -0,0 +1,242 @@
+# title_index.py
+"""Typo-tolerant title lookup backed by a trigram index.
+
+Every title is split into lowercase words and each word, padded as
+"  word ", into trigrams ("clean" -> "  c", " cl", "cle", "lea", "ean",
+"an "). The index keeps one (gram, isbn) row per trigram, plus each
+gram's document frequency.
+
+resolve_title() runs one query. It looks up the spoken title's trigrams
+that are rare enough to be selective, counts how many of them each title
+shares, and keeps the best CANDIDATES titles (the shorter title wins a
+tie). The candidates are then ranked by trigram similarity (Jaccard) over
+the full title. A misspelling changes only a few trigrams, so "Clen Code"
+still ranks Clean Code first. Because common trigrams are never scanned,
+the cost depends on how selective the title is, not on the size of the
+catalogue.
+
+Triggers on books queue new, retitled and deleted books in
+title_index_pending. Lookups fold the queue in (through
+db_functions.run_write) before they query, the same way analytics catches
+up on its rollups.
+
+    python title_index.py --rebuild
+"""
+import argparse
+import re
+import sqlite3
+from typing import Dict, List, Set
+
+import db_functions
+import snapshot
+from metrics import timed
+
+# Grams in more than MAX_DF_SHARE of titles (and over MIN_DF_CAP) are skipped
+# as too common to narrow anything down, unless the title has nothing rarer
+MAX_DF_SHARE = 0.02
+MIN_DF_CAP = 1000
+MIN_GRAMS = 3
+CANDIDATES = 50
+SYNC_BATCH = 5000
+
+# Lowest similarity create_order_tool accepts without asking
+MIN_SCORE = 0.3
+
+TITLE_INDEX_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS title_index (
+        isbn TEXT PRIMARY KEY,
+        title TEXT NOT NULL,
+        grams INTEGER NOT NULL
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS title_trigrams (
+        gram TEXT NOT NULL,
+        isbn TEXT NOT NULL,
+        PRIMARY KEY (gram, isbn)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS title_trigram_df (
+        gram TEXT PRIMARY KEY,
+        df INTEGER NOT NULL
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS title_index_stats (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS title_index_pending (
+        isbn TEXT PRIMARY KEY
+    ) WITHOUT ROWID""",
+    """CREATE TRIGGER IF NOT EXISTS books_title_insert AFTER INSERT ON books
+    BEGIN
+        INSERT OR IGNORE INTO title_index_pending (isbn) VALUES (NEW.isbn);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS books_title_update AFTER UPDATE OF title ON books
+    BEGIN
+        INSERT OR IGNORE INTO title_index_pending (isbn) VALUES (NEW.isbn);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS books_title_delete AFTER DELETE ON books
+    BEGIN
+        INSERT OR IGNORE INTO title_index_pending (isbn) VALUES (OLD.isbn);
+    END""",
+]
+
+_WORD = re.compile(r"\w+")
+
+
+def trigrams(text: str) -> Set[str]:
+    grams = set()
+    for word in _WORD.findall(text.lower()):
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def similarity(query_grams: Set[str], title: str) -> float:
+    title_grams = trigrams(title)
+    if not query_grams or not title_grams:
+        return 0.0
+    shared = len(query_grams & title_grams)
+    return shared / (len(query_grams) + len(title_grams) - shared)
+
+
+def _index_tx(conn, isbns: List[str]) -> int:
+    """Re-index the given books from their current titles and clear them from the queue"""
+    marks = ",".join("?" * len(isbns))
+    current = dict(conn.execute(f"SELECT isbn, title FROM books WHERE isbn IN ({marks})", isbns).fetchall())
+    indexed = dict(conn.execute(f"SELECT isbn, title FROM title_index WHERE isbn IN ({marks})", isbns).fetchall())
+
+    removed, added, df_delta, counts = [], [], {}, {}
+    for isbn in isbns:
+        if isbn in indexed and indexed[isbn] == current.get(isbn):
+            # Queued, but the title did not change
+            continue
+        old = trigrams(indexed[isbn]) if isbn in indexed else set()
+        new = trigrams(current[isbn]) if isbn in current else set()
+        counts[isbn] = len(new)
+        for gram in old - new:
+            removed.append((gram, isbn))
+            df_delta[gram] = df_delta.get(gram, 0) - 1
+        for gram in new - old:
+            added.append((gram, isbn))
+            df_delta[gram] = df_delta.get(gram, 0) + 1
+
+    # Sorted in key order, so the B-tree is filled page by page instead of at random
+    conn.executemany("DELETE FROM title_trigrams WHERE gram = ? AND isbn = ?", sorted(removed))
+    conn.executemany("INSERT OR IGNORE INTO title_trigrams (gram, isbn) VALUES (?, ?)", sorted(added))
+    conn.executemany("""
+        INSERT INTO title_trigram_df (gram, df) VALUES (?, ?)
+        ON CONFLICT(gram) DO UPDATE SET df = df + excluded.df
+    """, [(gram, delta) for gram, delta in df_delta.items() if delta])
+    conn.executemany("DELETE FROM title_trigram_df WHERE gram = ? AND df <= 0",
+                     [(gram,) for gram, delta in df_delta.items() if delta < 0])
+
+    titles_delta = sum(1 for i in current if i not in indexed) - sum(1 for i in indexed if i not in current)
+    conn.execute("""
+        INSERT INTO title_index_stats (name, value) VALUES ('titles', ?)
+        ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+    """, (titles_delta,))
+    conn.executemany("DELETE FROM title_index WHERE isbn = ?", [(i,) for i in isbns if i not in current])
+    conn.executemany(
+        "INSERT OR REPLACE INTO title_index (isbn, title, grams) VALUES (?, ?, ?)",
+        [(isbn, current[isbn], n) for isbn, n in counts.items() if isbn in current]
+    )
+    conn.executemany("DELETE FROM title_index_pending WHERE isbn = ?", [(i,) for i in isbns])
+    return len(isbns)
+
+
+def sync() -> int:
+    """Index every queued book; returns how many were processed"""
+    if snapshot.current() is not None:
+        # Snapshots are read-only; their index is as fresh as the copy
+        return 0
+    done = 0
+    while True:
+        conn = db_functions.get_connection()
+        try:
+            batch = [row[0] for row in conn.execute(
+                "SELECT isbn FROM title_index_pending LIMIT ?", (SYNC_BATCH,)).fetchall()]
+        finally:
+            conn.close()
+        if not batch:
+            return done
+        done += db_functions.run_write(_index_tx, batch)
+
+
+def _rebuild_tx(conn):
+    for table in ("title_index", "title_trigrams", "title_trigram_df", "title_index_stats"):
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute("INSERT OR IGNORE INTO title_index_pending (isbn) SELECT isbn FROM books")
+
+
+def rebuild() -> int:
+    """Drop the index and build it again from books"""
+    db_functions.run_write(_rebuild_tx)
+    return sync()
+
+
+@timed("db")
+def resolve_title(title: str, limit: int = 5) -> List[Dict]:
+    """Books whose titles best match `title`, best first, each with a 0-1 "score" """
+    query_grams = trigrams(title)
+    if not query_grams:
+        return []
+    sync()
+
+    grams = sorted(query_grams)
+    conn = db_functions.get_connection()
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute(f"""
+            WITH q AS (
+                SELECT gram, df FROM title_trigram_df WHERE gram IN ({','.join('?' * len(grams))})
+            ),
+            cap AS (
+                SELECT MAX(?, ? * COALESCE((SELECT value FROM title_index_stats WHERE name = 'titles'), 0)) AS df
+            ),
+            rare AS (
+                SELECT gram, df FROM q WHERE df <= (SELECT df FROM cap)
+                UNION
+                SELECT gram, df FROM (SELECT gram, df FROM q ORDER BY df LIMIT ?)
+            ),
+            hits AS (
+                SELECT t.isbn, SUM(1.0 / rare.df) AS shared
+                FROM rare JOIN title_trigrams t ON t.gram = rare.gram
+                GROUP BY t.isbn
+            ),
+            best AS (
+                SELECT hits.isbn FROM hits JOIN title_index ti ON ti.isbn = hits.isbn
+                ORDER BY hits.shared DESC, ti.grams ASC
+                LIMIT ?
+            )
+            SELECT b.isbn, b.title, b.author, b.price, b.stock
+            FROM best JOIN books b ON b.isbn = best.isbn
+        """, grams + [MIN_DF_CAP, MAX_DF_SHARE, MIN_GRAMS, CANDIDATES]).fetchall()
+    finally:
+        conn.close()
+
+    ranked = []
+    for row in rows:
+        book = dict(row)
+        book["score"] = round(similarity(query_grams, book["title"]), 3)
+        ranked.append(book)
+    ranked.sort(key=lambda book: (-book["score"], len(book["title"]), book["isbn"]))
+    return ranked[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the title trigram index")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from books")
+    parser.add_argument("--query", help="Resolve a title and print the ranked candidates")
+    parser.add_argument("--db", default=None, help="Database path (default: db_functions.path)")
+    args = parser.parse_args()
+
+    if args.db:
+        db_functions.path = args.db
+    if args.rebuild:
+        print(f"Indexed {rebuild()} titles")
+    if args.query:
+        for book in resolve_title(args.query):
+            print(f"{book['score']:.3f}  {book['title']}  ({book['isbn']})")
+
+
+if __name__ == "__main__":
+    main()
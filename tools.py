@@ -1,16 +1,28 @@
-from langchain.tools import tool
+from registry import ToolRegistry
+from results import ToolResult
+import uow
+from metrics import timed
 from typing import Optional, Dict, Any
 from db_functions import (
-    find_books,
+    find_books_page,
     create_order,
     restock_book,
     update_price,
     order_status,
     inventory_summary,
     save_tool_call,
-    get_customer_id,
-    get_isbn_by_title
+    get_current_session,
+    get_customer_id
 )
+from analytics import top_titles, revenue_by_day, customer_lifetime_value
+from title_index import resolve_title, MIN_SCORE
+from topic_index import search_topics
+from recommendations import similar_books
+import inventory_analytics
+import snapshot
+
+TOOL_REGISTRY = ToolRegistry()
+tool = TOOL_REGISTRY.tool
 
 # Helper functions
 def get_customer_id(customer_input: str) -> Optional[int]:
@@ -24,9 +36,10 @@ def get_isbn_by_title(title: str) -> Optional[str]:
     return db_get_isbn_by_title(title)
 
 @tool
-def find_books_tool(q: str, by: str = "title") -> str:
+@timed("tool")
+def find_books_tool(q: str = "", by: str = "title", page_size: int = 10, cursor: str = "") -> ToolResult:
     """
-    Find books by title or author.
+    Find books by title or author, one page at a time.
     
     CROSS-FUNCTION RELATIONSHIPS:
     1. With create_order_tool: Check availability before creating orders
@@ -43,34 +56,58 @@ def find_books_tool(q: str, by: str = "title") -> str:
     Args:
         q: Search query
         by: Search by "title" or "author" (default: "title")
+        page_size: Number of books per page (default: 10, max: 50)
+        cursor: Cursor from a previous result to fetch the next page
     
     Returns:
-        Formatted string of matching books with current stock
+        Formatted string of one page of matching books with current stock
     """
-    result = find_books(q, by)
+    result = find_books_page(q, by, page_size=page_size, cursor=cursor or None,
+                             with_total=not cursor)
     
     if isinstance(result, dict) and "error" in result:
-        return f"❌ Error: {result['error']}"
+        return ToolResult.failure("find_books", f"❌ Error: {result['error']}")
+    
+    uow.current().remember_books(result['books'])
+    if result['books']:
+        save_tool_call(get_current_session(), "find_books",
+                      {"q": result['query'], "by": result['by'], "page_size": result['page_size'], "cursor": cursor},
+                      {"count": len(result['books']), "has_more": bool(result['next_cursor'])})
+    
+    return ToolResult("find_books", dict(result, cursor=cursor))
+
+@tool
+@timed("tool")
+def books_about_tool(topic: str, limit: int = 10) -> ToolResult:
+    """
+    Find books about a subject, even when the exact words are not in the title.
     
-    if not result:
-        return f"No books found for '{q}' (searching by {by})."
+    CROSS-FUNCTION RELATIONSHIPS:
+    1. With find_books_tool: Use find_books_tool for an exact title or author
+    2. With create_order_tool: Order one of the suggested books
+    3. With inventory_summary_tool: Check stock across a subject
     
-    # Format the results
-    books_list = []
-    for i, book in enumerate(result, 1):
-        stock_status = "🟢 Good" if book['stock'] > 5 else "🟡 Low" if book['stock'] > 0 else "🔴 Out"
-        books_list.append(
-            f"{i}. **{book['title']}** by {book['author']}\n"
-            f"   ISBN: {book['isbn']}, Price: ${book['price']:.2f}\n"
-            f"   Stock: {book['stock']} copies ({stock_status})"
-        )
+    Args:
+        topic: Subject to search for (e.g., "python", "machine learning")
+        limit: Number of books to show (default: 10, max: 50)
+    
+    Returns:
+        Books ranked by how closely they match the topic, with current stock
+    """
+    limit = max(1, min(limit, 50))
+    books = search_topics(topic, limit)
     
-    save_tool_call("default_session", "find_books", {"q": q, "by": by}, {"count": len(result)})
+    uow.current().remember_books([{k: v for k, v in book.items() if k != 'score'} for book in books])
+    if books:
+        save_tool_call(get_current_session(), "books_about",
+                      {"topic": topic, "limit": limit},
+                      {"count": len(books), "top": books[0]['isbn']})
     
-    return f"📚 Found {len(result)} book(s) for '{q}' (searching by {by}):\n\n" + "\n\n".join(books_list)
+    return ToolResult("books_about", {"topic": topic, "books": books})
 
 @tool
-def create_order_tool(book_title: str, customer_input: str, quantity: int = 1) -> str:
+@timed("tool")
+def create_order_tool(book_title: str, customer_input: str, quantity: int = 1) -> ToolResult:
     """
     Create a new order for a book.
     
@@ -95,67 +132,59 @@ def create_order_tool(book_title: str, customer_input: str, quantity: int = 1) -
     Returns:
         Confirmation message with order details and updated stock
     """
-    # First use find_books_tool to check availability
-    search_result = find_books(book_title, by="title")
-    if not search_result:
-        return f"❌ Book '{book_title}' not found in inventory."
-    
-    current_book = search_result[0]
+    work = uow.current()
+    
+    # Resolve the (possibly misspelled) title, then check stock
+    candidates = work.memo(("resolve_title", book_title), lambda: resolve_title(book_title))
+    if not candidates or candidates[0]['score'] < MIN_SCORE:
+        close = [book for book in candidates[:3] if book['score'] >= MIN_SCORE / 2]
+        suggestions = ", ".join(f"'{book['title']}'" for book in close)
+        hint = f" Did you mean {suggestions}?" if suggestions else ""
+        return ToolResult.failure("create_order", f"❌ Book '{book_title}' not found in inventory.{hint}")
+    
+    current_book = {k: v for k, v in candidates[0].items() if k != 'score'}
+    work.remember_books([current_book])
     current_stock = current_book['stock']
     
     if current_stock < quantity:
-        return f"❌ Insufficient stock for '{book_title}'. Available: {current_stock}, Requested: {quantity}"
+        return ToolResult.failure("create_order", f"❌ Insufficient stock for '{book_title}'. Available: {current_stock}, Requested: {quantity}")
     
     # Get customer ID
-    customer_id = get_customer_id(customer_input)
+    customer_id = work.memo(("customer_id", customer_input), lambda: get_customer_id(customer_input))
     if not customer_id:
-        return f"Customer '{customer_input}' not found. Please use customer ID 1-5."
+        return ToolResult.failure("create_order", f"Customer '{customer_input}' not found. Please use customer ID 1-5.")
     
-    # Get ISBN
-    isbn = get_isbn_by_title(book_title)
-    if not isbn:
-        return f"Could not find ISBN for book '{book_title}'."
+    # Order the book whose stock was just checked
+    isbn = current_book['isbn']
     
     # Create order
-    result = create_order(customer_id, [{"isbn": isbn, "qty": quantity}])
+    result = create_order(customer_id, [{"isbn": isbn, "qty": quantity}], log=False)
     
     if "error" in result:
-        return f"Error creating order: {result['error']}"
+        return ToolResult.failure("create_order", f"Error creating order: {result['error']}")
+    
+    for change in result.get('stock_changes', []):
+        work.book_changed(change['isbn'], stock=change['new_stock'])
     
     # Log tool call
-    save_tool_call("default_session", "create_order", 
+    save_tool_call(get_current_session(), "create_order", 
                   {"book_title": book_title, "customer_input": customer_input, "quantity": quantity},
                   {"order_id": result['order_id'], "total_amount": result['total_amount']})
     
-    response = f"✅ **Order #{result['order_id']} Created Successfully!**\n\n"
-    response += f"Order Details:\n"
-    response += f"  • Order ID: {result['order_id']}\n"
-    response += f"  • Customer: ID {customer_id}\n"
-    response += f"  • Book: {book_title}\n"
-    response += f"  • Quantity: {quantity}\n"
-    response += f"  • Total: ${result['total_amount']:.2f}\n"
-    response += f"  • Status: {result['status']}\n\n"
-    
-    # Show stock change
-    if "stock_changes" in result and result["stock_changes"]:
-        for change in result["stock_changes"]:
-            response += f"📊 Stock Update:\n"
-            response += f"  • Book: {change['title']}\n"
-            response += f"  • Old stock: {change['old_stock']} copies\n"
-            response += f"  • New stock: {change['new_stock']} copies\n"
-            response += f"  • Reduction: {change['old_stock'] - change['new_stock']} copies\n"
-    
-    # Suggest related actions
-    response += f"\nRelated Actions:\n"
-    response += f"  • Check order: `order_status_tool(order_id={result['order_id']})`\n"
-    response += f"  • View inventory: `inventory_summary_tool(threshold=5)`\n"
-    if result.get('stock_changes', [{}])[0].get('new_stock', 0) < 3:
-        response += f"  ⚠️ Low stock! Consider: `restock_book_tool(isbn='{isbn}', quantity=10)`\n"
-    
-    return response
+    return ToolResult("create_order", {
+        "order_id": result['order_id'],
+        "customer_id": customer_id,
+        "book_title": book_title,
+        "isbn": isbn,
+        "quantity": quantity,
+        "total_amount": result['total_amount'],
+        "status": result['status'],
+        "stock_changes": result.get('stock_changes', [])
+    })
 
 @tool
-def restock_book_tool(isbn: str, quantity: int) -> str:
+@timed("tool")
+def restock_book_tool(isbn: str, quantity: int) -> ToolResult:
     """
     Restock a book by adding more copies.
     
@@ -179,49 +208,33 @@ def restock_book_tool(isbn: str, quantity: int) -> str:
     Returns:
         Confirmation message with updated stock
     """
-    # Check current stock using find_books
-    all_books = find_books("", by="title")
-    current_book = None
-    for book in all_books:
-        if book['isbn'] == isbn:
-            current_book = book
-            break
-    
-    if not current_book:
-        return f"❌ Book with ISBN {isbn} not found."
+    work = uow.current()
     
-    old_stock = current_book['stock']
-    
-    # Restock the book
-    result = restock_book(isbn, quantity)
+    # restock_book reports title, price and old stock itself, so no lookup is needed
+    result = restock_book(isbn, quantity, log=False)
     
     if "error" in result:
-        return f"Error: {result['error']}"
+        return ToolResult.failure("restock_book", f"❌ Error: {result['error']}")
+    
+    work.book_changed(isbn, stock=result['new_stock'])
     
     # Log tool call
-    save_tool_call("default_session", "restock_book", 
+    save_tool_call(get_current_session(), "restock_book", 
                   {"isbn": isbn, "quantity": quantity},
-                  {"title": result['title'], "old_stock": old_stock, "new_stock": result['new_stock']})
-    
-    response = f"**Successfully Restocked!**\n\n"
-    response += f"Restock Details:\n"
-    response += f"  • Book: {result['title']}\n"
-    response += f"  • ISBN: {isbn}\n"
-    response += f"  • Added: {quantity} copies\n"
-    response += f"  • Old stock: {old_stock} copies\n"
-    response += f"  • New stock: {result['new_stock']} copies\n"
-    response += f"  • Increase: {quantity} copies (+{quantity/old_stock*100:.1f}%)\n\n"
-    
-    # Check inventory impact
-    inventory = inventory_summary(5)
-    low_stock_count = inventory.get('low_stock_count', 0)
-    
-    response += f"📊 Inventory Impact:\n"
-    response += f"  • Total inventory value: ${inventory.get('total_inventory_value', 0):.2f}\n"
-    response += f"  • Low stock items: {low_stock_count}\n"
-    return response
+                  {"title": result['title'], "old_stock": result['old_stock'], "new_stock": result['new_stock']})
+    
+    return ToolResult("restock_book", {
+        "isbn": isbn,
+        "title": result['title'],
+        "quantity": quantity,
+        "old_stock": result['old_stock'],
+        "new_stock": result['new_stock'],
+        "price": result['price']
+    })
+
 @tool
-def update_price_tool(isbn: str, new_price: float) -> str:
+@timed("tool")
+def update_price_tool(isbn: str, new_price: float) -> ToolResult:
     """
     Update the price of a book.
     
@@ -245,63 +258,42 @@ def update_price_tool(isbn: str, new_price: float) -> str:
     Returns:
         Confirmation message with price change
     """
-    # Find current book details
-    all_books = find_books("", by="title")
-    current_book = None
-    for book in all_books:
-        if book['isbn'] == isbn:
-            current_book = book
-            break
+    work = uow.current()
     
+    # Find current book details (cached if already read this turn)
+    current_book = work.book(isbn)
     if not current_book:
-        return f"Book with ISBN {isbn} not found."
+        return ToolResult.failure("update_price", f"Book with ISBN {isbn} not found.")
     
     old_price = current_book['price']
+    stock = current_book['stock']
+    author = current_book['author']
     
     # Update price
-    result = update_price(isbn, new_price)
+    result = update_price(isbn, new_price, log=False)
     
     if "error" in result:
-        return f"❌ Error: {result['error']}"
+        return ToolResult.failure("update_price", f"❌ Error: {result['error']}")
     
-    # Calculate changes
-    price_change = new_price - old_price
-    percent_change = (price_change / old_price * 100) if old_price > 0 else 0
-    inventory_value_change = price_change * current_book['stock']
+    work.book_changed(isbn, price=new_price)
     
     # Log tool call
-    save_tool_call("default_session", "update_price", 
+    save_tool_call(get_current_session(), "update_price", 
                   {"isbn": isbn, "new_price": new_price},
                   {"title": result['title'], "old_price": old_price, "new_price": new_price})
     
-    response = f"**Price Updated Successfully!**\n\n"
-    response += f"Price Change Details:\n"
-    response += f"  • Book: {result['title']}\n"
-    response += f"  • ISBN: {isbn}\n"
-    response += f"  • Old price: ${old_price:.2f}\n"
-    response += f"  • New price: ${new_price:.2f}\n"
-    response += f"  • Change: ${price_change:+.2f} ({percent_change:+.1f}%)\n"
-    response += f"  • Current stock: {current_book['stock']} copies\n"
-    response += f"  • Inventory value change: ${inventory_value_change:+.2f}\n\n"
-    
-    # Check inventory summary
-    inventory = inventory_summary(5)
-    
-    response += f"📊 Inventory Impact:\n"
-    response += f"  • New total inventory value: ${inventory.get('total_inventory_value', 0):.2f}\n"
-    response += f"  • Book's new total value: ${new_price * current_book['stock']:.2f}\n\n"
-    
-    # Suggest related actions
-    response += f"Related Actions:\n"
-    if price_change > 0:
-        response += f"  • Consider restock discount: `restock_book_tool(isbn='{isbn}', quantity=10)`\n"
-    response += f"  • Create order with new price: `create_order_tool(book_title='{result['title']}', customer_input='1', quantity=1)`\n"
-    response += f"  • Check similar books: `find_books_tool(q='{current_book['author']}', by='author')`\n"
-    
-    return response
+    return ToolResult("update_price", {
+        "isbn": isbn,
+        "title": result['title'],
+        "author": author,
+        "old_price": old_price,
+        "new_price": new_price,
+        "stock": stock
+    })
 
 @tool
-def order_status_tool(order_id: int) -> str:
+@timed("tool")
+def order_status_tool(order_id: int) -> ToolResult:
     """
     Check the status of an order.
     
@@ -327,53 +319,16 @@ def order_status_tool(order_id: int) -> str:
     result = order_status(order_id)
     
     if "error" in result:
-        return f"Error: {result['error']}"
-    
-    # Get current stock for each book
-    stock_info = ""
-    inventory_suggestions = ""
-    if 'items' in result:
-        for item in result['items']:
-            book_search = find_books(item['title'], by="title")
-            if book_search:
-                current_stock = book_search[0]['stock']
-                stock_info += f"    • '{item['title']}': {current_stock} copies\n"
-                if current_stock < 3:
-                    inventory_suggestions += f"    ⚠️ '{item['title']}' is low! Restock: `restock_book_tool(isbn='{book_search[0]['isbn']}', quantity=10)`\n"
-    
-    # Build response
-    response = f"**Order #{order_id} Status**\n\n"
-    response += f"Order Summary:\n"
-    response += f"  • Status: {result['status']}\n"
-    response += f"  • Customer: {result.get('customer_name', 'Unknown')}\n"
-    response += f"  • Date: {result['created_at']}\n"
-    response += f"  • Total Amount: ${result['total_amount']:.2f}\n"
-    response += f"  • Items: {len(result.get('items', []))}\n\n"
-    
-    if 'items' in result:
-        response += f"🛒 Order Items:\n"
-        for i, item in enumerate(result['items'], 1):
-            qty = item.get('qty', 1)
-            subtotal = item['price'] * qty
-            response += f"  {i}. {item['title']} by {item['author']}\n"
-            response += f"     Qty: {qty}, Price: ${item['price']:.2f}, Subtotal: ${subtotal:.2f}\n"
-    
-    if stock_info:
-        response += f"\nCurrent Stock Levels:\n{stock_info}"
-    
-    if inventory_suggestions:
-        response += f"\nInventory Suggestions:\n{inventory_suggestions}"
-    
-    # Suggest related actions
-    response += f"\nRelated Actions:\n"
-    response += f"  • Create similar order: `create_order_tool(book_title='{result['items'][0]['title'] if result.get('items') else 'Clean Code'}', customer_input='{result.get('customer_id', 1)}', quantity=1)`\n"
-    response += f"  • Check inventory: `inventory_summary_tool(threshold=5)`\n"
-    response += f"  • Find similar books: `find_books_tool(q='{result['items'][0]['author'] if result.get('items') else 'Robert Martin'}', by='author')`\n"
-    
-    return response
+        return ToolResult.failure("order_status", f"Error: {result['error']}")
+    
+    # Items already carry current stock from the books join
+    uow.current().remember_books(result['items'])
+    
+    return ToolResult("order_status", result)
 
 @tool
-def inventory_summary_tool(threshold: int = 5) -> str:
+@timed("tool")
+def inventory_summary_tool(threshold: int = 5, mode: str = "summary", limit: int = 10) -> ToolResult:
     """
     Get a summary of inventory status.
     
@@ -392,59 +347,150 @@ def inventory_summary_tool(threshold: int = 5) -> str:
     
     Args:
         threshold: Stock level threshold for low stock alert (default: 5)
+        mode: "summary" for the stock overview, or "restock" for ranked
+              restock suggestions based on recent sales velocity
+        limit: Number of restock suggestions to show in "restock" mode (default: 10)
     
     Returns:
         Formatted inventory summary
     """
-    result = inventory_summary(threshold)
+    work = uow.current()
+    
+    if mode == "restock":
+        # Sales history is read from the report snapshot; stock and prices stay live
+        with snapshot.reporting():
+            result = work.memo(("restock_suggestions", limit),
+                               lambda: inventory_analytics.restock_suggestions(limit=limit))
+        if "error" in result:
+            return ToolResult.failure("restock_suggestions", f"❌ Error: {result['error']}")
+        return ToolResult("restock_suggestions", result)
+    
+    result = work.memo(("inventory_summary", threshold), lambda: inventory_summary(threshold))
     
     if isinstance(result, dict) and "error" in result:
-        return f"❌ Error: {result['error']}"
-    
-    low_stock_details = ""
-    restock_suggestions = ""
-    if result['low_stock_books']:
-        for i, book in enumerate(result['low_stock_books'][:3], 1):  # Top 3 only
-            low_stock_details += f"  {i}. **{book['title']}** by {book['author']}\n"
-            low_stock_details += f"     ISBN: {book['isbn']}, Stock: {book['stock']}, Price: ${book['price']:.2f}\n"
-            restock_suggestions += f"  • Restock '{book['title']}': `restock_book_tool(isbn='{book['isbn']}', quantity=10)`\n"
-    
-    response = f"**Inventory Summary**\n\n"
-    response += f"Overview:\n"
-    response += f"  • Total books: {result['total_books']}\n"
-    response += f"  • Total inventory value: ${result['total_inventory_value']:.2f}\n"
-    response += f"  • Out of stock: {result['out_of_stock_count']} books\n"
-    response += f"  • Low stock (≤{threshold}): {result['low_stock_count']} books\n\n"
-    
-    if low_stock_details:
-        response += f"📉 Top Low-Stock Books:\n{low_stock_details}\n"
-    
-    # Health assessment
-    response += f"Inventory Health:\n"
-    if result['out_of_stock_count'] > 0:
-        response += f" {result['out_of_stock_count']} book(s) are OUT OF STOCK - Urgent action needed!\n"
-    if result['low_stock_count'] > 0:
-        response += f"{result['low_stock_count']} book(s) are running low - Consider restocking\n"
-    if result['out_of_stock_count'] == 0 and result['low_stock_count'] == 0:
-        response += f"  ✅ All books are sufficiently stocked\n"
-    
-    if restock_suggestions:
-        response += f"\nRestock Suggestions:\n{restock_suggestions}"
-    
-    # Suggest related actions
-    response += f"\nRelated Actions:\n"
-    response += f"  • Check specific book: `find_books_tool(q='Clean Code', by='title')`\n"
-    response += f"  • Create order: `create_order_tool(book_title='The Pragmatic Programmer', customer_input='1', quantity=1)`\n"
-    response += f"  • Update prices: `update_price_tool(isbn='9780132350884', new_price=45.00)`\n"
-    
-    return response
+        return ToolResult.failure("inventory_summary", f"❌ Error: {result['error']}")
+    
+    work.remember_books(result['low_stock_books'])
+    
+    return ToolResult("inventory_summary", result)
+
+@tool
+@timed("tool")
+def similar_books_tool(isbn: str, limit: int = 5) -> ToolResult:
+    """
+    Suggest books that customers often buy together with a given book.
+    
+    CROSS-FUNCTION RELATIONSHIPS:
+    1. With order_status_tool: Upsell books that go with an order's items
+    2. With create_order_tool: Add a suggested book to the customer's order
+    3. With find_books_tool: Find the ISBN of a book first
+    
+    Args:
+        isbn: Book ISBN (e.g., "9780132350884")
+        limit: Number of suggestions (default: 5, max: 10)
+    
+    Returns:
+        Books most often ordered together with this one, with current stock
+    """
+    result = similar_books(isbn, limit)
+    
+    if "error" in result:
+        return ToolResult.failure("similar_books", f"❌ Error: {result['error']}")
+    
+    uow.current().remember_books([result['book']] + [
+        {k: v for k, v in book.items() if k != 'together'} for book in result['similar']])
+    
+    return ToolResult("similar_books", result)
+
+@tool
+@timed("tool")
+def top_titles_tool(days: int = 30, limit: int = 5) -> ToolResult:
+    """
+    Show the best-selling titles over recent days.
+    
+    CROSS-FUNCTION RELATIONSHIPS:
+    1. With restock_book_tool: Restock titles that sell fastest
+    2. With update_price_tool: Review prices of top sellers
+    3. With inventory_summary_tool: Compare sales with stock levels
+    
+    Args:
+        days: Number of days to look back, including today (default: 30)
+        limit: Number of titles to show (default: 5)
+    
+    Returns:
+        Ranked list of titles with copies sold and revenue
+    """
+    with snapshot.reporting():
+        result = top_titles(days, limit)
+    
+    if "error" in result:
+        return ToolResult.failure("top_titles", f"❌ Error: {result['error']}")
+    
+    return ToolResult("top_titles", result)
+
+@tool
+@timed("tool")
+def revenue_by_day_tool(days: int = 7) -> ToolResult:
+    """
+    Show orders and revenue per day.
+    
+    CROSS-FUNCTION RELATIONSHIPS:
+    1. With top_titles_tool: See which titles drove the revenue
+    2. With order_status_tool: Inspect individual orders
+    
+    Args:
+        days: Number of days to look back, including today (default: 7)
+    
+    Returns:
+        Daily breakdown of orders, copies sold and revenue
+    """
+    with snapshot.reporting():
+        result = revenue_by_day(days)
+    
+    if "error" in result:
+        return ToolResult.failure("revenue_by_day", f"❌ Error: {result['error']}")
+    
+    return ToolResult("revenue_by_day", result)
+
+@tool
+@timed("tool")
+def customer_value_tool(customer_input: str) -> ToolResult:
+    """
+    Show a customer's lifetime value.
+    
+    CROSS-FUNCTION RELATIONSHIPS:
+    1. With create_order_tool: Check a customer before placing an order
+    2. With order_status_tool: Inspect the customer's orders
+    
+    Args:
+        customer_input: Customer ID or name (e.g., "1", "customer 1", "John Doe")
+    
+    Returns:
+        Lifetime orders, copies bought, revenue and average order value
+    """
+    customer_id = uow.current().memo(("customer_id", customer_input), lambda: get_customer_id(customer_input))
+    if not customer_id:
+        return ToolResult.failure("customer_value", f"Customer '{customer_input}' not found.")
+    
+    with snapshot.reporting():
+        result = customer_lifetime_value(customer_id)
+    
+    if "error" in result:
+        return ToolResult.failure("customer_value", f"❌ Error: {result['error']}")
+    
+    return ToolResult("customer_value", result)
 
 # List of all tools
 TOOLS = [
     find_books_tool,
+    books_about_tool,
     create_order_tool,
     restock_book_tool,
     update_price_tool,
     order_status_tool,
-    inventory_summary_tool
+    inventory_summary_tool,
+    similar_books_tool,
+    top_titles_tool,
+    revenue_by_day_tool,
+    customer_value_tool
 ]
\ No newline at end of file
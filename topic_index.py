@@ -0,0 +1,529 @@
+# topic_index.py
+"""Offline "books about X" search over hashed TF-IDF vectors.
+
+Each book's title (and, more weakly, its author) is turned into features:
+the words, plus the trigrams of each word so that "programmer" still
+shares most of its features with "programming". Every feature is hashed
+with crc32 into one of DIM signed buckets. No vocabulary or model is
+needed, and new books never change the vector space. The normalized
+vectors are stored as int8 (components times 127; no component of a unit
+vector exceeds 1) in a file that is memory-mapped for queries.
+
+IDF is applied on the query side. topic_df keeps each feature's document
+frequency, so a query for "python programming" leans on "python", and
+features no book has are left out. Stored vectors never go stale when
+frequencies move.
+
+Brute force over a million rows is too slow for a chat turn, so the rows
+are split into lists around k-means centroids (an IVF index). A query
+scores the centroids and then the rows of the closest lists, nearest
+first, until PROBE_ROWS rows (or NPROBE lists) are covered: a few
+thousand dot products. The lists are retrained whenever the index
+has grown RETRAIN_GROWTH-fold since the last training.
+
+Hashing into DIM buckets blurs scores a little, so the best RERANK rows
+are scored again exactly, feature by feature, before they are ranked. The
+vectors only have to get the right books into that shortlist.
+
+Books are kept current the same way as title_index.py. Triggers queue
+new, edited and deleted books in topic_index_pending, and each search
+folds the queue in first. Vector rows are written to disk before their
+topic_vectors rows commit, so a crash leaves at most unreferenced rows
+behind, and those are overwritten by the next sync. One process should
+own the index files at a time; the desk service does.
+
+    db/library-topics/vectors.i8    int8 (rows, DIM)
+    db/library-topics/lists.i32     int32 list per row, -1 once replaced
+    db/library-topics/centroids.npy float32 (lists, DIM)
+
+    python topic_index.py --rebuild
+    python topic_index.py --query "machine learning"
+"""
+import argparse
+import math
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import db_functions
+import snapshot
+from metrics import timed
+
+DIM = 256
+WORD_WEIGHT = 1.0
+GRAM_WEIGHT = 0.25
+AUTHOR_WEIGHT = 0.5
+
+NPROBE = 16
+PROBE_ROWS = 8000
+RERANK = 64
+ROWS_PER_LIST = 1000
+MAX_LISTS = 1024
+RETRAIN_MIN = 1000
+RETRAIN_GROWTH = 4
+TRAIN_SAMPLE = 50000
+TRAIN_ITERATIONS = 8
+ASSIGN_CHUNK = 65536
+SYNC_BATCH = 5000
+
+# Scores below this share too little with the topic to be worth showing
+MIN_SCORE = 0.15
+
+VECTORS_FILE = "vectors.i8"
+LISTS_FILE = "lists.i32"
+CENTROIDS_FILE = "centroids.npy"
+
+STOPWORDS = frozenset(
+    "a an and are as at be books book by for from how in into is it of on or "
+    "the to vol with about".split()
+)
+
+TOPIC_INDEX_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS topic_vectors (
+        row INTEGER PRIMARY KEY,
+        isbn TEXT NOT NULL UNIQUE,
+        title TEXT NOT NULL,
+        author TEXT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS topic_df (
+        feature INTEGER PRIMARY KEY,
+        df INTEGER NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS topic_index_stats (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS topic_index_pending (
+        isbn TEXT PRIMARY KEY
+    ) WITHOUT ROWID""",
+    """CREATE TRIGGER IF NOT EXISTS books_topic_insert AFTER INSERT ON books
+    BEGIN
+        INSERT OR IGNORE INTO topic_index_pending (isbn) VALUES (NEW.isbn);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS books_topic_update AFTER UPDATE OF title, author ON books
+    BEGIN
+        INSERT OR IGNORE INTO topic_index_pending (isbn) VALUES (NEW.isbn);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS books_topic_delete AFTER DELETE ON books
+    BEGIN
+        INSERT OR IGNORE INTO topic_index_pending (isbn) VALUES (OLD.isbn);
+    END""",
+]
+
+_WORD = re.compile(r"\w+")
+
+_lock = threading.RLock()
+_loaded: Dict[str, "_Index"] = {}
+
+
+def index_dir() -> str:
+    stem = os.path.splitext(os.path.basename(db_functions.path))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(db_functions.path)), f"{stem}-topics")
+
+
+def _words(text: str) -> List[str]:
+    return [w for w in _WORD.findall(text.lower()) if w not in STOPWORDS and not w.isdigit()]
+
+
+@lru_cache(maxsize=65536)
+def _word_hashes(word: str) -> Tuple[int, Tuple[int, ...]]:
+    """Hashes of a word and of its trigrams; catalogues reuse the same words a lot"""
+    padded = f" {word} "
+    grams = tuple(zlib.crc32(b"g:" + padded[i:i + 3].encode("utf-8")) for i in range(len(padded) - 2))
+    return zlib.crc32(b"w:" + word.encode("utf-8")), grams
+
+
+def features(title: str, author: str = "") -> Dict[int, float]:
+    """Hashed feature -> weight for one text"""
+    weights: Dict[int, float] = {}
+    for word in _words(title):
+        h, grams = _word_hashes(word)
+        weights[h] = weights.get(h, 0.0) + WORD_WEIGHT
+        for h in grams:
+            weights[h] = weights.get(h, 0.0) + GRAM_WEIGHT
+    for word in _words(author):
+        h = _word_hashes(word)[0]
+        weights[h] = weights.get(h, 0.0) + AUTHOR_WEIGHT
+    return weights
+
+
+def embed(weights: List[Dict[int, float]]) -> np.ndarray:
+    """Fold hashed features into unit-length DIM vectors, one row per text"""
+    rows, cols, values = [], [], []
+    for i, row in enumerate(weights):
+        for h, w in row.items():
+            rows.append(i)
+            cols.append(h % DIM)
+            # The top bit picks the sign, so colliding features tend to cancel out
+            values.append(-w if h & 0x80000000 else w)
+    out = np.zeros((len(weights), DIM), dtype=np.float32)
+    np.add.at(out, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)),
+              np.asarray(values, dtype=np.float32))
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return out / norms
+
+
+def quantize(vectors: np.ndarray) -> np.ndarray:
+    return np.round(vectors * 127.0).astype(np.int8)
+
+
+def cosine(query: Dict[int, float], weights: Dict[int, float], query_norm: Optional[float] = None) -> float:
+    """Exact cosine similarity of two feature -> weight maps"""
+    dot = sum(w * weights[h] for h, w in query.items() if h in weights)
+    if not dot:
+        return 0.0
+    if query_norm is None:
+        query_norm = math.sqrt(sum(w * w for w in query.values()))
+    return dot / (query_norm * math.sqrt(sum(w * w for w in weights.values())))
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid for every row"""
+    out = np.zeros(len(vectors), dtype=np.int32)
+    if len(centroids) <= 1:
+        return out
+    for start in range(0, len(vectors), ASSIGN_CHUNK):
+        chunk = np.asarray(vectors[start:start + ASSIGN_CHUNK], dtype=np.float32)
+        out[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return out
+
+
+def kmeans(sample: np.ndarray, k: int, iterations: int = TRAIN_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Spherical k-means: unit-length centroids that maximize cosine similarity"""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(iterations):
+        assigned = assign(sample, centroids)
+        order = np.argsort(assigned, kind="stable")
+        ids, starts = np.unique(assigned[order], return_index=True)
+        centroids[ids] = np.add.reduceat(sample[order], starts, axis=0)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids /= norms
+    return centroids
+
+
+class _Index:
+    """Memory-mapped read side of one index directory"""
+
+    def __init__(self, directory: str, version: int):
+        self.directory = directory
+        self.version = version
+        self.rows = 0
+        self.vectors = np.zeros((0, DIM), dtype=np.int8)
+        self.lists = np.zeros(0, dtype=np.int32)
+        path = os.path.join(directory, CENTROIDS_FILE)
+        self.centroids = np.load(path) if os.path.exists(path) else np.zeros((1, DIM), dtype=np.float32)
+        self.members = [np.zeros(0, dtype=np.int64) for _ in range(len(self.centroids))]
+
+    def extend(self, rows: int):
+        """Map rows up to `rows` (or what is on disk) and add the new ones to their lists"""
+        try:
+            on_disk = os.path.getsize(os.path.join(self.directory, VECTORS_FILE)) // DIM
+        except OSError:
+            on_disk = 0
+        rows = min(rows, on_disk)
+        if rows <= self.rows:
+            return
+        self.vectors = np.memmap(os.path.join(self.directory, VECTORS_FILE), dtype=np.int8,
+                                 mode="r", shape=(rows, DIM))
+        self.lists = np.memmap(os.path.join(self.directory, LISTS_FILE), dtype=np.int32,
+                               mode="r", shape=(rows,))
+        new = np.arange(self.rows, rows)
+        assigned = np.asarray(self.lists[self.rows:rows])
+        order = np.argsort(assigned, kind="stable")
+        ids, starts = np.unique(assigned[order], return_index=True)
+        for list_id, group in zip(ids, np.split(new[order], starts[1:])):
+            if 0 <= list_id < len(self.members):
+                self.members[list_id] = np.concatenate([self.members[list_id], group])
+        self.rows = rows
+
+    def search(self, query: np.ndarray, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Best `limit` rows and their scores from the lists closest to `query`"""
+        picked, covered = [], 0
+        for i in np.argsort(-(self.centroids @ query))[:NPROBE]:
+            picked.append(self.members[i])
+            covered += len(self.members[i])
+            if covered >= PROBE_ROWS:
+                break
+        # Rows replaced since the lists were loaded are dropped by the caller's join
+        rows = np.concatenate(picked)
+        if not len(rows):
+            return rows, np.zeros(0, dtype=np.float32)
+        scores = np.asarray(self.vectors[rows], dtype=np.float32) @ query
+        k = min(limit, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+
+def _stats(conn) -> Dict[str, int]:
+    return dict(conn.execute("SELECT name, value FROM topic_index_stats").fetchall())
+
+
+def _open(stats: Dict[str, int]) -> _Index:
+    directory = index_dir()
+    with _lock:
+        index = _loaded.get(directory)
+        if index is None or index.version != stats.get("version", 0):
+            index = _loaded[directory] = _Index(directory, stats.get("version", 0))
+        index.extend(stats.get("next_row", 0))
+        return index
+
+
+def _write_rows(directory: str, start: int, vectors: np.ndarray, lists: np.ndarray):
+    """Write rows from `start` on, dropping anything a failed sync left past it"""
+    os.makedirs(directory, exist_ok=True)
+    for name, data in ((VECTORS_FILE, quantize(vectors)), (LISTS_FILE, lists.astype(np.int32))):
+        path = os.path.join(directory, name)
+        with open(path, "ab"):
+            pass
+        with open(path, "r+b") as f:
+            f.truncate(start * data.itemsize * (DIM if data.ndim == 2 else 1))
+            f.seek(0, os.SEEK_END)
+            f.write(data.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _retire_rows(directory: str, rows: List[int]):
+    """Take replaced rows out of their lists"""
+    if not rows:
+        return
+    dead = np.int32(-1).tobytes()
+    with open(os.path.join(directory, LISTS_FILE), "r+b") as f:
+        for row in sorted(rows):
+            f.seek(row * 4)
+            f.write(dead)
+
+
+def _commit_tx(conn, indexed: List[Tuple], removed: List[int], df_delta: Dict[int, int],
+               docs_delta: int, next_row: int, seen: List[Tuple]):
+    conn.executemany("DELETE FROM topic_vectors WHERE row = ?", [(row,) for row in removed])
+    conn.executemany("INSERT INTO topic_vectors (row, isbn, title, author) VALUES (?, ?, ?, ?)", indexed)
+    conn.executemany("""
+        INSERT INTO topic_df (feature, df) VALUES (?, ?)
+        ON CONFLICT(feature) DO UPDATE SET df = df + excluded.df
+    """, [(f, d) for f, d in df_delta.items() if d])
+    conn.executemany("DELETE FROM topic_df WHERE feature = ? AND df <= 0",
+                     [(f,) for f, d in df_delta.items() if d < 0])
+    conn.execute("""
+        INSERT INTO topic_index_stats (name, value) VALUES ('docs', ?)
+        ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+    """, (docs_delta,))
+    conn.execute("""
+        INSERT INTO topic_index_stats (name, value) VALUES ('next_row', ?)
+        ON CONFLICT(name) DO UPDATE SET value = excluded.value
+    """, (next_row,))
+    # A book edited since it was read stays queued for the next sync
+    conn.executemany("""
+        DELETE FROM topic_index_pending
+        WHERE isbn = ? AND (SELECT title || char(0) || author FROM books WHERE isbn = ?) IS ?
+    """, seen)
+
+
+def _sync_batch(isbns: List[str]) -> int:
+    marks = ",".join("?" * len(isbns))
+    conn = db_functions.get_connection()
+    try:
+        current = {isbn: (title, author) for isbn, title, author in conn.execute(
+            f"SELECT isbn, title, author FROM books WHERE isbn IN ({marks})", isbns)}
+        indexed = {isbn: (row, title, author) for row, isbn, title, author in conn.execute(
+            f"SELECT row, isbn, title, author FROM topic_vectors WHERE isbn IN ({marks})", isbns)}
+        next_row = _stats(conn).get("next_row", 0)
+    finally:
+        conn.close()
+
+    added, removed, df_delta = [], [], Counter()
+    for isbn in isbns:
+        old = indexed.get(isbn)
+        text = current.get(isbn)
+        if old is not None and old[1:] == text:
+            continue
+        if old is not None:
+            removed.append(old[0])
+            df_delta.subtract(features(*old[1:]).keys())
+        if text is not None:
+            weights = features(*text)
+            df_delta.update(weights.keys())
+            added.append((isbn, text, weights))
+
+    directory = index_dir()
+    path = os.path.join(directory, CENTROIDS_FILE)
+    centroids = np.load(path) if os.path.exists(path) else np.zeros((1, DIM), dtype=np.float32)
+    vectors = embed([weights for _, _, weights in added])
+    _write_rows(directory, next_row, vectors, assign(vectors, centroids))
+
+    rows = [(next_row + i, isbn, title, author) for i, (isbn, (title, author), _) in enumerate(added)]
+    seen = [(isbn, isbn, None if isbn not in current else "\0".join(current[isbn])) for isbn in isbns]
+    db_functions.run_write(_commit_tx, rows, removed, dict(df_delta),
+                           len(added) - len(removed), next_row + len(added), seen)
+    # Only once nothing points at them; a crash before this leaves rows the join drops
+    _retire_rows(directory, removed)
+    return len(isbns)
+
+
+def _set_stats_tx(conn, values: Dict[str, int]):
+    conn.executemany("""
+        INSERT INTO topic_index_stats (name, value) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET value = excluded.value
+    """, list(values.items()))
+
+
+def retrain() -> int:
+    """Re-cluster the stored vectors into fresh lists; returns the number of lists"""
+    with _lock:
+        conn = db_functions.get_connection()
+        try:
+            stats = _stats(conn)
+        finally:
+            conn.close()
+        directory = index_dir()
+        rows = stats.get("next_row", 0)
+        if not rows:
+            return 0
+        vectors = np.memmap(os.path.join(directory, VECTORS_FILE), dtype=np.int8, mode="r", shape=(rows, DIM))
+        lists = np.array(np.memmap(os.path.join(directory, LISTS_FILE), dtype=np.int32, mode="r", shape=(rows,)))
+        alive = np.flatnonzero(lists >= 0)
+
+        n_lists = int(min(MAX_LISTS, max(1, len(alive) // ROWS_PER_LIST)))
+        rng = np.random.default_rng(stats.get("version", 0))
+        sample = np.sort(rng.choice(alive, min(len(alive), TRAIN_SAMPLE), replace=False))
+        centroids = kmeans(np.asarray(vectors[sample], dtype=np.float32) / 127.0, n_lists)
+
+        lists[alive] = assign(vectors[alive], centroids) if n_lists > 1 else 0
+        for name, data in ((LISTS_FILE, None), (CENTROIDS_FILE, centroids)):
+            tmp = os.path.join(directory, name + ".tmp")
+            if data is None:
+                lists.tofile(tmp)
+            else:
+                with open(tmp, "wb") as f:
+                    np.save(f, data)
+            os.replace(tmp, os.path.join(directory, name))
+        # Readers reload on the new version
+        db_functions.run_write(_set_stats_tx, {"trained_docs": len(alive),
+                                               "version": stats.get("version", 0) + 1})
+        _loaded.pop(directory, None)
+        return n_lists
+
+
+def sync() -> int:
+    """Index every queued book; returns how many were processed"""
+    if snapshot.current() is not None:
+        # Snapshots are read-only; their index is as fresh as the copy
+        return 0
+    done = 0
+    with _lock:
+        while True:
+            conn = db_functions.get_connection()
+            try:
+                batch = [row[0] for row in conn.execute(
+                    "SELECT isbn FROM topic_index_pending LIMIT ?", (SYNC_BATCH,)).fetchall()]
+                stats = _stats(conn)
+            finally:
+                conn.close()
+            if not batch:
+                break
+            done += _sync_batch(batch)
+        docs = stats.get("docs", 0)
+        if done and docs >= RETRAIN_MIN and docs > RETRAIN_GROWTH * stats.get("trained_docs", 0):
+            retrain()
+    return done
+
+
+def _reset_tx(conn):
+    conn.execute("DELETE FROM topic_vectors")
+    conn.execute("DELETE FROM topic_df")
+    version = _stats(conn).get("version", 0) + 1
+    _set_stats_tx(conn, {"version": version, "next_row": 0, "docs": 0, "trained_docs": 0})
+    conn.execute("INSERT OR IGNORE INTO topic_index_pending (isbn) SELECT isbn FROM books")
+
+
+def rebuild() -> int:
+    """Drop the index and build it again from books"""
+    with _lock:
+        db_functions.run_write(_reset_tx)
+        directory = index_dir()
+        # Unlink rather than truncate: open memory maps keep the old files
+        for name in (VECTORS_FILE, LISTS_FILE, CENTROIDS_FILE):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+        _loaded.pop(directory, None)
+        return sync()
+
+
+@timed("db")
+def search_topics(topic: str, limit: int = 10) -> List[Dict]:
+    """Books most related to `topic`, best first, each with a 0-1 "score" """
+    weights = features(topic)
+    if not weights:
+        return []
+    sync()
+
+    conn = db_functions.get_connection()
+    conn.row_factory = sqlite3.Row
+    try:
+        stats = _stats(conn)
+        marks = ",".join("?" * len(weights))
+        df = dict(conn.execute(f"SELECT feature, df FROM topic_df WHERE feature IN ({marks})",
+                               list(weights)).fetchall())
+        docs = stats.get("docs", 0)
+        # Features no book has cannot match; they would only add collision noise
+        query = {h: w * (np.log((docs + 1) / (df[h] + 1)) + 1.0) for h, w in weights.items() if h in df}
+        if not query:
+            return []
+        rows, _ = _open(stats).search(embed([query])[0], max(RERANK, limit))
+        if not len(rows):
+            return []
+        candidates = conn.execute(f"""
+            SELECT tv.title AS indexed_title, tv.author AS indexed_author,
+                   b.isbn, b.title, b.author, b.price, b.stock
+            FROM topic_vectors tv JOIN books b ON b.isbn = tv.isbn
+            WHERE tv.row IN ({','.join('?' * len(rows))})
+        """, [int(r) for r in rows]).fetchall()
+    finally:
+        conn.close()
+
+    ranked = []
+    query_norm = math.sqrt(sum(w * w for w in query.values()))
+    for row in candidates:
+        book = dict(row)
+        score = cosine(query, features(book.pop("indexed_title"), book.pop("indexed_author")), query_norm)
+        if score >= MIN_SCORE:
+            book["score"] = round(score, 3)
+            ranked.append(book)
+    ranked.sort(key=lambda book: (-book["score"], book["title"], book["isbn"]))
+    return ranked[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the topic vector index")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from books")
+    parser.add_argument("--retrain", action="store_true", help="Re-cluster the stored vectors")
+    parser.add_argument("--query", help="Search a topic and print the ranked books")
+    parser.add_argument("--db", default=None, help="Database path (default: db_functions.path)")
+    args = parser.parse_args()
+
+    if args.db:
+        db_functions.path = args.db
+    if args.rebuild:
+        print(f"Indexed {rebuild()} books")
+    if args.retrain:
+        print(f"Trained {retrain()} lists")
+    if args.query:
+        for book in search_topics(args.query):
+            print(f"{book['score']:.3f}  {book['title']} by {book['author']}  ({book['isbn']})")
+
+
+if __name__ == "__main__":
+    main()
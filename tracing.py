@@ -0,0 +1,252 @@
+# tracing.py
+"""Span-based tracing of desk turns across frontend, agent, tools and database.
+
+Spans follow the OpenTelemetry data model (128-bit trace ids, 64-bit span
+ids, parent links, attributes, status). They are written as OTLP/JSON
+ExportTraceServiceRequest lines, one per finished turn. An OpenTelemetry
+collector can ingest the file, and `python tracing.py traces.jsonl` prints
+a per-turn latency breakdown.
+
+Every span created inside a turn inherits the turn's session.id and
+turn.id attributes, so tool and database spans can be grouped by desk
+session without extra plumbing.
+
+Enable with LIBRARY_TRACE_FILE=traces.jsonl or tracing.configure(path).
+"""
+import contextvars
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+SERVICE_NAME = "library-desk-agent"
+FLUSH_BATCH = 512
+
+ENABLED = False
+_exporter = None
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+# Attributes every child span copies from its parent
+INHERITED_ATTRIBUTES = ("session.id", "turn.id")
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_span_id", "start_ns", "end_ns",
+                 "attributes", "status", "status_message", "is_root")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[Dict] = None):
+        self.name = name
+        self.span_id = "%016x" % random.getrandbits(64)
+        if parent is not None:
+            self.trace_id = parent.trace_id
+            self.parent_span_id = parent.span_id
+            self.attributes = {k: parent.attributes[k] for k in INHERITED_ATTRIBUTES if k in parent.attributes}
+        else:
+            self.trace_id = "%032x" % random.getrandbits(128)
+            self.parent_span_id = ""
+            self.attributes = {}
+        if attributes:
+            self.attributes.update(attributes)
+        self.is_root = parent is None
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.status = "UNSET"
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_error(self, message: str):
+        self.status = "ERROR"
+        self.status_message = message
+
+    def end(self):
+        if self.end_ns:
+            return
+        self.end_ns = time.time_ns()
+        if _exporter is not None:
+            _exporter.export(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_otlp(self) -> Dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": {"UNSET": 0, "OK": 1, "ERROR": 2}[self.status], "message": self.status_message}
+        }
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class JsonFileExporter:
+    """Buffers finished spans and appends them to a file as OTLP/JSON lines"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._buffer: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self._buffer.append(span)
+            if not (span.is_root or len(self._buffer) >= FLUSH_BATCH):
+                return
+            spans, self._buffer = self._buffer, []
+        self._write(spans)
+
+    def flush(self):
+        with self._lock:
+            spans, self._buffer = self._buffer, []
+        if spans:
+            self._write(spans)
+
+    def _write(self, spans: List[Span]):
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "library-desk"}, "spans": [s.to_otlp() for s in spans]}]
+            }]
+        }
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(request) + "\n")
+        except OSError as e:
+            print(f"Note: Could not write traces - {e}")
+
+
+def configure(path: Optional[str]):
+    """Start exporting spans to `path`; None turns tracing off"""
+    global ENABLED, _exporter
+    if _exporter is not None:
+        _exporter.flush()
+    _exporter = JsonFileExporter(path) if path else None
+    ENABLED = _exporter is not None
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_span(name: str, **attributes) -> Span:
+    """Create a span under the current one without making it current"""
+    return Span(name, _current_span.get(), attributes)
+
+
+@contextmanager
+def use_span(span: Optional[Span]):
+    """Make `span` the parent of spans created in this block (and this thread)"""
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Run a block inside a new child span of the current one"""
+    s = start_span(name, **attributes)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except Exception as e:
+        s.set_error(str(e))
+        raise
+    finally:
+        _current_span.reset(token)
+        s.end()
+
+
+def begin_turn(session_id: str, turn_id: Optional[str] = None, name: str = "desk.turn") -> Span:
+    """Start the root span of a desk turn; the caller ends it when the reply is shown"""
+    return Span(name, None, {
+        "session.id": session_id,
+        "turn.id": turn_id or uuid.uuid4().hex[:16]
+    })
+
+
+@contextmanager
+def turn(session_id: str, turn_id: Optional[str] = None, name: str = "desk.turn"):
+    """Run a whole turn inside a new root span"""
+    root = begin_turn(session_id, turn_id, name)
+    with use_span(root):
+        try:
+            yield root
+        except Exception as e:
+            root.set_error(str(e))
+            raise
+        finally:
+            root.end()
+
+
+def current_turn_id() -> Optional[str]:
+    s = _current_span.get()
+    return s.attributes.get("turn.id") if s is not None else None
+
+
+def breakdown(path: str) -> List[Dict]:
+    """Per-turn latency breakdown from an exported trace file"""
+    spans_by_trace: Dict[str, List[Dict]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            request = json.loads(line)
+            for rs in request.get("resourceSpans", []):
+                for ss in rs.get("scopeSpans", []):
+                    for s in ss.get("spans", []):
+                        spans_by_trace.setdefault(s["traceId"], []).append(s)
+
+    turns = []
+    for trace_id, spans in spans_by_trace.items():
+        root = next((s for s in spans if not s["parentSpanId"]), None)
+        if root is None:
+            continue
+        attrs = {a["key"]: list(a["value"].values())[0] for a in root["attributes"]}
+        by_name: Dict[str, float] = {}
+        for s in spans:
+            if s is root:
+                continue
+            ms = (int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])) / 1e6
+            by_name[s["name"]] = by_name.get(s["name"], 0.0) + ms
+        turns.append({
+            "trace_id": trace_id,
+            "session_id": attrs.get("session.id"),
+            "turn_id": attrs.get("turn.id"),
+            "start_ns": int(root["startTimeUnixNano"]),
+            "total_ms": (int(root["endTimeUnixNano"]) - int(root["startTimeUnixNano"])) / 1e6,
+            "spans_ms": dict(sorted(by_name.items(), key=lambda kv: kv[1], reverse=True))
+        })
+    return sorted(turns, key=lambda t: t["start_ns"])
+
+
+if os.environ.get("LIBRARY_TRACE_FILE"):
+    configure(os.environ["LIBRARY_TRACE_FILE"])
+
+
+if __name__ == "__main__":
+    for t in breakdown(sys.argv[1] if len(sys.argv) > 1 else "traces.jsonl"):
+        print(f"session {t['session_id']} turn {t['turn_id']}: {t['total_ms']:.1f} ms")
+        for name, ms in t["spans_ms"].items():
+            print(f"    {name:<40} {ms:>9.2f} ms")
@@ -0,0 +1,128 @@
+# uow.py
+"""Per-turn unit of work for the desk agent.
+
+A turn (one user message, however many tool calls it takes) runs inside
+unit_of_work(). While it is active:
+
+- Book rows that any tool has already read are kept by ISBN, so later
+  tools in the same turn look them up without SQL. Writes made through
+  the tools update the cached rows.
+- Reports such as the inventory summary and customer lookups are memoised
+  until the next write.
+- Audit rows (messages and tool_calls) are collected and written in one
+  transaction when the turn ends, instead of one connection and one
+  commit each.
+
+Tools reach the active unit of work through a context variable, the same
+way they reach the current session. Outside a turn, current() returns a
+fresh throwaway unit of work and audit rows are written immediately.
+"""
+import contextvars
+import json
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+_active: contextvars.ContextVar = contextvars.ContextVar("unit_of_work", default=None)
+
+# Memo keys that survive writes (a write never changes who a customer is)
+STABLE_MEMOS = ("customer_id",)
+
+
+class UnitOfWork:
+    def __init__(self, session_id: Optional[str] = None):
+        self.session_id = session_id
+        self.books: Dict[str, Dict] = {}
+        self._memo: Dict[Tuple, object] = {}
+        self._messages: List[Tuple] = []
+        self._tool_calls: List[Tuple] = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    # Read cache
+
+    def remember_books(self, rows: List[Dict]):
+        for row in rows:
+            self.books[row["isbn"]] = dict(row)
+
+    def book(self, isbn: str) -> Optional[Dict]:
+        """A book row by ISBN, from this turn's cache or one primary-key lookup"""
+        row = self.books.get(isbn)
+        if row is not None:
+            self.cache_hits += 1
+            return row
+        self.cache_misses += 1
+        from db_functions import get_book
+        row = get_book(isbn)
+        if row is not None:
+            self.books[isbn] = row
+        return row
+
+    def memo(self, key: Tuple, loader: Callable):
+        """Return the value cached under key, calling loader() the first time"""
+        if key in self._memo:
+            self.cache_hits += 1
+            return self._memo[key]
+        self.cache_misses += 1
+        value = self._memo[key] = loader()
+        return value
+
+    def book_changed(self, isbn: str, **fields):
+        """Record a write to a book: patch its cached row and drop memoised reports"""
+        if isbn in self.books:
+            self.books[isbn].update(fields)
+        self._memo = {k: v for k, v in self._memo.items() if k[0] in STABLE_MEMOS}
+
+    # Deferred audit writes
+
+    def defer_message(self, session_id: str, role: str, content: str):
+        self._messages.append((session_id, role, content))
+
+    def defer_tool_call(self, session_id: str, name: str, args: dict, result: dict):
+        self._tool_calls.append((session_id, name, json.dumps(args, separators=(",", ":")),
+                                 json.dumps(result, separators=(",", ":"))))
+
+    def flush(self):
+        """Write the collected audit rows in one transaction"""
+        if not (self._messages or self._tool_calls):
+            return
+        from db_functions import run_write
+        messages, self._messages = self._messages, []
+        tool_calls, self._tool_calls = self._tool_calls, []
+        try:
+            run_write(_insert_audit_rows, messages, tool_calls)
+        except Exception as e:
+            print(f"Note: Could not save turn log - {e}")
+
+
+def _insert_audit_rows(conn, messages: List[Tuple], tool_calls: List[Tuple]):
+    from db_functions import _insert_messages, _insert_tool_calls
+    if messages:
+        _insert_messages(conn, messages)
+    if tool_calls:
+        _insert_tool_calls(conn, tool_calls)
+
+def active() -> Optional[UnitOfWork]:
+    """The unit of work of the running turn, if any"""
+    return _active.get()
+
+
+def current() -> UnitOfWork:
+    """The running turn's unit of work, or a throwaway one outside a turn"""
+    work = _active.get()
+    return work if work is not None else UnitOfWork()
+
+
+@contextmanager
+def unit_of_work(session_id: Optional[str] = None):
+    """Run a turn inside a unit of work; nested calls join the outer one"""
+    work = _active.get()
+    if work is not None:
+        yield work
+        return
+    work = UnitOfWork(session_id)
+    token = _active.set(work)
+    try:
+        yield work
+    finally:
+        _active.reset(token)
+        work.flush()
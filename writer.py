@@ -0,0 +1,172 @@
+# writer.py
+"""Single-writer actor for every SQLite mutation.
+
+One thread owns the only write connection. A write is a command: a
+function fn(conn, *args) that runs its statements without committing.
+Callers submit commands and get a concurrent.futures.Future back.
+
+The writer drains whatever is queued (up to MAX_BATCH commands) and runs
+the batch as one transaction. Each command sits inside its own SAVEPOINT,
+so a command that raises is rolled back on its own. Its future gets the
+exception and the rest of the batch still commits. A single COMMIT then
+covers the whole batch: under load that is one fsync for many writes,
+instead of one per write, and nobody ever waits on a "database is locked"
+retry.
+
+Reads are unaffected. They keep using their own connections (the WAL
+reader pool in pool.py for the service), which see each batch as soon as
+it commits.
+
+db_functions.run_write() uses the writer when one is running for the
+current database and falls back to a direct transaction otherwise.
+"""
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+import metrics
+import profiler
+
+MAX_BATCH = 256
+BUSY_TIMEOUT_MS = 5000
+
+_STOP = object()
+_active: Optional["Writer"] = None
+
+_batch_sizes = metrics.histogram("writer_batch_size", "writer", metrics.ROW_BUCKETS)
+_commit_latency = metrics.histogram("writer_commit_ms", "writer")
+
+
+class Writer:
+    def __init__(self, path: str, max_batch: int = MAX_BATCH, linger_ms: float = 0.0):
+        self.path = path
+        self.max_batch = max_batch
+        self.linger = linger_ms / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._ready = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._stopped = False
+        self.stats = {"commands": 0, "failed": 0, "batches": 0, "largest_batch": 0}
+
+    def start(self) -> "Writer":
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Queue fn(conn, *args) for the next batch"""
+        if self._stopped:
+            raise RuntimeError("Database writer is stopped")
+        future = Future()
+        self._queue.put((fn, args, future))
+        return future
+
+    def stop(self, timeout: float = 10.0):
+        """Finish queued commands, then close the write connection"""
+        if not self._stopped:
+            self._stopped = True
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: the writer issues BEGIN/COMMIT itself
+        kwargs = {"timeout": BUSY_TIMEOUT_MS / 1000.0, "isolation_level": None}
+        conn = profiler.connect(self.path, **kwargs) if profiler.ENABLED else sqlite3.connect(self.path, **kwargs)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except BaseException as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            if self.linger and batch[0] is not _STOP:
+                # Give concurrent writers a moment to join this commit
+                time.sleep(self.linger)
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stopping = True
+                batch = [item for item in batch if item is not _STOP]
+            if batch:
+                self._commit(conn, batch)
+        conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch):
+        start = time.perf_counter()
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, args, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT command")
+                try:
+                    result = fn(conn, *args)
+                    conn.execute("RELEASE command")
+                    outcomes.append((future, result, None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO command")
+                    conn.execute("RELEASE command")
+                    outcomes.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            # The batch as a whole failed (e.g. disk full): nothing was written
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            self.stats["failed"] += len(batch)
+            return
+
+        _commit_latency.observe((time.perf_counter() - start) * 1000.0)
+        _batch_sizes.observe(len(batch))
+        self.stats["batches"] += 1
+        self.stats["commands"] += len(batch)
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+        for future, result, error in outcomes:
+            if error is not None:
+                self.stats["failed"] += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def snapshot(self) -> Dict:
+        return dict(self.stats, queued=self._queue.qsize())
+
+
+def start(path: str, max_batch: int = MAX_BATCH, linger_ms: float = 0.0) -> Writer:
+    """Start the process-wide writer for `path`"""
+    global _active
+    stop()
+    _active = Writer(path, max_batch, linger_ms).start()
+    return _active
+
+
+def stop():
+    global _active
+    if _active is not None:
+        _active.stop()
+        _active = None
+
+
+def active() -> Optional[Writer]:
+    return _active